@@ -1,3 +1,14 @@
 from django.contrib import admin
+from .models import CoPurchase, PrecomputedRecommendation
 
-# Register your models here.
+
+@admin.register(CoPurchase)
+class CoPurchaseAdmin(admin.ModelAdmin):
+    list_display = ["product_a", "product_b", "count"]
+    raw_id_fields = ["product_a", "product_b"]
+
+
+@admin.register(PrecomputedRecommendation)
+class PrecomputedRecommendationAdmin(admin.ModelAdmin):
+    list_display = ["condition", "exclude", "top_n", "catalog_version", "computed_at"]
+    list_filter = ["condition"]
@@ -0,0 +1,132 @@
+"""
+Approximate nearest-neighbour search for large catalogs (pure NumPy, CPU).
+
+IVF-style index: vectors are clustered with k-means into inverted lists
+and a query only scores the members of the `nprobe` most promising
+lists. Lists are ranked by the inner product of their centroid with the
+query, which serves both cosine search on normalized vectors and
+maximum-inner-product recommendation scoring. Raising nprobe trades
+latency for recall; nprobe = n_lists is exact.
+"""
+
+import numpy as np
+
+# Rows assigned to centroids per chunk (bounds peak memory)
+CHUNK_SIZE = 65536
+
+# Vectors sampled to train the centroids
+TRAIN_SAMPLE = 50000
+
+
+def _assign(vectors, centroids):
+    """Nearest centroid (squared L2) of every vector, chunked."""
+    labels = np.empty(len(vectors), dtype=np.int64)
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    for start in range(0, len(vectors), CHUNK_SIZE):
+        chunk = vectors[start:start + CHUNK_SIZE]
+        distances = centroid_norms[None, :] - 2 * chunk @ centroids.T
+        labels[start:start + CHUNK_SIZE] = distances.argmin(axis=1)
+    return labels
+
+
+def kmeans(vectors, n_clusters, iterations=10, seed=0):
+    """Lloyd's k-means on a sample of `vectors`; returns the centroids."""
+    rng = np.random.default_rng(seed)
+    sample = vectors
+    if len(vectors) > TRAIN_SAMPLE:
+        sample = vectors[rng.choice(len(vectors), TRAIN_SAMPLE, replace=False)]
+    centroids = sample[
+        rng.choice(len(sample), n_clusters, replace=False)
+    ].copy()
+
+    for _ in range(iterations):
+        labels = _assign(sample, centroids)
+        counts = np.bincount(labels, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Re-seed empty clusters on random points
+        empty = np.flatnonzero(~filled)
+        if empty.size:
+            centroids[empty] = sample[rng.choice(len(sample), empty.size)]
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file index over the rows of a dense matrix."""
+
+    def __init__(self, vectors, n_lists=None, iterations=10, seed=0):
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float64)
+        size = len(self.vectors)
+        if not n_lists:
+            n_lists = int(np.sqrt(size))
+        self.n_lists = max(1, min(n_lists, size))
+
+        self.centroids = kmeans(self.vectors, self.n_lists, iterations, seed)
+        labels = _assign(self.vectors, self.centroids)
+
+        # Rows grouped by list: members of list i are order[offsets[i]:offsets[i+1]]
+        self.order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=self.n_lists)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    @classmethod
+    def from_arrays(cls, vectors, centroids, order, offsets):
+        """Wrap lists stored by arrays() (e.g. memory-mapped) without training."""
+        index = cls.__new__(cls)
+        index.vectors = np.ascontiguousarray(vectors, dtype=np.float64)
+        index.centroids = np.asarray(centroids, dtype=np.float64)
+        index.n_lists = len(index.centroids)
+        index.order = np.asarray(order, dtype=np.int64)
+        index.offsets = np.asarray(offsets, dtype=np.int64)
+        return index
+
+    def arrays(self):
+        """The trained lists, for from_arrays()."""
+        return {
+            "centroids": self.centroids,
+            "order": self.order,
+            "offsets": self.offsets,
+        }
+
+    def candidates(self, query, nprobe, min_candidates=0):
+        """
+        Row ids in the `nprobe` lists whose centroids score highest.
+
+        More lists are probed if fewer than `min_candidates` rows were
+        collected.
+        """
+        ranked = np.argsort(-(self.centroids @ query))
+        nprobe = max(1, min(nprobe, self.n_lists))
+        sizes = np.diff(self.offsets)[ranked]
+        needed = np.searchsorted(np.cumsum(sizes), min_candidates) + 1
+        probe = ranked[:max(nprobe, min(needed, self.n_lists))]
+        return np.concatenate([
+            self.order[self.offsets[i]:self.offsets[i + 1]] for i in probe
+        ])
+
+    def search(self, query, k, nprobe, exclude_rows=()):
+        """
+        Approximate top-k rows by inner product with `query`.
+
+        Returns:
+            (rows, scores) sorted by score desc
+        """
+        rows = self.candidates(query, nprobe, k + len(exclude_rows))
+        if len(exclude_rows):
+            rows = rows[~np.isin(rows, exclude_rows)]
+        scores = self.vectors[rows] @ query
+        k = min(k, len(rows))
+        if k == 0:
+            return rows[:0], scores[:0]
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return rows[top], scores[top]
+
+
+def recall_at_k(approximate, exact):
+    """Fraction of the exact top-k found by the approximate search."""
+    if len(exact) == 0:
+        return 1.0
+    return len(np.intersect1d(approximate, exact)) / len(exact)
@@ -0,0 +1,160 @@
+"""
+Versioned on-disk NumPy artifacts shared by every worker process.
+
+Each artifact lives under settings.AI_MODEL_DIR/<name>/ as one directory
+per version holding plain .npy files, plus a CURRENT file naming the
+active version. Readers memory-map the arrays so all workers share one
+physical copy through the page cache.
+"""
+
+import fcntl
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+KEEP_VERSIONS = 2
+
+
+class Artifact:
+    """A loaded artifact version: named arrays plus its manifest."""
+
+    def __init__(self, name, version, arrays, meta):
+        self.name = name
+        self.version = version
+        self.arrays = arrays
+        self.meta = meta
+
+    def __getitem__(self, key):
+        return self.arrays[key]
+
+
+def artifact_dir(name):
+    return Path(settings.AI_MODEL_DIR) / name
+
+
+def current_version(name):
+    """Version string named by the artifact's CURRENT file, or None."""
+    try:
+        return (artifact_dir(name) / "CURRENT").read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+@contextmanager
+def artifact_lock(name):
+    """Exclusive cross-process lock for read-modify-write updates."""
+    root = artifact_dir(name)
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / ".lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def write_artifact(name, arrays, meta=None):
+    """
+    Write a new artifact version and atomically make it CURRENT.
+
+    Args:
+        name: artifact name, e.g. 'similar'
+        arrays: dict of array name -> numpy array
+        meta: JSON-serializable manifest data
+
+    Returns:
+        The new version string
+    """
+    root = artifact_dir(name)
+    root.mkdir(parents=True, exist_ok=True)
+
+    version = f"{time.time_ns()}"
+    tmp_dir = root / f".tmp-{version}"
+    tmp_dir.mkdir()
+    for key, array in arrays.items():
+        np.save(tmp_dir / f"{key}.npy", np.ascontiguousarray(array))
+    manifest = {
+        "version": version,
+        "arrays": sorted(arrays),
+        "meta": meta or {},
+    }
+    (tmp_dir / "manifest.json").write_text(json.dumps(manifest))
+    os.replace(tmp_dir, root / version)
+
+    pointer = root / f".CURRENT-{version}"
+    pointer.write_text(version)
+    os.replace(pointer, root / "CURRENT")
+
+    _prune(root, version)
+    return version
+
+
+def _prune(root, version):
+    versions = sorted(
+        p.name for p in root.iterdir()
+        if p.is_dir() and p.name.isdigit()
+    )
+    for old in versions[:-KEEP_VERSIONS]:
+        if old != version:
+            shutil.rmtree(root / old, ignore_errors=True)
+
+
+def load_artifact(name, version=None, mmap_mode="r"):
+    """Load an artifact version (CURRENT by default), or None if absent."""
+    version = version or current_version(name)
+    if version is None:
+        return None
+    path = artifact_dir(name) / version
+    try:
+        manifest = json.loads((path / "manifest.json").read_text())
+        arrays = {
+            key: np.load(path / f"{key}.npy", mmap_mode=mmap_mode)
+            for key in manifest["arrays"]
+        }
+    except FileNotFoundError:
+        # Pruned between reading CURRENT and opening the files
+        return None
+    return Artifact(name, version, arrays, manifest["meta"])
+
+
+class ArtifactCache:
+    """
+    Process-wide handle on the CURRENT version of an artifact.
+
+    CURRENT is re-read at most every AI_ARTIFACT_CHECK_INTERVAL seconds,
+    and a newer version is swapped in without restarting the worker.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._artifact = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        interval = getattr(settings, "AI_ARTIFACT_CHECK_INTERVAL", 5)
+        if now - self._checked_at < interval:
+            return self._artifact
+
+        with self._lock:
+            if now - self._checked_at >= interval:
+                version = current_version(self.name)
+                loaded = self._artifact
+                if version is None:
+                    self._artifact = None
+                elif loaded is None or loaded.version != version:
+                    self._artifact = load_artifact(self.name, version)
+                self._checked_at = time.monotonic()
+        return self._artifact
+
+    def reset(self):
+        """Force the next get() to re-check CURRENT."""
+        self._checked_at = 0.0
@@ -0,0 +1,221 @@
+"""
+Async (ASGI) variants of the recommend and compliance endpoints.
+
+NumPy scoring runs on a bounded thread pool so the event loop stays
+free; NumPy releases the GIL inside its matrix kernels, and threads
+share the process-wide CatalogIndex (a process pool would have to copy
+it). Products are loaded with Django's async ORM. Once
+AI_ASYNC_MAX_PENDING jobs are queued or running, new requests get a
+503 with Retry-After instead of piling up behind a slow scan.
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from products.models import Product
+from .cache import acached_response
+from .guidelines import get_rule_set
+from .strategies import choose_strategy
+from .views import (
+    compliance_data,
+    compliance_queryset,
+    log_recommendation_impressions,
+    parse_compliance_params,
+    parse_recommendation_params,
+    rank_for_params,
+    recommendation_cache_params,
+    recommendation_data,
+    result_queryset,
+)
+
+def _with_fresh_connection(func):
+    """
+    Call func() between close_old_connections() calls.
+
+    Pool threads are not request threads, so Django's request signals
+    never recycle their connections; without this a thread would keep a
+    broken or expired connection (e.g. after a database restart) forever.
+    """
+    close_old_connections()
+    try:
+        return func()
+    finally:
+        close_old_connections()
+
+
+class PoolSaturated(Exception):
+    """Raised when the offload pool has no room for another job."""
+
+
+class Offloader:
+    """Bounded thread pool with an admission limit for blocking work."""
+
+    def __init__(self, workers, max_pending):
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="ai-offload"
+        )
+        self.max_pending = max_pending
+        self.pending = 0
+        self._lock = threading.Lock()
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Run func(*args, **kwargs) on the pool and await its result.
+
+        Raises:
+            PoolSaturated: max_pending jobs are already queued or running
+        """
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise PoolSaturated
+            self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, _with_fresh_connection,
+                functools.partial(func, *args, **kwargs),
+            )
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+
+_offloader = None
+_offloader_lock = threading.Lock()
+
+
+def get_offloader():
+    """Process-wide Offloader sized by AI_ASYNC_WORKERS / AI_ASYNC_MAX_PENDING."""
+    global _offloader
+    if _offloader is None:
+        with _offloader_lock:
+            if _offloader is None:
+                _offloader = Offloader(
+                    settings.AI_ASYNC_WORKERS, settings.AI_ASYNC_MAX_PENDING
+                )
+    return _offloader
+
+
+def _saturated():
+    response = JsonResponse(
+        {"error": "Recommendation workers are busy, retry shortly."},
+        status=503,
+    )
+    response["Retry-After"] = "1"
+    return response
+
+
+def authenticate(request):
+    """
+    User of a plain Django request, authenticated like the DRF views
+    (DEFAULT_AUTHENTICATION_CLASSES: JWT bearer token, then session).
+
+    Blocking (token users are loaded from the database): run it on the
+    offload pool.
+
+    Raises:
+        AuthenticationFailed: invalid or expired credentials
+    """
+    return Request(
+        request,
+        authenticators=[
+            auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+        ],
+    ).user
+
+
+def _unauthenticated(request, exc):
+    """401 like DRF's for credentials authenticate() rejected."""
+    detail = exc.detail
+    if not isinstance(detail, (dict, list)):
+        detail = {"detail": detail}
+    response = JsonResponse(detail, status=exc.status_code, safe=False)
+    for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        header = auth().authenticate_header(request)
+        if header:
+            response["WWW-Authenticate"] = header
+            break
+    return response
+
+
+@require_GET
+async def recommend(request):
+    """
+    GET /api/ai/async/recommend/?condition=diabetes&exclude=1&limit=4
+
+    Same parameters, authentication and response as RecommendationView.
+    """
+    params, error = parse_recommendation_params(request.GET)
+    if error:
+        return JsonResponse({"error": error}, status=400)
+    offloader = get_offloader()
+
+    async def compute():
+        ranked, meta, explanations = await offloader.run(
+            rank_for_params, params
+        )
+        products = await result_queryset().ain_bulk(
+            [pid for pid, _ in ranked]
+        )
+        return recommendation_data(
+            params, ranked, meta, explanations, products
+        )
+
+    try:
+        user = await offloader.run(authenticate, request)
+        params["strategy"] = choose_strategy(user)
+        cache_params = recommendation_cache_params(params)
+        if cache_params is None:
+            data = await compute()
+        else:
+            data = await acached_response("recommend", cache_params, compute)
+    except AuthenticationFailed as exc:
+        return _unauthenticated(request, exc)
+    except PoolSaturated:
+        return _saturated()
+    log_recommendation_impressions(user, params, data, "async-recommend")
+    return JsonResponse(data, safe=False)
+
+
+@require_GET
+async def compliance(request):
+    """
+    GET /api/ai/async/compliance/?product=1&condition=cardiovascular
+
+    Same parameters, authentication and response as ComplianceView.
+    """
+    offloader = get_offloader()
+    try:
+        await offloader.run(authenticate, request)
+        product_id, condition, error = parse_compliance_params(
+            request.GET, await offloader.run(get_rule_set)
+        )
+        if error:
+            message, error_status = error
+            return JsonResponse({"error": message}, status=error_status)
+
+        async def compute():
+            product = await compliance_queryset().aget(id=product_id)
+            return await offloader.run(compliance_data, product, condition)
+
+        report = await acached_response(
+            "compliance",
+            {"product": product_id, "condition": condition},
+            compute,
+        )
+    except AuthenticationFailed as exc:
+        return _unauthenticated(request, exc)
+    except Product.DoesNotExist:
+        return JsonResponse({"error": "Product not found"}, status=404)
+    except PoolSaturated:
+        return _saturated()
+    return JsonResponse(report)
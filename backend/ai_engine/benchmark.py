@@ -0,0 +1,143 @@
+"""
+Synthetic catalogs and timing helpers for the benchmark commands.
+
+Catalogs are generated from a seeded RNG with per-nutrient magnitudes
+close to real products, so runs are reproducible across commits.
+"""
+
+import time
+import tracemalloc
+
+import numpy as np
+
+from .recommender import NUTRITION_FIELDS, SUITABILITY_FIELDS, CatalogIndex
+
+# Typical per-serving magnitude of each nutrient, for synthetic data
+FIELD_SCALES = {
+    "calories": 250, "total_fat": 10, "saturated_fat": 3, "trans_fat": 0.2,
+    "cholesterol": 40, "sodium": 300, "total_carbs": 30, "fiber": 4,
+    "sugars": 8, "protein": 15, "potassium": 350,
+}
+
+# Nutrients stored as whole numbers on NutritionFacts
+INTEGER_FIELDS = {"calories", "cholesterol", "sodium", "potassium"}
+
+
+def synthetic_arrays(size, seed=0):
+    """
+    Random but plausible catalog columns.
+
+    Returns:
+        (matrix, suitability, prices); about 10% of the products have no
+        suitability scores (NaN rows)
+    """
+    rng = np.random.default_rng(seed)
+    scales = np.array([FIELD_SCALES[f] for f in NUTRITION_FIELDS])
+    matrix = rng.lognormal(0, 0.8, (size, len(NUTRITION_FIELDS))) * scales
+    for column, field in enumerate(NUTRITION_FIELDS):
+        matrix[:, column] = matrix[:, column].round(
+            0 if field in INTEGER_FIELDS else 1
+        )
+    suitability = rng.integers(0, 101, (size, len(SUITABILITY_FIELDS)))
+    suitability = suitability.astype(np.float64)
+    suitability[rng.random(size) < 0.1] = np.nan
+    prices = rng.uniform(1, 40, size).round(2)
+    return matrix, suitability, prices
+
+
+def synthetic_index(size, seed=0):
+    """A CatalogIndex of `size` synthetic products."""
+    matrix, suitability, prices = synthetic_arrays(size, seed)
+    return CatalogIndex(np.arange(1, size + 1), matrix, suitability, prices)
+
+
+def create_synthetic_catalog(size, seed=0, batch_size=5000):
+    """
+    Insert `size` synthetic products with nutrition and suitability rows.
+
+    Uses bulk_create, so no signals fire; callers run it inside a
+    transaction they roll back.
+
+    Returns:
+        List of the created product ids
+    """
+    from products.models import NutritionFacts, Product, ProductSuitability
+
+    matrix, suitability, prices = synthetic_arrays(size, seed)
+    tag = f"bench-{seed}-{time.time_ns()}"
+    product_ids = []
+    for start in range(0, size, batch_size):
+        end = min(start + batch_size, size)
+        products = Product.objects.bulk_create([
+            Product(
+                name=f"Benchmark product {i}",
+                slug=f"{tag}-{i}",
+                price=float(prices[i]),
+                image="",
+                description="",
+            )
+            for i in range(start, end)
+        ])
+        NutritionFacts.objects.bulk_create([
+            NutritionFacts(
+                product=product,
+                serving_size="100g",
+                **{
+                    field: (int(value) if field in INTEGER_FIELDS
+                            else float(value))
+                    for field, value in zip(NUTRITION_FIELDS, matrix[i])
+                },
+            )
+            for i, product in zip(range(start, end), products)
+        ])
+        ProductSuitability.objects.bulk_create([
+            ProductSuitability(
+                product=product,
+                **{
+                    field: int(value)
+                    for field, value in zip(SUITABILITY_FIELDS, suitability[i])
+                },
+            )
+            for i, product in zip(range(start, end), products)
+            if not np.isnan(suitability[i]).any()
+        ])
+        product_ids.extend(product.id for product in products)
+    return product_ids
+
+
+def measure(func, repeat):
+    """
+    Call `func` `repeat` times.
+
+    Returns:
+        dict with p50_ms, p99_ms, mean_ms and throughput (calls/s)
+    """
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        call_started = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - call_started) * 1000)
+    elapsed = time.perf_counter() - started
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        "mean_ms": round(float(np.mean(latencies)), 3),
+        "throughput": round(repeat / elapsed, 1) if elapsed else None,
+    }
+
+
+def peak_memory(func):
+    """
+    Run `func` once under tracemalloc.
+
+    Returns:
+        (result, peak traced allocation in MB)
+    """
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, round(peak / 2 ** 20, 2)
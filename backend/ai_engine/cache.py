@@ -0,0 +1,122 @@
+"""
+Versioned response cache for the AI endpoints.
+
+Every key embeds a global catalog version counter held in the Django
+cache (Redis in production). Catalog writes bump the counter, which
+orphans all older entries at once: invalidation is a single INCR and
+never scans keys. Old entries simply age out with their TTL.
+"""
+
+import time
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = "ai:catalog_version"
+HITS_KEY = "ai:cache:hits"
+MISSES_KEY = "ai:cache:misses"
+
+
+def get_version(key):
+    """Current value of the version counter `key`, initialised on first use."""
+    version = cache.get(key)
+    if version is None:
+        # Seeded from the clock so a flushed cache never reuses old keys
+        cache.add(key, time.time_ns() // 1000, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    """Advance the version counter `key` for every worker."""
+    try:
+        cache.incr(key)
+    except ValueError:
+        get_version(key)
+
+
+def get_catalog_version():
+    """Current catalog version, initialised on first use."""
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    """Invalidate every cached AI response and per-worker catalog index."""
+    bump_version(CATALOG_VERSION_KEY)
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+
+
+def response_key(endpoint, params):
+    """Cache key of (endpoint, params) under the current catalog version."""
+    query = urlencode(sorted((k, str(v)) for k, v in params.items()))
+    return f"ai:v{get_catalog_version()}:{endpoint}:{query}"
+
+
+def cached_response(endpoint, params, compute, timeout=None):
+    """
+    Return cached data for (endpoint, params) or compute and store it.
+
+    Args:
+        endpoint: short endpoint name, e.g. 'recommend'
+        params: dict of normalized query parameters
+        compute: zero-argument callable producing the response data
+        timeout: cache TTL in seconds (CACHES default when None)
+
+    Returns:
+        The response data
+    """
+    key = response_key(endpoint, params)
+
+    data = cache.get(key)
+    if data is not None:
+        _count(HITS_KEY)
+        return data
+
+    _count(MISSES_KEY)
+    data = compute()
+    if timeout is None:
+        cache.set(key, data)
+    else:
+        cache.set(key, data, timeout)
+    return data
+
+
+async def acached_response(endpoint, params, compute, timeout=None):
+    """
+    Async cached_response(); `compute` is a zero-argument coroutine
+    function.
+    """
+    key = await sync_to_async(response_key)(endpoint, params)
+
+    data = await cache.aget(key)
+    if data is not None:
+        await sync_to_async(_count)(HITS_KEY)
+        return data
+
+    await sync_to_async(_count)(MISSES_KEY)
+    data = await compute()
+    if timeout is None:
+        await cache.aset(key, data)
+    else:
+        await cache.aset(key, data, timeout)
+    return data
+
+
+def cache_stats():
+    """Hit/miss counters across all workers sharing the cache."""
+    hits = cache.get(HITS_KEY) or 0
+    misses = cache.get(MISSES_KEY) or 0
+    total = hits + misses
+    return {
+        "catalog_version": get_catalog_version(),
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / total, 4) if total else 0.0,
+    }
@@ -0,0 +1,58 @@
+"""
+System checks for the ai_engine settings.
+
+Strategy names are looked up per request (strategies.rank), so a typo in
+AI_STRATEGY, AI_STRATEGY_BUCKETS or AI_SHADOW_STRATEGY is reported by
+`manage.py check` / `migrate` instead of as a 500 on the first request.
+"""
+
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+@register()
+def check_strategies(app_configs, **kwargs):
+    from .strategies import STRATEGIES
+
+    known = ", ".join(sorted(STRATEGIES))
+    errors = []
+    if settings.AI_STRATEGY not in STRATEGIES:
+        errors.append(Error(
+            f"AI_STRATEGY {settings.AI_STRATEGY!r} is not a registered strategy.",
+            hint=f"Use one of: {known}.",
+            id="ai_engine.E001",
+        ))
+
+    buckets = settings.AI_STRATEGY_BUCKETS
+    if not isinstance(buckets, dict):
+        errors.append(Error(
+            "AI_STRATEGY_BUCKETS must be a JSON object of strategy -> percent.",
+            id="ai_engine.E002",
+        ))
+        buckets = {}
+    for name, percent in buckets.items():
+        if name not in STRATEGIES:
+            errors.append(Error(
+                f"AI_STRATEGY_BUCKETS names unknown strategy {name!r}.",
+                hint=f"Use one of: {known}.",
+                id="ai_engine.E002",
+            ))
+        if not isinstance(percent, int) or isinstance(percent, bool) or percent < 0:
+            errors.append(Error(
+                f"AI_STRATEGY_BUCKETS[{name!r}] must be a non-negative integer.",
+                id="ai_engine.E002",
+            ))
+    if sum(p for p in buckets.values() if isinstance(p, int)) > 100:
+        errors.append(Error(
+            "AI_STRATEGY_BUCKETS percentages add up to more than 100.",
+            id="ai_engine.E002",
+        ))
+
+    shadow = settings.AI_SHADOW_STRATEGY
+    if shadow and shadow not in STRATEGIES:
+        errors.append(Error(
+            f"AI_SHADOW_STRATEGY {shadow!r} is not a registered strategy.",
+            hint=f"Use one of: {known}, or leave it empty.",
+            id="ai_engine.E003",
+        ))
+    return errors
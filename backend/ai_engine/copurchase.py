@@ -0,0 +1,317 @@
+"""
+Co-purchase collaborative filtering built from OrderItem history.
+
+CoPurchase rows hold how many orders contained each product pair; each
+process keeps them as a symmetric scipy sparse matrix. New orders are
+applied incrementally (one upsert per order), while the
+rebuild_copurchase command recomputes the table from scratch.
+
+Workers load the table once, then every AI_COPURCHASE_REFRESH seconds
+read only the rows whose updated_at moved since their last read. Every
+in-memory update is an absolute count (the upsert returns the new
+totals), merged with max(), so reading a row twice never double counts.
+"""
+
+import threading
+import time
+from datetime import timedelta
+from itertools import combinations
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from scipy import sparse
+
+from .cache import bump_version, get_version
+
+# Recent in-memory counts merged into the sparse matrix past this many pairs
+MAX_PENDING = 1000
+
+# Rows written per INSERT during a full rebuild
+BATCH_SIZE = 5000
+
+# Pairs per upsert statement (4 parameters each, within SQLite's limit)
+UPSERT_BATCH_SIZE = 500
+
+# Seconds of updated_at re-read on each refresh: covers transactions that
+# commit after a later one, and clock skew between app servers
+REFRESH_OVERLAP = 60
+
+# Bumped by rebuild_copurchase: workers then reload the whole table
+REBUILD_VERSION_KEY = "ai:copurchase_rebuild"
+
+
+def _pair_rows(queryset):
+    return np.array(
+        list(queryset.values_list("product_a_id", "product_b_id", "count")),
+        dtype=np.int64,
+    ).reshape(-1, 3)
+
+
+class CoPurchaseModel:
+    """Symmetric product x product co-occurrence counts."""
+
+    def __init__(self, product_ids, counts, watermark=None, version=None):
+        self.product_ids = np.asarray(product_ids, dtype=np.int64)
+        self.counts = sparse.csr_matrix(counts)
+        self.loaded_at = time.monotonic()
+        # Time the last read started (see refresh), and the rebuild version
+        self.watermark = watermark
+        self.version = version
+        # product id -> {other product id: absolute count} not yet in counts
+        self._recent = {}
+        self._recent_pairs = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, version=None):
+        """Load the whole CoPurchase table into a sparse matrix."""
+        from .models import CoPurchase
+
+        watermark = timezone.now()
+        rows = _pair_rows(CoPurchase.objects.all())
+        product_ids = np.unique(rows[:, :2])
+        a = np.searchsorted(product_ids, rows[:, 0])
+        b = np.searchsorted(product_ids, rows[:, 1])
+        size = len(product_ids)
+        counts = sparse.coo_matrix(
+            (
+                np.concatenate([rows[:, 2], rows[:, 2]]),
+                (np.concatenate([a, b]), np.concatenate([b, a])),
+            ),
+            shape=(size, size),
+        )
+        return cls(product_ids, counts, watermark, version)
+
+    def refresh(self):
+        """Read the rows changed since the last load or refresh."""
+        from .models import CoPurchase
+
+        watermark = timezone.now()
+        since = self.watermark - timedelta(seconds=REFRESH_OVERLAP)
+        self.set_counts(
+            _pair_rows(CoPurchase.objects.filter(updated_at__gte=since))
+        )
+        self.watermark = watermark
+        self.loaded_at = time.monotonic()
+
+    def set_counts(self, rows):
+        """
+        Record absolute counts of (product_a, product_b, count) rows.
+
+        Counts only grow between rebuilds, so each pair keeps the largest
+        count seen: replaying a row is harmless.
+        """
+        with self._lock:
+            for a, b, count in rows:
+                a, b, count = int(a), int(b), int(count)
+                others = self._recent.setdefault(a, {})
+                if b not in others:
+                    self._recent_pairs += 1
+                    others[b] = count
+                    self._recent.setdefault(b, {})[a] = count
+                elif count > others[b]:
+                    others[b] = self._recent[b][a] = count
+            if self._recent_pairs > MAX_PENDING:
+                self._merge()
+
+    def _merge(self):
+        recent, self._recent, self._recent_pairs = self._recent, {}, 0
+        pairs = np.array(
+            [
+                (a, b, count)
+                for a, others in recent.items()
+                for b, count in others.items()
+                if a < b
+            ],
+            dtype=np.int64,
+        ).reshape(-1, 3)
+        new_ids = np.setdiff1d(pairs[:, :2], self.product_ids)
+        if new_ids.size:
+            # Grow the matrix to make room for first-time products
+            product_ids = np.union1d(self.product_ids, new_ids)
+            old = self.counts.tocoo()
+            remap = np.searchsorted(product_ids, self.product_ids)
+            self.counts = sparse.csr_matrix(
+                (old.data, (remap[old.row], remap[old.col])),
+                shape=(len(product_ids), len(product_ids)),
+            )
+            self.product_ids = product_ids
+
+        a = np.searchsorted(self.product_ids, pairs[:, 0])
+        b = np.searchsorted(self.product_ids, pairs[:, 1])
+        current = np.asarray(self.counts[a, b]).ravel()
+        values = np.maximum(pairs[:, 2] - current, 0)
+        delta = sparse.csr_matrix(
+            (
+                np.concatenate([values, values]),
+                (np.concatenate([a, b]), np.concatenate([b, a])),
+            ),
+            shape=self.counts.shape,
+        )
+        self.counts = self.counts + delta
+
+    def row(self, product_id):
+        """
+        Co-purchase counts of one product.
+
+        Returns:
+            dict of product_id -> count
+        """
+        result = {}
+        pos = np.searchsorted(self.product_ids, product_id)
+        if pos < len(self.product_ids) and self.product_ids[pos] == product_id:
+            start, end = self.counts.indptr[pos], self.counts.indptr[pos + 1]
+            for col, count in zip(
+                self.counts.indices[start:end], self.counts.data[start:end]
+            ):
+                result[int(self.product_ids[col])] = int(count)
+        with self._lock:
+            for other, count in self._recent.get(product_id, {}).items():
+                result[other] = max(result.get(other, 0), count)
+        return result
+
+    def affinity_vector(self, index, product_id):
+        """
+        Co-purchase affinity of every catalog-index row with a product.
+
+        Returns:
+            Array of length len(index) in [0, 1], scaled by the row max
+        """
+        affinity = np.zeros(len(index))
+        for pid, count in self.row(product_id).items():
+            position = index.positions.get(pid)
+            if position is not None:
+                affinity[position] = count
+        peak = affinity.max() if len(affinity) else 0
+        return affinity / peak if peak > 0 else affinity
+
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_copurchase_model():
+    """
+    Process-wide CoPurchaseModel.
+
+    The table is loaded once, and again after rebuild_copurchase; in
+    between, changed rows are read every AI_COPURCHASE_REFRESH seconds
+    by one request while the others keep using the current counts.
+    """
+    global _model
+    refresh = getattr(settings, "AI_COPURCHASE_REFRESH", 300)
+    version = get_version(REBUILD_VERSION_KEY)
+    model = _model
+    if model is not None and model.version == version:
+        if (
+            time.monotonic() - model.loaded_at >= refresh
+            and _model_lock.acquire(blocking=False)
+        ):
+            try:
+                if time.monotonic() - model.loaded_at >= refresh:
+                    model.refresh()
+            finally:
+                _model_lock.release()
+        return model
+
+    with _model_lock:
+        model = _model
+        if model is None or model.version != version:
+            model = CoPurchaseModel.load(version)
+            _model = model
+    return model
+
+
+def record_order(product_ids):
+    """
+    Count one committed order's product pairs.
+
+    All pairs go through one INSERT ... ON CONFLICT DO UPDATE that adds
+    to existing counts (PostgreSQL and SQLite 3.35+), so concurrent
+    orders touching the same new pair cannot lose an increment. The
+    statement returns the new totals, which patch this process's
+    in-memory matrix without a reload.
+    """
+    from .models import CoPurchase
+
+    product_ids = sorted(set(product_ids))
+    pairs = list(combinations(product_ids, 2))
+    if not pairs:
+        return
+
+    table = connection.ops.quote_name(CoPurchase._meta.db_table)
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    rows = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(pairs), UPSERT_BATCH_SIZE):
+            batch = pairs[start:start + UPSERT_BATCH_SIZE]
+            cursor.execute(
+                f"INSERT INTO {table}"
+                " (product_a_id, product_b_id, count, updated_at)"
+                f" VALUES {', '.join(['(%s, %s, 1, %s)'] * len(batch))}"
+                " ON CONFLICT (product_a_id, product_b_id) DO UPDATE"
+                f" SET count = {table}.count + excluded.count,"
+                " updated_at = excluded.updated_at"
+                " RETURNING product_a_id, product_b_id, count",
+                [value for a, b in batch for value in (a, b, now)],
+            )
+            rows.extend(cursor.fetchall())
+
+    if _model is not None:
+        _model.set_counts(rows)
+
+
+def rebuild_copurchase():
+    """
+    Recompute the CoPurchase table from all OrderItem rows.
+
+    Builds a sparse order x product incidence matrix B and takes the
+    upper triangle of B.T @ B as the pair counts.
+
+    Returns:
+        Number of product pairs written
+    """
+    global _model
+    from orders.models import OrderItem
+    from .models import CoPurchase
+
+    lines = np.array(
+        list(
+            OrderItem.objects.values_list("order_id", "product_id").iterator(
+                chunk_size=10000
+            )
+        ),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    order_ids, order_rows = np.unique(lines[:, 0], return_inverse=True)
+    product_ids, product_cols = np.unique(lines[:, 1], return_inverse=True)
+
+    incidence = sparse.csr_matrix(
+        (np.ones(len(lines)), (order_rows, product_cols)),
+        shape=(len(order_ids), len(product_ids)),
+    )
+    incidence.data[:] = 1.0  # a product repeated within one order counts once
+    pairs = sparse.triu(incidence.T @ incidence, k=1).tocoo()
+
+    with transaction.atomic():
+        CoPurchase.objects.all().delete()
+        for start in range(0, pairs.nnz, BATCH_SIZE):
+            end = start + BATCH_SIZE
+            CoPurchase.objects.bulk_create([
+                CoPurchase(
+                    product_a_id=int(product_ids[a]),
+                    product_b_id=int(product_ids[b]),
+                    count=int(count),
+                )
+                for a, b, count in zip(
+                    pairs.row[start:end], pairs.col[start:end],
+                    pairs.data[start:end],
+                )
+            ])
+
+    _model = None
+    # Other workers reload the whole table instead of merging into theirs
+    bump_version(REBUILD_VERSION_KEY)
+    return pairs.nnz
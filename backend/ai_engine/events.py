@@ -0,0 +1,198 @@
+"""
+Buffered event log for recommendation impressions, clicks and
+add-to-cart events.
+
+Request threads only append to an in-process ring buffer (a bounded
+deque): logging never touches the network and never blocks. A daemon
+thread drains the buffer in batches into a pluggable sink, MongoDB
+(insert_many into settings.MONGO_DB_NAME) by default. When the sink is
+slow or down the buffer wraps and the oldest events are dropped and
+counted, instead of slowing requests down.
+
+Sinks are classes with a write(events) method, selected with the
+AI_EVENT_SINK dotted path; MemorySink keeps events in memory for tests
+and local development.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPES = ("impression", "click", "add_to_cart")
+
+
+class MemorySink:
+    """Keeps written events in a list (tests, local development)."""
+
+    def __init__(self):
+        self.events = []
+
+    def write(self, events):
+        self.events.extend(events)
+
+
+class MongoSink:
+    """Writes events to the AI_EVENT_COLLECTION collection with insert_many."""
+
+    def __init__(self):
+        self._collection = None
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            from pymongo import MongoClient
+
+            client = MongoClient(
+                settings.MONGO_URI, serverSelectionTimeoutMS=2000
+            )
+            self._collection = client[settings.MONGO_DB_NAME][
+                settings.AI_EVENT_COLLECTION
+            ]
+        return self._collection
+
+    def write(self, events):
+        # Documents are copied: insert_many adds an _id to each one
+        self.collection.insert_many(
+            [dict(event) for event in events], ordered=False
+        )
+
+
+class EventLog:
+    """Ring buffer of events flushed to a sink by a background thread."""
+
+    def __init__(self, sink, capacity=10000, batch_size=500, flush_interval=1.0):
+        self.sink = sink
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer = deque(maxlen=capacity)
+        self.logged = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def log(self, event):
+        """Buffer one event dict; O(1), never blocks on the sink."""
+        self._ensure_thread()
+        if len(self.buffer) >= self.capacity:
+            self.dropped += 1  # the append below evicts the oldest event
+        self.buffer.append(event)
+        self.logged += 1
+        if len(self.buffer) >= self.batch_size:
+            self._wake.set()
+
+    def flush(self):
+        """Write everything buffered so far, one batch at a time."""
+        while self.buffer:
+            batch = []
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self.buffer.popleft())
+            except IndexError:
+                pass
+            try:
+                self.sink.write(batch)
+                self.written += len(batch)
+            except Exception:
+                self.failed += len(batch)
+                logger.warning(
+                    "Dropped %d events: sink write failed", len(batch),
+                    exc_info=True,
+                )
+
+    def stats(self):
+        return {
+            "sink": type(self.sink).__name__,
+            "buffered": len(self.buffer),
+            "capacity": self.capacity,
+            "logged": self.logged,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+    def close(self):
+        """Stop the flush thread after a final flush."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def _ensure_thread(self):
+        # Started lazily, and again in a forked worker (threads do not fork)
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._thread = threading.Thread(
+                    target=self._run, name="ai-event-flush", daemon=True
+                )
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+
+_event_log = None
+_event_log_lock = threading.Lock()
+
+
+def get_event_log():
+    """Process-wide EventLog writing to the AI_EVENT_SINK sink."""
+    global _event_log
+    if _event_log is None:
+        with _event_log_lock:
+            if _event_log is None:
+                _event_log = EventLog(
+                    import_string(settings.AI_EVENT_SINK)(),
+                    capacity=settings.AI_EVENT_BUFFER,
+                    batch_size=settings.AI_EVENT_BATCH,
+                    flush_interval=settings.AI_EVENT_FLUSH_INTERVAL,
+                )
+                atexit.register(_event_log.close)
+    return _event_log
+
+
+def log_event(event_type, product_id, user=None, **fields):
+    """
+    Record one event.
+
+    Args:
+        event_type: one of EVENT_TYPES
+        product_id: product the event is about
+        user: request.user (anonymous users are logged without an id)
+        fields: extra context, e.g. condition, source, position
+    """
+    get_event_log().log({
+        "type": event_type,
+        "product_id": product_id,
+        "user_id": getattr(user, "pk", None),
+        "ts": time.time(),
+        **fields,
+    })
+
+
+def log_impressions(product_ids, user=None, **fields):
+    """Record an impression per shown product, with its list position."""
+    for position, product_id in enumerate(product_ids):
+        log_event(
+            "impression", product_id, user, position=position, **fields
+        )
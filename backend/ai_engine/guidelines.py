@@ -0,0 +1,183 @@
+"""
+Dietary guideline rules compiled into a vectorized evaluator.
+
+Rules come from products.GuidelineRule rows, one set per HealthCategory
+(keyed by the category slug). They are compiled once into flat NumPy
+arrays so the whole catalog is checked with one comparison per operator,
+however many rules and conditions there are. The compiled RuleSet is
+versioned and recompiled only after a category or rule write bumps the
+shared rules version; other catalog writes leave it alone.
+"""
+
+import threading
+
+import numpy as np
+
+from .cache import bump_version, get_version
+
+RULES_VERSION_KEY = "ai:rules_version"
+
+RULE_OPERATORS = {
+    "lt": np.less,
+    "lte": np.less_equal,
+    "gt": np.greater,
+    "gte": np.greater_equal,
+    "eq": np.equal,
+}
+
+
+class _IssueValues(dict):
+    """format_map() mapping that leaves unknown {names} as written."""
+
+    def __missing__(self, key):
+        return "{" + key + "}"
+
+
+def format_issue(template, value):
+    """
+    Fill a rule's issue message with the product's amount.
+
+    Unknown placeholders are left as written, and a template that cannot
+    be formatted at all (a stray brace, a bad format spec) is returned
+    verbatim, so a misconfigured rule never fails a compliance check.
+    """
+    try:
+        return template.format_map(_IssueValues(value=value))
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return template
+
+
+class RuleSet:
+    """
+    Compiled guideline rules for every condition.
+
+    All rules are flattened into aligned arrays (nutrient, operator,
+    threshold); each condition owns a contiguous slice of columns.
+    """
+
+    def __init__(self, rules, version=0):
+        self.version = version
+        self.rules = {
+            condition: [tuple(rule) for rule in condition_rules]
+            for condition, condition_rules in rules.items()
+        }
+        self.conditions = list(self.rules)
+
+        flat = [rule for c in self.conditions for rule in self.rules[c]]
+        self.nutrients = [rule[0] for rule in flat]
+        self.operators = np.array([rule[1] for rule in flat], dtype=object)
+        self.thresholds = np.array(
+            [float(rule[2]) for rule in flat], dtype=np.float64
+        )
+        self.slices = {}
+        start = 0
+        for condition in self.conditions:
+            end = start + len(self.rules[condition])
+            self.slices[condition] = slice(start, end)
+            start = end
+
+    def __contains__(self, condition):
+        return condition in self.rules
+
+    def rule_nutrients(self, condition):
+        return [rule[0] for rule in self.rules.get(condition, [])]
+
+    def evaluate(self, matrix, fields):
+        """
+        Check every rule against every row of a nutrition matrix.
+
+        Args:
+            matrix: N x len(fields) array of nutrient values
+            fields: column names of `matrix`
+
+        Returns:
+            dict of condition -> (passes, score, compliant): an N x R
+            boolean matrix, 0-100 int scores and an "all rules pass" column
+        """
+        columns = [fields.index(nutrient) for nutrient in self.nutrients]
+        values = matrix[:, columns]
+        passes = np.zeros(values.shape, dtype=bool)
+        for op, compare in RULE_OPERATORS.items():
+            selected = self.operators == op
+            if selected.any():
+                passes[:, selected] = compare(
+                    values[:, selected], self.thresholds[selected]
+                )
+
+        results = {}
+        for condition in self.conditions:
+            condition_passes = passes[:, self.slices[condition]]
+            total = condition_passes.shape[1]
+            score = (
+                condition_passes.sum(axis=1) * 100 // total if total
+                else np.zeros(len(matrix), dtype=np.int64)
+            )
+            results[condition] = (
+                condition_passes, score, condition_passes.all(axis=1)
+            )
+        return results
+
+    def empty_result(self, size):
+        """Result for a condition without rules: nothing to fail."""
+        return (
+            np.zeros((size, 0), dtype=bool),
+            np.zeros(size, dtype=np.int64),
+            np.ones(size, dtype=bool),
+        )
+
+
+def load_rules():
+    """
+    Read rules from GuidelineRule rows, keyed by category slug.
+
+    Every HealthCategory is present; one without rows has no rules (and
+    nothing to fail) rather than borrowing defaults. The default rules
+    are seeded by the seed_data command.
+    """
+    from products.models import GuidelineRule, HealthCategory
+
+    rules = {
+        slug: [] for slug in
+        HealthCategory.objects.order_by("slug").values_list("slug", flat=True)
+    }
+    for slug, nutrient, operator, threshold, message, issue in (
+        GuidelineRule.objects.order_by(
+            "category__slug", "order", "id"
+        ).values_list(
+            "category__slug", "nutrient", "operator", "threshold",
+            "message", "issue_message",
+        )
+    ):
+        rules[slug].append(
+            (nutrient, operator, float(threshold), message, issue)
+        )
+    return rules
+
+
+_rule_set = None
+_rule_lock = threading.Lock()
+
+
+def get_rule_set():
+    """
+    Return the process-wide compiled RuleSet, recompiling if stale.
+
+    Rules are stale once any worker has bumped the shared rules version.
+    """
+    global _rule_set
+    generation = get_version(RULES_VERSION_KEY)
+    rule_set = _rule_set
+    if rule_set is not None and rule_set.version == generation:
+        return rule_set
+
+    with _rule_lock:
+        rule_set = _rule_set
+        if rule_set is None or rule_set.version != generation:
+            rule_set = RuleSet(load_rules(), version=generation)
+            _rule_set = rule_set
+    return rule_set
+
+
+def invalidate_rule_set():
+    """Mark every worker's rules stale; they are recompiled on next access."""
+    bump_version(RULES_VERSION_KEY)
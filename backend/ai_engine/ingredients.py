@@ -0,0 +1,149 @@
+"""
+Ingredient / allergen exclusion backed by packed product bitsets.
+
+All Ingredient rows are loaded once into an inverted index (ingredient
+name -> product rows). An exclusion term ("peanut", "shellfish") matches
+every ingredient name containing it; its products are kept as a packed
+bitset (one bit per product) so several terms combine with a bitwise OR
+and turn into a boolean mask without touching the database. The
+reserved term "flagged" matches every ingredient flagged as an allergen.
+Bitsets are built per term on first use, so memory grows with the terms
+guests ask for rather than with the ingredient vocabulary.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .cache import bump_version, get_version
+
+# Matches every Ingredient with is_flagged=True
+FLAGGED_TERM = "flagged"
+
+# Term bitsets kept per index (least recently used are dropped)
+MAX_CACHED_TERMS = 256
+
+# Shared version counter bumped by Ingredient edits (see signals.py)
+INGREDIENT_VERSION_KEY = "ai:ingredient_index_version"
+
+
+def parse_terms(value):
+    """
+    Normalize an exclude_ingredients value.
+
+    Args:
+        value: comma-separated string or iterable of terms
+
+    Returns:
+        Sorted tuple of distinct lower-cased, non-empty terms
+    """
+    if isinstance(value, str):
+        value = value.split(",")
+    return tuple(sorted({t.strip().lower() for t in value or () if t.strip()}))
+
+
+class IngredientIndex:
+    """Products of every ingredient name, with per-term packed bitsets."""
+
+    def __init__(self, rows, version=0):
+        """
+        Args:
+            rows: iterable of (product_id, name, is_flagged)
+            version: staleness token (see get_ingredient_index)
+        """
+        rows = list(rows)
+        self.version = version
+        ids = np.fromiter((row[0] for row in rows), np.int64, len(rows))
+        self.product_ids, positions = np.unique(ids, return_inverse=True)
+
+        postings = {}
+        flagged = []
+        for position, (_, name, is_flagged) in zip(positions.tolist(), rows):
+            postings.setdefault(name.strip().lower(), []).append(position)
+            if is_flagged:
+                flagged.append(position)
+        self.names = list(postings)
+        self.postings = [np.array(p, dtype=np.int64) for p in postings.values()]
+        self.flagged = np.array(flagged, dtype=np.int64)
+
+        self._bits = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def term_bits(self, term):
+        """Packed bitset of the products having an ingredient matching `term`."""
+        with self._lock:
+            bits = self._bits.get(term)
+            if bits is not None:
+                self._bits.move_to_end(term)
+                return bits
+
+        rows = np.zeros(len(self), dtype=bool)
+        if term == FLAGGED_TERM:
+            rows[self.flagged] = True
+        for name, posting in zip(self.names, self.postings):
+            if term in name:
+                rows[posting] = True
+        bits = np.packbits(rows)
+
+        with self._lock:
+            self._bits[term] = bits
+            if len(self._bits) > MAX_CACHED_TERMS:
+                self._bits.popitem(last=False)
+        return bits
+
+    def excluded_ids(self, terms):
+        """Sorted ids of the products containing any of `terms`."""
+        if not terms or not len(self):
+            return self.product_ids[:0]
+        bits = self.term_bits(terms[0])
+        for term in terms[1:]:
+            bits = bits | self.term_bits(term)
+        return self.product_ids[np.unpackbits(bits, count=len(self)).astype(bool)]
+
+    def mask(self, product_ids, terms):
+        """
+        Boolean mask over `product_ids` (sorted): True where the product
+        contains any of `terms`.
+        """
+        return np.isin(product_ids, self.excluded_ids(terms), assume_unique=True)
+
+
+def load_ingredients():
+    """Every Ingredient row as (product_id, name, is_flagged)."""
+    from products.models import Ingredient
+
+    return Ingredient.objects.values_list("product_id", "name", "is_flagged")
+
+
+_ingredient_index = None
+_ingredient_lock = threading.Lock()
+
+
+def get_ingredient_index():
+    """
+    Return the process-wide IngredientIndex, rebuilding it if stale.
+
+    It is stale once any worker has committed an Ingredient edit; other
+    catalog edits (prices, nutrition) leave it alone.
+    """
+    global _ingredient_index
+    version = get_version(INGREDIENT_VERSION_KEY)
+    index = _ingredient_index
+    if index is not None and index.version == version:
+        return index
+
+    with _ingredient_lock:
+        index = _ingredient_index
+        if index is None or index.version != version:
+            index = IngredientIndex(load_ingredients(), version=version)
+            _ingredient_index = index
+    return index
+
+
+def invalidate_ingredient_index():
+    """Mark every worker's ingredient index stale; rebuilt on next access."""
+    bump_version(INGREDIENT_VERSION_KEY)
@@ -0,0 +1,73 @@
+"""
+Recall-vs-latency benchmark of the approximate recommender index.
+
+Generates a synthetic catalog, then compares IVF search at several
+nprobe settings against exact scoring.
+
+Usage: python manage.py benchmark_ann --products 200000 --nprobe 16,32,48
+"""
+
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from ai_engine.ann import IVFIndex, recall_at_k
+from ai_engine.benchmark import synthetic_index
+from ai_engine.recommender import CONDITION_WEIGHTS
+
+
+class Command(BaseCommand):
+    help = "Measure recall and latency of IVF search against exact scoring"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=100000)
+        parser.add_argument("--queries", type=int, default=50)
+        parser.add_argument("--k", type=int, default=10)
+        parser.add_argument("--lists", type=int, default=0)
+        parser.add_argument("--nprobe", default="8,16,32,48,64")
+
+    def handle(self, *args, **options):
+        k = options["k"]
+        index = synthetic_index(options["products"])
+        rng = np.random.default_rng(1)
+        conditions = list(CONDITION_WEIGHTS)
+        queries = [
+            (conditions[i % len(conditions)], int(rng.integers(1, len(index))))
+            for i in range(options["queries"])
+        ]
+
+        started = time.perf_counter()
+        ann = IVFIndex(index.scoring_vectors(), n_lists=options["lists"])
+        self.stdout.write(
+            f"{len(index)} products, {ann.n_lists} lists, "
+            f"built in {time.perf_counter() - started:.2f}s"
+        )
+
+        exact, exact_ms = [], []
+        for condition, exclude_id in queries:
+            started = time.perf_counter()
+            ranked = index.top_k(index.score(condition), k, exclude_id)
+            exact_ms.append((time.perf_counter() - started) * 1000)
+            exact.append(np.array([pid for pid, _ in ranked]))
+        self.stdout.write(
+            f"exact        p50 {np.percentile(exact_ms, 50):7.2f} ms  "
+            f"p99 {np.percentile(exact_ms, 99):7.2f} ms"
+        )
+
+        for nprobe in [int(n) for n in options["nprobe"].split(",")]:
+            recalls, latencies = [], []
+            for (condition, exclude_id), expected in zip(queries, exact):
+                started = time.perf_counter()
+                rows, _ = ann.search(
+                    index.condition_query(condition), k, nprobe,
+                    [index.positions[exclude_id]],
+                )
+                latencies.append((time.perf_counter() - started) * 1000)
+                recalls.append(
+                    recall_at_k(index.product_ids[rows], expected)
+                )
+            self.stdout.write(
+                f"nprobe={nprobe:<5d} p50 {np.percentile(latencies, 50):7.2f} ms  "
+                f"p99 {np.percentile(latencies, 99):7.2f} ms  "
+                f"recall@{k} {np.mean(recalls):.3f}"
+            )
@@ -0,0 +1,201 @@
+"""
+Reproducible benchmark of the recommender and compliance engine.
+
+For each catalog size, a synthetic CatalogIndex is timed in memory:
+single-condition ranking, batch scoring, personalized ranking and bulk
+and per-product compliance. Sizes up to --endpoint-max are also inserted
+into the database (inside a transaction that is rolled back) and the
+/api/ai/ endpoints are timed through the Django test client with the
+response cache disabled. Results are printed, or written, as JSON.
+
+Usage:
+    python manage.py benchmark_recommender --sizes 1000,10000,100000,1000000
+    python manage.py benchmark_recommender --output bench.json
+"""
+
+import json
+import platform
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+
+from ai_engine.benchmark import (
+    create_synthetic_catalog,
+    measure,
+    peak_memory,
+    synthetic_arrays,
+)
+from ai_engine.guidelines import get_rule_set
+from ai_engine.recommender import (
+    NUTRITION_FIELDS,
+    SUITABILITY_FIELDS,
+    CatalogIndex,
+    check_compliance,
+    invalidate_catalog_index,
+)
+
+# Dummy cache: every endpoint call computes its response
+UNCACHED = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+
+class Rollback(Exception):
+    """Raised to discard the synthetic catalog after the endpoint runs."""
+
+
+class Command(BaseCommand):
+    help = "Benchmark recommendation and compliance latency on synthetic catalogs"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1000,10000,100000,1000000")
+        parser.add_argument("--repeat", type=int, default=50)
+        parser.add_argument(
+            "--endpoint-max", type=int, default=10000,
+            help="Largest size also benchmarked through the HTTP endpoints",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the JSON report here")
+
+    def handle(self, *args, **options):
+        repeat = options["repeat"]
+        seed = options["seed"]
+        report = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "repeat": repeat,
+            "seed": seed,
+            "results": [],
+        }
+
+        for size in [int(s) for s in options["sizes"].split(",")]:
+            result = {"products": size, "in_memory": self.in_memory(size, repeat, seed)}
+            if size <= options["endpoint_max"]:
+                result["endpoints"] = self.endpoints(size, repeat, seed)
+            report["results"].append(result)
+            self.stderr.write(f"{size} products done")
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+            self.stderr.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def in_memory(self, size, repeat, seed):
+        rng = np.random.default_rng(seed + 1)
+        conditions = list(SUITABILITY_FIELDS)
+        matrix, suitability, prices = synthetic_arrays(size, seed)
+        product_ids = np.arange(1, size + 1)
+
+        def build():
+            index = CatalogIndex(product_ids, matrix, suitability, prices)
+            index.score_many(conditions)
+            return index
+
+        started = time.perf_counter()
+        index, peak_mb = peak_memory(build)
+        build_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        index.ann_index(wait=True)
+        ann_build_s = time.perf_counter() - started
+
+        rule_set = get_rule_set()
+        excludes = iter(rng.integers(1, size + 1, 10 * repeat).tolist())
+        condition_cycle = iter(conditions * (10 * repeat))
+        product = _synthetic_product(matrix[0])
+
+        return {
+            "build_s": round(build_s, 3),
+            "peak_mb": peak_mb,
+            "ann_build_s": round(ann_build_s, 3),
+            "recommend": measure(
+                lambda: index.rank(next(condition_cycle), next(excludes), 4),
+                repeat,
+            ),
+            "batch_score": measure(lambda: index.score_many(conditions), repeat),
+            "personalized": measure(
+                lambda: index.top_k(
+                    np.where(
+                        rule_set.evaluate(index.matrix, NUTRITION_FIELDS)[
+                            "diabetes"
+                        ][2],
+                        index.score_profile(("diabetes", "hypertension")),
+                        -np.inf,
+                    ),
+                    4,
+                ),
+                repeat,
+            ),
+            "compliance_bulk": measure(
+                lambda: rule_set.evaluate(index.matrix, NUTRITION_FIELDS),
+                repeat,
+            ),
+            "check_compliance": measure(
+                lambda: check_compliance(product, next(condition_cycle)),
+                repeat,
+            ),
+        }
+
+    def endpoints(self, size, repeat, seed):
+        client = Client()
+        results = {}
+        try:
+            with override_settings(
+                CACHES=UNCACHED,
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+            ), transaction.atomic():
+                product_ids = create_synthetic_catalog(size, seed)
+                invalidate_catalog_index()
+                rng = np.random.default_rng(seed + 2)
+                picks = iter(rng.choice(product_ids, 10 * repeat).tolist())
+                conditions = iter(SUITABILITY_FIELDS * (10 * repeat))
+                urls = {
+                    "recommend": lambda: (
+                        f"/api/ai/recommend/?condition={next(conditions)}"
+                        f"&exclude={next(picks)}&limit=4"
+                    ),
+                    "compliance": lambda: (
+                        f"/api/ai/compliance/?product={next(picks)}"
+                        f"&condition={next(conditions)}"
+                    ),
+                    "compliance_bulk": lambda: (
+                        "/api/ai/compliance/bulk/?condition=diabetes"
+                    ),
+                }
+                # Warm the catalog index and compiled rules first
+                client.get(urls["recommend"]())
+                for name, url in urls.items():
+                    results[name] = measure(
+                        lambda: _get(client, url()), repeat
+                    )
+                raise Rollback
+        except Rollback:
+            pass
+        finally:
+            invalidate_catalog_index()
+        return results
+
+
+def _get(client, url):
+    response = client.get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f"{url} returned {response.status_code}")
+    return response
+
+
+def _synthetic_product(values):
+    """Unsaved Product with nutrition attached, for check_compliance()."""
+    from products.models import NutritionFacts, Product
+
+    product = Product(id=0, name="Benchmark product")
+    product.nutrition = NutritionFacts(
+        **dict(zip(NUTRITION_FIELDS, values.tolist()))
+    )
+    return product
@@ -0,0 +1,28 @@
+"""
+Fit and publish the recommender model artifact.
+
+Workers memory-map the new version and switch to it without a restart.
+Once built, the artifact is rebuilt in the background after catalog
+writes (see AI_MODEL_REBUILD_DELAY); run this after bulk imports, which
+send no signals.
+
+Usage: python manage.py build_recommender_model
+"""
+
+from django.core.management.base import BaseCommand
+from ai_engine.recommender import build_recommender_model, get_recommender_model
+
+
+class Command(BaseCommand):
+    help = "Build the memory-mapped recommender model artifact"
+
+    def handle(self, *args, **options):
+        version = build_recommender_model()
+        model = get_recommender_model()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Recommender model v{version} written "
+                f"({model.meta['products']} products, "
+                f"catalog version {model.meta['catalog_version']})"
+            )
+        )
@@ -0,0 +1,23 @@
+"""
+Precompute the similar-products neighbour graph.
+
+Usage: python manage.py build_similarity_graph
+"""
+
+from django.core.management.base import BaseCommand
+from ai_engine.similarity import build_similarity_graph, get_similarity_graph
+
+
+class Command(BaseCommand):
+    help = "Rebuild the top-K similar-products graph artifact"
+
+    def handle(self, *args, **options):
+        version = build_similarity_graph()
+        graph = get_similarity_graph()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Similarity graph v{version} written "
+                f"({len(graph['product_ids'])} products, "
+                f"k={graph['neighbors'].shape[1]})"
+            )
+        )
@@ -0,0 +1,39 @@
+"""
+Precompute top-N recommendations per condition and popular product.
+
+Run after catalog changes (e.g. from cron or after a bulk import); until
+then the recommend endpoint falls back to live scoring.
+
+Usage: python manage.py precompute_recommendations [--top-n 20] [--popular 100]
+"""
+
+from django.core.management.base import BaseCommand
+from ai_engine.precompute import precompute_recommendations
+
+
+class Command(BaseCommand):
+    help = "Rebuild the PrecomputedRecommendation table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--top-n", type=int, default=20,
+            help="Products stored per condition/exclusion",
+        )
+        parser.add_argument(
+            "--popular", type=int, default=100,
+            help="Most-ordered products to precompute exclusions for",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=None,
+            help="Process pool size (default: one per condition)",
+        )
+
+    def handle(self, *args, **options):
+        rows = precompute_recommendations(
+            top_n=options["top_n"],
+            popular=options["popular"],
+            workers=options["workers"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Precomputed recommendations written ({rows} rows)")
+        )
@@ -0,0 +1,18 @@
+"""
+Recompute co-purchase counts from the full order history.
+
+Usage: python manage.py rebuild_copurchase
+"""
+
+from django.core.management.base import BaseCommand
+from ai_engine.copurchase import rebuild_copurchase
+
+
+class Command(BaseCommand):
+    help = "Rebuild the CoPurchase table from all OrderItem rows"
+
+    def handle(self, *args, **options):
+        pairs = rebuild_copurchase()
+        self.stdout.write(
+            self.style.SUCCESS(f"Co-purchase counts rebuilt ({pairs} pairs)")
+        )
@@ -0,0 +1,35 @@
+"""
+Derive ProductSuitability scores from every product's NutritionFacts.
+
+Run after supplier imports (bulk_create sends no signals) or after
+changing CONDITION_WEIGHTS or the guideline rules.
+
+Usage: python manage.py recompute_suitability [--chunk-size 10000] [--workers 4]
+"""
+
+from django.core.management.base import BaseCommand
+from ai_engine.suitability import CHUNK_SIZE, recompute_suitability
+
+
+class Command(BaseCommand):
+    help = "Recompute ProductSuitability scores from nutrition data"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size", type=int, default=CHUNK_SIZE,
+            help="Products scored per worker task",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=None,
+            help="Process pool size (default: CPU count)",
+        )
+
+    def handle(self, *args, **options):
+        updated, created = recompute_suitability(
+            chunk_size=options["chunk_size"], workers=options["workers"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Suitability recomputed ({updated} updated, {created} created)"
+            )
+        )
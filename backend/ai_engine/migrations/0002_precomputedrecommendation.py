@@ -0,0 +1,29 @@
+# Generated by Django 5.1.15 on 2026-10-18 08:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_engine', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrecomputedRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('condition', models.CharField(max_length=50)),
+                ('exclude', models.PositiveIntegerField(default=0, help_text='Excluded product id (0 = none)')),
+                ('top_n', models.PositiveIntegerField()),
+                ('product_ids', models.JSONField(default=list)),
+                ('scores', models.JSONField(default=list)),
+                ('catalog_version', models.BigIntegerField()),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('condition', 'exclude')},
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.15 on 2026-10-18 14:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_engine', '0002_precomputedrecommendation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='copurchase',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
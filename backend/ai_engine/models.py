@@ -1,3 +1,47 @@
 from django.db import models
 
-# Create your models here.
+
+class CoPurchase(models.Model):
+    """Number of orders that contained both products (product_a < product_b)."""
+
+    product_a = models.ForeignKey(
+        "products.Product", on_delete=models.CASCADE, related_name="+"
+    )
+    product_b = models.ForeignKey(
+        "products.Product", on_delete=models.CASCADE, related_name="+"
+    )
+    count = models.PositiveIntegerField(default=0)
+    # Watermark for the workers' incremental refresh (see copurchase.py)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Co-purchase"
+        unique_together = [("product_a", "product_b")]
+
+    def __str__(self):
+        return f"{self.product_a_id} + {self.product_b_id} ({self.count})"
+
+
+class PrecomputedRecommendation(models.Model):
+    """
+    Offline top-N recommendations for one condition and excluded product.
+
+    Written by the precompute_recommendations command; rows built from an
+    older catalog_version are stale and ignored.
+    """
+
+    condition = models.CharField(max_length=50)
+    exclude = models.PositiveIntegerField(
+        default=0, help_text="Excluded product id (0 = none)"
+    )
+    top_n = models.PositiveIntegerField()
+    product_ids = models.JSONField(default=list)
+    scores = models.JSONField(default=list)
+    catalog_version = models.BigIntegerField()
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [("condition", "exclude")]
+
+    def __str__(self):
+        return f"{self.condition} (exclude {self.exclude or '-'})"
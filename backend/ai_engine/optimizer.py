@@ -0,0 +1,120 @@
+"""
+Constraint-based basket optimizer for hotel procurement.
+
+Chooses integer quantities per product that maximize aggregate
+suitability for the target conditions, subject to a budget, a minimum
+number of servings (headcount) and caps on total nutrients. Solved as a
+mixed-integer linear program (scipy's HiGHS milp) over the CatalogIndex
+matrix, pruned to the best-scoring and the cheapest candidates to keep
+it sub-second.
+"""
+
+import time
+
+import numpy as np
+from django.conf import settings
+from scipy.optimize import Bounds, LinearConstraint, milp
+
+from .recommender import NUTRITION_FIELDS, get_catalog_index
+
+
+def optimize_basket(
+    budget, conditions, headcount, caps=None, max_per_product=None,
+    compliant_only=True,
+):
+    """
+    Find the most suitable product/quantity mix for a procurement order.
+
+    Args:
+        budget: maximum total price
+        conditions: condition slugs whose blended profile is maximized
+        headcount: minimum total number of servings
+        caps: dict of NUTRITION_FIELDS name -> maximum basket total
+        max_per_product: quantity cap per product (defaults to headcount)
+        compliant_only: only consider products passing every condition's
+            guidelines
+
+    Returns:
+        dict with 'status', 'items' (OrderCreateSerializer item format:
+        product_id/quantity), 'total_price', 'suitability' and 'nutrition'.
+        status is 'optimal', 'time_limit' (best basket found within
+        AI_BASKET_TIME_LIMIT), 'no_solution' (time limit reached before
+        any basket was found) or 'infeasible'.
+    """
+    started = time.perf_counter()
+    caps = caps or {}
+    max_per_product = max_per_product or headcount
+
+    index = get_catalog_index()
+    value = index.score_profile(conditions)
+    eligible = index.in_stock & (index.prices > 0)
+    if compliant_only:
+        for condition in conditions:
+            eligible &= index.compliance(condition)[2]
+
+    # Keep the best-scoring candidates so the MILP stays small, plus the
+    # cheapest ones: a tight budget or a large headcount may only be
+    # reachable with products that score lower
+    candidates = np.flatnonzero(eligible)
+    limit = getattr(settings, "AI_BASKET_CANDIDATES", 300)
+    if len(candidates) > limit:
+        cheap = limit // 4
+        best = np.argpartition(-value[candidates], limit - cheap - 1)
+        cheapest = np.argpartition(index.prices[candidates], cheap)[:cheap]
+        candidates = candidates[
+            np.union1d(best[:limit - cheap], cheapest)
+        ]
+
+    result = {
+        "status": "infeasible",
+        "items": [],
+        "total_price": 0.0,
+        "suitability": 0.0,
+        "nutrition": {field: 0.0 for field in NUTRITION_FIELDS},
+    }
+    if len(candidates) == 0:
+        result["solve_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+    prices = index.prices[candidates]
+    nutrition = index.matrix[candidates]
+
+    rows = [prices, np.ones(len(candidates))]
+    lower = [0, headcount]
+    upper = [budget, np.inf]
+    for field, cap in caps.items():
+        rows.append(nutrition[:, NUTRITION_FIELDS.index(field)])
+        lower.append(0)
+        upper.append(cap)
+
+    solution = milp(
+        c=-value[candidates],
+        constraints=LinearConstraint(np.vstack(rows), lower, upper),
+        integrality=np.ones(len(candidates)),
+        bounds=Bounds(0, max_per_product),
+        options={"time_limit": getattr(settings, "AI_BASKET_TIME_LIMIT", 0.8)},
+    )
+
+    if solution.x is None and solution.status == 1:
+        result["status"] = "no_solution"
+    if solution.x is not None:
+        quantities = np.round(solution.x).astype(np.int64)
+        chosen = np.flatnonzero(quantities > 0)
+        result.update({
+            "status": "optimal" if solution.status == 0 else "time_limit",
+            "items": [
+                {
+                    "product_id": int(index.product_ids[candidates[i]]),
+                    "quantity": int(quantities[i]),
+                }
+                for i in chosen[np.argsort(-quantities[chosen], kind="stable")]
+            ],
+            "total_price": round(float(prices @ quantities), 2),
+            "suitability": round(float(value[candidates] @ quantities), 3),
+            "nutrition": {
+                field: round(float(total), 1)
+                for field, total in zip(NUTRITION_FIELDS, quantities @ nutrition)
+            },
+        })
+    result["solve_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return result
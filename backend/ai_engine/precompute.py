@@ -0,0 +1,143 @@
+"""
+Offline top-N recommendations per condition and popular excluded product.
+
+The precompute_recommendations command scores the catalog once, ranks
+every condition in a process pool and stores the winners in the
+PrecomputedRecommendation table. Serving then costs one indexed lookup;
+rows from an older catalog version are ignored and the caller falls
+back to live scoring.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Sum
+
+from .cache import get_catalog_version
+from .recommender import SUITABILITY_FIELDS, CatalogIndex
+
+
+def _rank_condition(condition, scores, product_ids, excludes, top_n):
+    """
+    Top-N rows of one condition for no exclusion and each of `excludes`.
+
+    The top N + 1 rows are sorted once; each exclusion is answered by
+    dropping its product from that list.
+
+    Returns:
+        List of (condition, exclude, product_ids, scores); exclude 0 = none
+    """
+    keep = min(top_n + 1, len(scores))
+    if keep == 0:
+        return [(condition, 0, [], [])] + [
+            (condition, exclude, [], []) for exclude in excludes
+        ]
+    top = np.argpartition(-scores, keep - 1)[:keep]
+    top = top[np.argsort(-scores[top], kind="stable")]
+    ranked_ids = product_ids[top].tolist()
+    ranked_scores = scores[top].tolist()
+
+    rows = [(condition, 0, ranked_ids[:top_n], ranked_scores[:top_n])]
+    for exclude in excludes:
+        kept = [
+            (pid, score) for pid, score in zip(ranked_ids, ranked_scores)
+            if pid != exclude
+        ][:top_n]
+        rows.append((
+            condition, exclude,
+            [pid for pid, _ in kept], [score for _, score in kept],
+        ))
+    return rows
+
+
+def popular_products(count):
+    """Ids of the `count` products ordered in the largest quantities."""
+    from orders.models import OrderItem
+
+    if count <= 0:
+        return []
+    return list(
+        OrderItem.objects.values("product_id")
+        .annotate(total=Sum("quantity"))
+        .order_by("-total", "product_id")
+        .values_list("product_id", flat=True)[:count]
+    )
+
+
+def precompute_recommendations(top_n=20, popular=100, workers=None):
+    """
+    Rebuild the PrecomputedRecommendation table.
+
+    Args:
+        top_n: products stored per row
+        popular: number of most-ordered products to precompute
+            "exclude=<id>" rows for (the currently viewed product)
+        workers: process pool size (defaults to one per condition, up to
+            the CPU count); 1 ranks in this process
+
+    Returns:
+        Number of rows written
+    """
+    from .models import PrecomputedRecommendation
+
+    # Read first: a write landing mid-build leaves the rows stale, not wrong
+    catalog_version = get_catalog_version()
+    index = CatalogIndex.build()
+    scores = index.score_many(SUITABILITY_FIELDS)
+    excludes = [pid for pid in popular_products(popular) if pid in index.positions]
+
+    jobs = [
+        (condition, np.ascontiguousarray(scores[:, column]), index.product_ids,
+         excludes, top_n)
+        for column, condition in enumerate(SUITABILITY_FIELDS)
+    ]
+    workers = workers or min(len(jobs), os.cpu_count() or 1)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_rank_condition, *zip(*jobs)))
+    else:
+        results = [_rank_condition(*job) for job in jobs]
+
+    rows = [
+        PrecomputedRecommendation(
+            condition=condition,
+            exclude=exclude,
+            top_n=top_n,
+            product_ids=product_ids,
+            scores=condition_scores,
+            catalog_version=catalog_version,
+        )
+        for condition_rows in results
+        for condition, exclude, product_ids, condition_scores in condition_rows
+    ]
+    with transaction.atomic():
+        PrecomputedRecommendation.objects.all().delete()
+        PrecomputedRecommendation.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def get_precomputed(condition, exclude_id=None, limit=4):
+    """
+    Precomputed top `limit` for a condition, from one indexed query.
+
+    Returns:
+        List of (product_id, score) tuples, or None when there is no
+        current row or `limit` exceeds the stored top_n
+    """
+    from .models import PrecomputedRecommendation
+
+    row = (
+        PrecomputedRecommendation.objects.filter(
+            condition=condition, exclude=exclude_id or 0
+        )
+        .values_list("catalog_version", "top_n", "product_ids", "scores")
+        .first()
+    )
+    if row is None or row[0] != get_catalog_version():
+        return None
+    _, top_n, product_ids, scores = row
+    if limit > top_n:
+        return None
+    return list(zip(product_ids, scores))[:max(int(limit), 0)]
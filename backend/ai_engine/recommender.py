@@ -3,9 +3,27 @@ AI-powered recommendation engine using scikit-learn.
 Content-based filtering on product nutrition vectors.
 """
 
+import logging
+import threading
+import time
+from functools import lru_cache
+
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.preprocessing import MinMaxScaler
+from django.conf import settings
+from django.db import close_old_connections
+
+from .ann import IVFIndex
+from .artifacts import (
+    ArtifactCache,
+    artifact_lock,
+    current_version,
+    load_artifact,
+    write_artifact,
+)
+from .cache import get_catalog_version
+from .guidelines import RULE_OPERATORS, format_issue, get_rule_set
+
+logger = logging.getLogger(__name__)
 
 # Condition-specific weight profiles:
 # Higher weight = more important for that condition
@@ -66,58 +84,948 @@ def build_nutrition_vector(nutrition_obj):
     ])
 
 
-def get_recommendations(condition, products_qs, exclude_id=None, limit=4):
+SUITABILITY_FIELDS = ["cardiovascular", "diabetes", "hypertension"]
+
+# Name of the memory-mapped model artifact under settings.AI_MODEL_DIR
+MODEL_ARTIFACT = "recommender"
+
+# IVF indexes a large CatalogIndex keeps: kind -> method giving its vectors
+ANN_KINDS = {"scoring": "scoring_vectors", "features": "feature_vectors"}
+
+# Blend between the weighted nutrition score and the stored suitability score
+CONTENT_WEIGHT = 0.4
+SUITABILITY_WEIGHT = 0.6
+
+
+class ProductPositions:
     """
-    Get AI-powered product recommendations for a health condition.
+    Product id -> row lookup over the sorted product_ids array.
+
+    Uses binary search rather than a per-process dict, so a memory-mapped
+    index costs no extra resident memory per worker.
+    """
+
+    def __init__(self, product_ids):
+        self.product_ids = product_ids
+
+    def get(self, product_id, default=None):
+        row = int(np.searchsorted(self.product_ids, product_id))
+        if row < len(self.product_ids) and self.product_ids[row] == product_id:
+            return row
+        return default
+
+    def __contains__(self, product_id):
+        return self.get(product_id) is not None
+
+    def __getitem__(self, product_id):
+        row = self.get(product_id)
+        if row is None:
+            raise KeyError(product_id)
+        return row
+
+
+class CatalogIndex:
+    """
+    In-memory matrix view of the whole catalog.
+
+    Holds every product's NUTRITION_FIELDS as one float matrix, with the
+    suitability columns and product ids (sorted ascending) aligned
+    row-for-row, so a condition is scored with a single matrix-vector
+    product. Built from the database, or memory-mapped from the
+    build_recommender_model artifact.
+    """
+
+    def __init__(
+        self, product_ids, matrix, suitability, prices=None, in_stock=None,
+        generation=0, normalized=None, condition_scores=None, scaled=None,
+        scale=None, ann=None,
+    ):
+        self.product_ids = np.asarray(product_ids, dtype=np.int64)
+        self.matrix = np.asarray(matrix, dtype=np.float64).reshape(
+            len(self.product_ids), len(NUTRITION_FIELDS)
+        )
+        self.suitability = np.asarray(suitability, dtype=np.float64).reshape(
+            len(self.product_ids), len(SUITABILITY_FIELDS)
+        )
+        self.has_suitability = ~np.isnan(self.suitability).any(axis=1)
+        self.prices = (
+            np.zeros(len(self.product_ids)) if prices is None
+            else np.asarray(prices, dtype=np.float64)
+        )
+        self.in_stock = (
+            np.ones(len(self.product_ids), dtype=bool) if in_stock is None
+            else np.asarray(in_stock, dtype=bool)
+        )
+        self.generation = generation
+
+        if normalized is None:
+            # Row-normalize once instead of on every scoring call
+            norms = np.linalg.norm(self.matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            normalized = self.matrix / norms
+        self.normalized = normalized
+
+        # Optional precomputed artifact columns (see build_recommender_model)
+        self.condition_scores = condition_scores
+        self._scaled = scaled
+        self._scale = scale
+
+        self.positions = ProductPositions(self.product_ids)
+        self._compliance = {}
+        self._compliance_version = None
+        self._features = None
+        # ANN_KINDS -> IVFIndex, and the threads training missing ones
+        self._ann = dict(ann or {})
+        self._ann_builds = {}
+        self._ann_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    @classmethod
+    def build(cls, generation=0):
+        """Load the catalog from the database in a single query."""
+        from products.models import NutritionFacts
+
+        columns = ["product__price", "product__in_stock"]
+        columns += list(NUTRITION_FIELDS) + [
+            f"product__suitability__{field}" for field in SUITABILITY_FIELDS
+        ]
+        rows = list(
+            NutritionFacts.objects.order_by("product_id").values_list(
+                "product_id", *columns
+            )
+        )
+        n_fields = len(NUTRITION_FIELDS)
+        product_ids = [row[0] for row in rows]
+        prices = [float(row[1]) for row in rows]
+        in_stock = [row[2] for row in rows]
+        matrix = [
+            [float(value or 0) for value in row[3:n_fields + 3]]
+            for row in rows
+        ]
+        suitability = [
+            [np.nan if value is None else float(value)
+             for value in row[n_fields + 3:]]
+            for row in rows
+        ]
+        return cls(
+            product_ids, matrix, suitability, prices, in_stock,
+            generation=generation,
+        )
+
+    @classmethod
+    def from_artifact(cls, artifact, generation=0):
+        """Wrap the memory-mapped arrays of a recommender model artifact."""
+        # Artifacts written before "scale" was stored hold a min-max
+        # "scaled" matrix: ignore it and scale lazily instead
+        scale = artifact.arrays.get("scale")
+        ann = {
+            kind: IVFIndex.from_arrays(
+                artifact[f"ann_{kind}_vectors"],
+                artifact[f"ann_{kind}_centroids"],
+                artifact[f"ann_{kind}_order"],
+                artifact[f"ann_{kind}_offsets"],
+            )
+            for kind in ANN_KINDS
+            if f"ann_{kind}_centroids" in artifact.arrays
+        }
+        return cls(
+            artifact["product_ids"],
+            artifact["matrix"],
+            artifact["suitability"],
+            artifact["prices"],
+            artifact["in_stock"],
+            generation=generation,
+            normalized=artifact["normalized"],
+            condition_scores=artifact["condition_scores"],
+            scaled=artifact["scaled"] if scale is not None else None,
+            scale=scale,
+            ann=ann,
+        )
+
+    def score(self, condition):
+        """Score every product for a condition; returns an array of length N."""
+        return self.score_many([condition])[:, 0]
+
+    def score_many(self, conditions):
+        """
+        Score every product for several conditions in one pass.
+
+        Returns:
+            N x len(conditions) array of scores
+        """
+        if self.condition_scores is not None:
+            return self.condition_scores[
+                :, [SUITABILITY_FIELDS.index(c) for c in conditions]
+            ]
+
+        weight_matrix = np.array([
+            [CONDITION_WEIGHTS[c].get(f, 0) for f in NUTRITION_FIELDS]
+            for c in conditions
+        ]).reshape(len(conditions), len(NUTRITION_FIELDS))
+        scores = self.normalized @ weight_matrix.T
+
+        existing = self.suitability[
+            :, [SUITABILITY_FIELDS.index(c) for c in conditions]
+        ]
+        return np.where(
+            self.has_suitability[:, None],
+            CONTENT_WEIGHT * scores + SUITABILITY_WEIGHT * existing / 100.0,
+            scores,
+        )
+
+    def score_profile(self, conditions):
+        """Score every product against a blended multi-condition profile."""
+        weight_vector, column_weights = blended_weights(tuple(conditions))
+        scores = self.normalized @ weight_vector
+        existing = self.suitability @ column_weights
+        return np.where(
+            self.has_suitability,
+            CONTENT_WEIGHT * scores + SUITABILITY_WEIGHT * existing / 100.0,
+            scores,
+        )
+
+    def contributions(self, condition, rows):
+        """
+        Break score(condition) for `rows` down into its terms.
+
+        Returns:
+            (nutrients, suitability): a len(rows) x len(NUTRITION_FIELDS)
+            matrix of content weight x condition weight x normalized
+            value, and the SUITABILITY_WEIGHT x suitability / 100 blend
+            term (0 for products without suitability scores). Each row of
+            nutrients plus its suitability term sums to the score.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        weights = np.array(
+            [CONDITION_WEIGHTS[condition].get(f, 0) for f in NUTRITION_FIELDS]
+        )
+        has_suitability = self.has_suitability[rows]
+        content = np.where(has_suitability, CONTENT_WEIGHT, 1.0)
+        nutrients = content[:, None] * self.normalized[rows] * weights
+        existing = self.suitability[rows, SUITABILITY_FIELDS.index(condition)]
+        suitability = np.where(
+            has_suitability, SUITABILITY_WEIGHT * existing / 100.0, 0.0
+        )
+        return nutrients, suitability
+
+    def compliance(self, condition):
+        """
+        Evaluate a condition's guideline rules over the whole catalog.
+
+        All conditions are evaluated together with the compiled RuleSet
+        and cached until either the index or the rules change.
+
+        Returns:
+            (passes, score, compliant): an N x R boolean matrix aligned with
+            the condition's rules, 0-100 int scores and a boolean
+            "all rules pass" column
+        """
+        rule_set = get_rule_set()
+        if self._compliance_version != rule_set.version:
+            self._compliance = rule_set.evaluate(self.matrix, NUTRITION_FIELDS)
+            self._compliance_version = rule_set.version
+        if condition not in self._compliance:
+            return rule_set.empty_result(len(self))
+        return self._compliance[condition]
+
+    def top_k(self, scores, limit, exclude_id=None):
+        """
+        Pick the `limit` best rows with a partial sort.
+
+        Returns:
+            List of (product_id, score) tuples sorted by score desc
+        """
+        scores = np.array(scores, dtype=np.float64)
+        if exclude_id is not None and exclude_id in self.positions:
+            scores[self.positions[exclude_id]] = -np.inf
+
+        candidates = int(np.isfinite(scores).sum())
+        limit = min(max(int(limit), 0), candidates)
+        if limit == 0:
+            return []
+
+        if limit < len(scores):
+            top = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(self.product_ids[i]), float(scores[i])) for i in top]
+
+    def rank(self, condition, exclude_id=None, limit=4):
+        """
+        Top `limit` products for a condition.
+
+        Large catalogs (AI_ANN_MIN_PRODUCTS and up) are searched with the
+        approximate IVF index; smaller ones are scored exactly.
+        """
+        ann = self.ann_index()
+        if ann is None:
+            return self.top_k(self.score(condition), limit, exclude_id)
+
+        exclude_rows = []
+        if exclude_id is not None and exclude_id in self.positions:
+            exclude_rows = [self.positions[exclude_id]]
+        rows, scores = ann.search(
+            self.condition_query(condition), max(int(limit), 0),
+            settings.AI_ANN_NPROBE, exclude_rows,
+        )
+        return [
+            (int(self.product_ids[row]), float(score))
+            for row, score in zip(rows, scores)
+        ]
+
+    def scoring_vectors(self):
+        """
+        Rows whose inner product with condition_query() equals score().
+
+        Each row is [a * normalized nutrition, suitability / 100] with
+        a = CONTENT_WEIGHT when the product has suitability scores (else
+        1, with zero suitability).
+        """
+        content = np.where(self.has_suitability, CONTENT_WEIGHT, 1.0)
+        suitability = np.where(
+            self.has_suitability[:, None], self.suitability, 0.0
+        )
+        return np.hstack([
+            content[:, None] * self.normalized, suitability / 100.0
+        ])
+
+    def condition_query(self, condition):
+        """[condition weights, SUITABILITY_WEIGHT * one-hot(condition)]"""
+        weights = CONDITION_WEIGHTS[condition]
+        return np.concatenate([
+            [weights.get(f, 0) for f in NUTRITION_FIELDS],
+            [SUITABILITY_WEIGHT if field == condition else 0.0
+             for field in SUITABILITY_FIELDS],
+        ])
+
+    def column_scale(self):
+        """Per-field maxima (1 where a column is all zeros)."""
+        if self._scale is None:
+            scale = self.matrix.max(axis=0) if len(self) else np.ones(
+                len(NUTRITION_FIELDS)
+            )
+            self._scale = np.where(scale > 0, scale, 1.0)
+        return self._scale
+
+    def scaled_matrix(self):
+        """Nutrition rows divided by column_scale(), so mg fields do not dominate."""
+        if self._scaled is None:
+            self._scaled = self.matrix / self.column_scale()
+        return self._scaled
+
+    def feature_vectors(self):
+        """
+        Column-max scaled, L2-normalized nutrition rows, computed once.
+
+        Inner products between rows are cosine similarities in which mg
+        fields do not outweigh gram fields.
+        """
+        if self._features is None:
+            features = self.scaled_matrix()
+            norms = np.linalg.norm(features, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self._features = features / norms
+        return self._features
+
+    def ann_index(self, kind="scoring", wait=False):
+        """
+        IVF index over scoring_vectors() or feature_vectors() (`kind`).
+
+        Only large catalogs (AI_ANN_MIN_PRODUCTS and up) get one. It comes
+        from the model artifact when that holds it; otherwise it is
+        trained on a background thread, and None is returned until it is
+        ready so callers keep scoring exactly. `wait` blocks until then.
+        """
+        if len(self) < settings.AI_ANN_MIN_PRODUCTS:
+            return None
+        ann = self._ann.get(kind)
+        if ann is not None:
+            return ann
+        with self._ann_lock:
+            thread = self._ann_builds.get(kind)
+            if thread is None:
+                thread = self._ann_builds[kind] = threading.Thread(
+                    target=self._build_ann, args=(kind,),
+                    name=f"ai-ann-{kind}", daemon=True,
+                )
+                thread.start()
+        if wait:
+            thread.join()
+        return self._ann.get(kind)
+
+    def _build_ann(self, kind):
+        try:
+            vectors = getattr(self, ANN_KINDS[kind])()
+            self._ann[kind] = IVFIndex(vectors, n_lists=settings.AI_ANN_LISTS)
+        except Exception:
+            logger.exception("Training the %s ANN index failed", kind)
+
+
+def normalize_conditions(conditions):
+    """Known conditions from `conditions`, de-duplicated and sorted."""
+    return tuple(sorted({c for c in conditions if c in CONDITION_WEIGHTS}))
+
+
+@lru_cache(maxsize=64)
+def blended_weights(conditions):
+    """
+    Average the CONDITION_WEIGHTS profiles of several conditions.
+
+    Cached per distinct condition set, so users with the same health
+    profile share one precomputed vector.
+
+    Args:
+        conditions: tuple as returned by normalize_conditions()
+
+    Returns:
+        (nutrition weight vector, suitability column weights)
+    """
+    weight_vector = np.mean([
+        [CONDITION_WEIGHTS[c].get(f, 0) for f in NUTRITION_FIELDS]
+        for c in conditions
+    ], axis=0)
+    column_weights = np.array([
+        1.0 / len(conditions) if field in conditions else 0.0
+        for field in SUITABILITY_FIELDS
+    ])
+    weight_vector.setflags(write=False)
+    column_weights.setflags(write=False)
+    return weight_vector, column_weights
+
+
+_catalog_index = None
+_catalog_generation = 0
+_catalog_lock = threading.Lock()
+
+
+_model_cache = ArtifactCache(MODEL_ARTIFACT)
+
+
+def get_recommender_model():
+    """The memory-mapped CURRENT recommender model artifact, or None."""
+    return _model_cache.get()
+
+
+def get_catalog_index():
+    """
+    Return the process-wide CatalogIndex, rebuilding it if stale.
+
+    The index is stale after a local write, or when another worker has
+    bumped the shared catalog version. While the CURRENT recommender
+    model artifact was built from the current catalog version, its
+    memory-mapped arrays are used instead of querying the database.
+    """
+    global _catalog_index
+    catalog_version = get_catalog_version()
+    model = get_recommender_model()
+    if model is not None and model.meta.get("catalog_version") != catalog_version:
+        model = None
+    generation = (
+        _catalog_generation, catalog_version, model and model.version
+    )
+
+    index = _catalog_index
+    if index is not None and index.generation == generation:
+        return index
+
+    with _catalog_lock:
+        index = _catalog_index
+        if index is None or index.generation != generation:
+            if model is not None:
+                index = CatalogIndex.from_artifact(model, generation=generation)
+            else:
+                index = CatalogIndex.build(generation=generation)
+            _catalog_index = index
+    return index
+
+
+def build_recommender_model(only_if_stale=False):
+    """
+    Fit and write the recommender model artifact from the live catalog.
+
+    Stores the catalog arrays, the L2-normalized and column-max scaled
+    matrices (with the column scale), one precomputed score column per
+    condition and, for large catalogs, the trained IVF indexes, tagged
+    with the catalog version they were built from.
+
+    Args:
+        only_if_stale: skip the build when the CURRENT artifact already
+            matches the catalog version (another worker rebuilt it)
+
+    Returns:
+        The artifact version written, or None when skipped
+    """
+    with artifact_lock(MODEL_ARTIFACT):
+        catalog_version = get_catalog_version()
+        if only_if_stale:
+            model = load_artifact(MODEL_ARTIFACT)
+            if model is not None and (
+                model.meta.get("catalog_version") == catalog_version
+            ):
+                return None
+
+        index = CatalogIndex.build()
+        condition_scores = index.score_many(SUITABILITY_FIELDS)
+        # Large catalogs ship their trained IVF lists, so no worker trains
+        ann_arrays = {}
+        for kind in ANN_KINDS:
+            ann = index.ann_index(kind, wait=True)
+            if ann is not None:
+                ann_arrays[f"ann_{kind}_vectors"] = ann.vectors
+                for key, array in ann.arrays().items():
+                    ann_arrays[f"ann_{kind}_{key}"] = array
+        version = write_artifact(
+            MODEL_ARTIFACT,
+            {
+                "product_ids": index.product_ids,
+                "matrix": index.matrix,
+                "suitability": index.suitability,
+                "prices": index.prices,
+                "in_stock": index.in_stock,
+                "normalized": index.normalized,
+                "scaled": index.scaled_matrix(),
+                "scale": index.column_scale(),
+                "condition_scores": condition_scores,
+                **ann_arrays,
+            },
+            meta={
+                "catalog_version": catalog_version,
+                "fields": NUTRITION_FIELDS,
+                "conditions": SUITABILITY_FIELDS,
+                "products": len(index),
+            },
+        )
+    _model_cache.reset()
+    return version
+
+
+_rebuild_timer = None
+_rebuild_lock = threading.Lock()
+
+
+def schedule_model_rebuild():
+    """
+    Rebuild a stale model artifact in the background after catalog writes.
+
+    Writes within AI_MODEL_REBUILD_DELAY seconds share one rebuild, and
+    workers that wake for the same write skip it once one has rebuilt.
+    Nothing is scheduled until build_recommender_model has been run once,
+    or when the delay is 0.
+    """
+    global _rebuild_timer
+    if settings.AI_MODEL_REBUILD_DELAY <= 0:
+        return
+    if current_version(MODEL_ARTIFACT) is None:
+        return
+    with _rebuild_lock:
+        # Timers do not survive a fork: is_alive() is False in the child
+        if _rebuild_timer is not None and _rebuild_timer.is_alive():
+            return
+        _rebuild_timer = threading.Timer(
+            settings.AI_MODEL_REBUILD_DELAY, _rebuild_model
+        )
+        _rebuild_timer.daemon = True
+        _rebuild_timer.start()
+
 
-    Uses cosine similarity between product nutrition vectors
-    weighted by condition-specific importance factors.
+def _rebuild_model():
+    global _rebuild_timer
+    with _rebuild_lock:
+        # Writes from here on schedule the next rebuild
+        _rebuild_timer = None
+    close_old_connections()
+    try:
+        build_recommender_model(only_if_stale=True)
+    except Exception:
+        logger.exception("Recommender model rebuild failed")
+    finally:
+        close_old_connections()
+
+
+def invalidate_catalog_index():
+    """Mark the process-wide index stale; it is rebuilt on next access."""
+    global _catalog_generation
+    _catalog_generation += 1
+
+
+def _exclude_ingredients(index, scores, terms):
+    """Set the score of products containing any of `terms` to -inf."""
+    if not terms:
+        return scores
+    from .ingredients import get_ingredient_index
+
+    excluded = get_ingredient_index().mask(index.product_ids, terms)
+    return np.where(excluded, -np.inf, scores)
+
+
+def _excluded_ids(index, terms):
+    """Ids of the indexed products containing any of `terms`."""
+    if not terms:
+        return set()
+    from .ingredients import get_ingredient_index
+
+    excluded = get_ingredient_index().mask(index.product_ids, terms)
+    return set(index.product_ids[excluded].tolist())
+
+
+def diversify(index, ranked, limit, diversity, terms=None):
+    """
+    Maximal-marginal-relevance re-ranking of a candidate list.
+
+    Picks `limit` candidates one at a time, maximizing
+    (1 - diversity) * relevance - diversity * (max similarity to the
+    products already picked). Relevance is the min-max scaled score and
+    similarity the cosine of the cached CatalogIndex.feature_vectors().
+
+    Args:
+        index: CatalogIndex the candidates come from
+        ranked: candidate (product_id, score) tuples sorted by score desc
+        limit: number of products to keep
+        diversity: 0 (pure score order) to 1 (pure novelty)
+        terms: optional dict, filled with product_id -> {"relevance",
+            "penalty"}: the scaled score and diversity x similarity
+            subtracted from it when the product was picked
+
+    Returns:
+        (ranked, meta): the re-ranked tuples and a dict with the number
+        of candidates, re-ranking time, score loss against the plain
+        top-k and mean pairwise similarity before/after
+    """
+    started = time.perf_counter()
+    limit = min(max(int(limit), 0), len(ranked))
+    meta = {"diversity": diversity, "candidates": len(ranked)}
+    if limit == 0:
+        meta.update(rerank_ms=0.0, score_loss=0.0)
+        return [], meta
+
+    rows = np.array([index.positions[pid] for pid, _ in ranked])
+    scores = np.array([score for _, score in ranked])
+    vectors = index.feature_vectors()[rows]
+    similarity = vectors @ vectors.T
+
+    spread = scores.max() - scores.min()
+    relevance = (
+        (scores - scores.min()) / spread if spread > 0
+        else np.ones(len(scores))
+    )
+
+    picked = [0]
+    if terms is not None:
+        terms[ranked[0][0]] = {
+            "relevance": round(float(relevance[0]), 4), "penalty": 0.0,
+        }
+    nearest = similarity[0].copy()
+    available = np.ones(len(ranked), dtype=bool)
+    available[0] = False
+    while len(picked) < limit:
+        value = (1 - diversity) * relevance - diversity * nearest
+        value[~available] = -np.inf
+        best = int(np.argmax(value))
+        picked.append(best)
+        if terms is not None:
+            terms[ranked[best][0]] = {
+                "relevance": round(float(relevance[best]), 4),
+                "penalty": round(float(diversity * nearest[best]), 4),
+            }
+        available[best] = False
+        np.maximum(nearest, similarity[best], out=nearest)
+
+    def mean_similarity(selected):
+        if len(selected) < 2:
+            return 0.0
+        block = similarity[np.ix_(selected, selected)]
+        pairs = len(selected) * (len(selected) - 1)
+        return float((block.sum() - np.trace(block)) / pairs)
+
+    top = list(range(limit))
+    meta.update(
+        rerank_ms=round((time.perf_counter() - started) * 1000, 3),
+        score_loss=round(float(scores[top].mean() - scores[picked].mean()), 4),
+        similarity_before=round(mean_similarity(top), 4),
+        similarity_after=round(mean_similarity(picked), 4),
+    )
+    return [ranked[i] for i in picked], meta
+
+
+def rank_recommendations(
+    condition, exclude_id=None, limit=4, copurchase_weight=0.0,
+    exclude_ingredients=(), diversity=0.0, meta=None, strategy=None,
+    explanations=None,
+):
+    """
+    Rank products for a health condition without loading any of them.
+
+    Candidates always come from a registered scoring strategy (see
+    strategies.py); ingredient exclusions, co-purchase blending and
+    diversity are applied on top of its output. Blending and diversity
+    re-rank the strategy's top AI_MMR_CANDIDATES, so a product outside
+    them is never pulled in by co-purchase affinity alone.
 
     Args:
         condition: 'cardiovascular' | 'diabetes' | 'hypertension'
-        products_qs: QuerySet of Product objects with nutrition
         exclude_id: Product ID to exclude (current product)
         limit: Number of recommendations
+        copurchase_weight: 0-1 share of the score taken from how often
+            each product is bought together with `exclude_id`
+        exclude_ingredients: terms (see ingredients.parse_terms); products
+            with a matching ingredient are never recommended
+        diversity: 0-1 MMR trade-off; above 0 the candidates are
+            re-ranked with diversify()
+        meta: optional dict, updated with diversify()'s statistics
+        strategy: registered strategy name (default settings.AI_STRATEGY)
+        explanations: optional dict, filled with product_id -> breakdown
+            of its returned score (see explain_recommendations)
 
     Returns:
-        List of (product, score) tuples sorted by score desc
+        List of (product_id, score) tuples sorted by score desc
     """
     if condition not in CONDITION_WEIGHTS:
         return []
+    from . import strategies
 
-    weights = CONDITION_WEIGHTS[condition]
-    weight_vector = np.array([weights.get(f, 0) for f in NUTRITION_FIELDS])
+    blend = copurchase_weight > 0 and exclude_id is not None
+    pool = limit
+    if blend or diversity > 0:
+        pool = max(settings.AI_MMR_CANDIDATES, limit)
 
-    products_with_scores = []
+    index = get_catalog_index()
+    excluded = _excluded_ids(index, exclude_ingredients)
+    # Ask for enough candidates that `pool` survive the exclusions even
+    # when the strategy ranks every excluded product first
+    scoring = {}
+    ranked = strategies.rank(
+        strategy or settings.AI_STRATEGY, condition, exclude_id,
+        min(pool + len(excluded), len(index)), scoring,
+    )
+    content_share = scoring.get("content_share", 1.0)
+    ranked = [item for item in ranked if item[0] not in excluded][:pool]
 
-    for product in products_qs:
-        if product.id == exclude_id:
-            continue
-        if not hasattr(product, "nutrition"):
+    if blend:
+        from .copurchase import get_copurchase_model
+
+        affinity = get_copurchase_model().affinity_vector(index, exclude_id)
+        content_share *= 1 - copurchase_weight
+        ranked = sorted(
+            (
+                (
+                    pid,
+                    (1 - copurchase_weight) * score
+                    + copurchase_weight * float(affinity[index.positions[pid]]),
+                )
+                for pid, score in ranked
+            ),
+            key=lambda item: -item[1],
+        )
+
+    terms = {} if explanations is not None and diversity > 0 else None
+    if diversity > 0:
+        ranked, stats = diversify(index, ranked, limit, diversity, terms)
+        if meta is not None:
+            meta.update(stats)
+    ranked = ranked[:limit]
+    if explanations is not None:
+        explanations.update(
+            explain_recommendations(condition, ranked, content_share, terms)
+        )
+    return ranked
+
+
+def explain_recommendations(
+    condition, ranked, content_share=1.0, diversity_terms=None,
+):
+    """
+    Break each served score down into the terms it was computed from.
+
+    The content score is split per nutrient in one vectorized
+    CatalogIndex.contributions() call and scaled by `content_share`; the
+    rest of the score is co-purchase affinity. The terms sum to the
+    served score.
+
+    Args:
+        ranked: (product_id, score) tuples as returned to the client
+        content_share: weight of the content score in those scores
+        diversity_terms: diversify() terms; MMR reorders products without
+            changing their scores, so these explain the order only
+
+    Returns:
+        dict of product_id -> {"nutrients": {field: contribution},
+        "suitability": blend term, "copurchase": affinity term, "score":
+        their sum}, plus "diversity" ({"relevance", "penalty"}) when
+        diversity_terms are given
+    """
+    index = get_catalog_index()
+    ranked = [(pid, score) for pid, score in ranked if pid in index.positions]
+    if condition not in CONDITION_WEIGHTS or not ranked:
+        return {}
+    nutrients, suitability = index.contributions(
+        condition, [index.positions[pid] for pid, _ in ranked]
+    )
+    nutrients *= content_share
+    suitability = suitability * content_share
+    served = np.array([score for _, score in ranked])
+    copurchase = served - nutrients.sum(axis=1) - suitability
+    # + 0.0 turns float noise rounded to -0.0 into 0.0
+    nutrients = (nutrients.round(4) + 0.0).tolist()
+    copurchase = copurchase.round(4) + 0.0
+    explanations = {}
+    for (pid, score), terms, term, affinity in zip(
+        ranked, nutrients, suitability, copurchase
+    ):
+        explanations[pid] = {
+            "nutrients": dict(zip(NUTRITION_FIELDS, terms)),
+            "suitability": round(float(term), 4),
+            "copurchase": float(affinity),
+            "score": round(float(score), 4),
+        }
+        if diversity_terms is not None:
+            explanations[pid]["diversity"] = diversity_terms.get(pid)
+    return explanations
+
+
+def get_recommendations(
+    condition, products_qs, exclude_id=None, limit=4, copurchase_weight=0.0,
+    exclude_ingredients=(), diversity=0.0, meta=None, strategy=None,
+    explanations=None,
+):
+    """
+    Get AI-powered product recommendations for a health condition.
+
+    Ranks with rank_recommendations() (same arguments), then loads only
+    the winning products from `products_qs` in one in_bulk fetch; no
+    other Product rows are hydrated.
+
+    Args:
+        products_qs: QuerySet of Product objects to load results from
+
+    Returns:
+        List of (product, score) tuples sorted by score desc
+    """
+    ranked = rank_recommendations(
+        condition, exclude_id, limit, copurchase_weight,
+        exclude_ingredients, diversity, meta, strategy, explanations,
+    )
+    products = products_qs.in_bulk([pid for pid, _ in ranked])
+    return [
+        (products[pid], score) for pid, score in ranked if pid in products
+    ]
+
+
+def get_batch_recommendations(queries, products_qs):
+    """
+    Batch version of get_recommendations.
+
+    All queries are scored together in one vectorized pass and the
+    winning products are loaded with a single shared fetch.
+
+    Args:
+        queries: iterable of (condition, exclude_id, limit) tuples
+        products_qs: QuerySet of Product objects to load results from
+
+    Returns:
+        List (aligned with `queries`) of lists of (product, score) tuples;
+        queries with an unknown condition get an empty list
+    """
+    queries = list(queries)
+    conditions = sorted({
+        condition for condition, _, _ in queries
+        if condition in CONDITION_WEIGHTS
+    })
+    if not conditions:
+        return [[] for _ in queries]
+
+    index = get_catalog_index()
+    scores = index.score_many(conditions)
+
+    ranked = []
+    for condition, exclude_id, limit in queries:
+        if condition not in CONDITION_WEIGHTS:
+            ranked.append([])
             continue
+        column = scores[:, conditions.index(condition)]
+        ranked.append(index.top_k(column, limit, exclude_id))
 
-        nutrition_vec = build_nutrition_vector(product.nutrition)
+    products = products_qs.in_bulk(
+        {pid for results in ranked for pid, _ in results}
+    )
+    return [
+        [(products[pid], score) for pid, score in results if pid in products]
+        for results in ranked
+    ]
 
-        # Normalize the nutrition vector
-        norms = np.linalg.norm(nutrition_vec)
-        if norms > 0:
-            normalized = nutrition_vec / norms
-        else:
-            normalized = nutrition_vec
 
-        # Weighted dot product as similarity score
-        score = np.dot(normalized, weight_vector)
+def get_personalized_recommendations(
+    conditions, products_qs, exclude_id=None, limit=4, exclude_ingredients=(),
+):
+    """
+    Recommendations for a user with several health conditions.
+
+    Products are ranked against the blended profile of all `conditions`;
+    products failing any condition's guidelines are masked out before
+    the top-k is taken.
+
+    Args:
+        conditions: iterable of condition slugs (e.g. from health_profile)
+        products_qs: QuerySet of Product objects to load results from
+        exclude_id: Product ID to exclude (current product)
+        limit: Number of recommendations
+        exclude_ingredients: terms; products with a matching ingredient
+            are masked out like non-compliant ones
+
+    Returns:
+        List of (product, score) tuples sorted by score desc
+    """
+    conditions = normalize_conditions(conditions)
+    if not conditions or limit <= 0:
+        return []
+
+    index = get_catalog_index()
+    scores = index.score_profile(conditions)
+    for condition in conditions:
+        _, _, compliant = index.compliance(condition)
+        scores = np.where(compliant, scores, -np.inf)
+    scores = _exclude_ingredients(index, scores, exclude_ingredients)
+
+    ranked = index.top_k(scores, limit, exclude_id)
+    products = products_qs.in_bulk([pid for pid, _ in ranked])
+    return [
+        (products[pid], score) for pid, score in ranked if pid in products
+    ]
+
 
-        # Blend with existing suitability score if available
-        if hasattr(product, "suitability"):
-            existing = getattr(product.suitability, condition, 50) / 100.0
-            score = 0.4 * score + 0.6 * existing
+def check_compliance_bulk(conditions, product_ids=None):
+    """
+    Compliance of every catalog product against several conditions.
 
-        products_with_scores.append((product, float(score)))
+    Evaluated as boolean masks over the CatalogIndex matrix, so the
+    whole product x condition grid costs one vectorized pass per rule.
 
-    # Sort by score descending and return top N
-    products_with_scores.sort(key=lambda x: x[1], reverse=True)
-    return products_with_scores[:limit]
+    Args:
+        conditions: iterable of condition slugs
+        product_ids: optional iterable restricting the returned rows
+
+    Returns:
+        (product_ids, {condition: (passes, score, compliant)}) with rows
+        aligned to the returned product_ids
+    """
+    index = get_catalog_index()
+    rows = np.arange(len(index))
+    if product_ids is not None:
+        rows = np.array(
+            sorted(
+                index.positions[pid] for pid in set(product_ids)
+                if pid in index.positions
+            ),
+            dtype=np.int64,
+        )
+
+    grid = {}
+    for condition in conditions:
+        passes, score, compliant = index.compliance(condition)
+        grid[condition] = (passes[rows], score[rows], compliant[rows])
+    return index.product_ids[rows], grid
 
 
 def check_compliance(product, condition):
@@ -140,72 +1048,14 @@ def check_compliance(product, condition):
     issues = []
     passes = []
 
-    if condition == "cardiovascular":
-        # Saturated fat < 2g
-        if float(n.saturated_fat) < 2:
-            passes.append("Low saturated fat ✓")
-        else:
-            issues.append(f"Saturated fat too high ({n.saturated_fat}g, max 2g)")
-
-        # Sodium < 400mg
-        if n.sodium < 400:
-            passes.append("Low sodium ✓")
-        else:
-            issues.append(f"Sodium too high ({n.sodium}mg, max 400mg)")
-
-        # Fiber > 3g
-        if float(n.fiber) >= 3:
-            passes.append("High fiber ✓")
-        else:
-            issues.append(f"Fiber too low ({n.fiber}g, min 3g)")
-
-        # Trans fat = 0
-        if float(n.trans_fat) == 0:
-            passes.append("No trans fats ✓")
-        else:
-            issues.append(f"Contains trans fats ({n.trans_fat}g)")
-
-    elif condition == "diabetes":
-        # Low sugars < 5g
-        if float(n.sugars) < 5:
-            passes.append("Low added sugars ✓")
-        else:
-            issues.append(f"Sugar too high ({n.sugars}g, max 5g)")
-
-        # Fiber > 3g
-        if float(n.fiber) >= 3:
-            passes.append("High fiber ✓")
+    for field, op, threshold, pass_message, issue_message in (
+        get_rule_set().rules.get(condition, [])
+    ):
+        value = getattr(n, field)
+        if RULE_OPERATORS[op](float(value), threshold):
+            passes.append(pass_message)
         else:
-            issues.append(f"Fiber too low ({n.fiber}g, min 3g)")
-
-        # Moderate carbs < 45g
-        if float(n.total_carbs) <= 45:
-            passes.append("Moderate carbohydrates ✓")
-        else:
-            issues.append(
-                f"Carbs too high ({n.total_carbs}g, max 45g)"
-            )
-
-    elif condition == "hypertension":
-        # Very low sodium < 200mg
-        if n.sodium < 200:
-            passes.append("Very low sodium ✓")
-        else:
-            issues.append(f"Sodium too high ({n.sodium}mg, max 200mg)")
-
-        # Potassium > 300mg
-        if n.potassium >= 300:
-            passes.append("Rich in potassium ✓")
-        else:
-            issues.append(f"Low potassium ({n.potassium}mg, min 300mg)")
-
-        # Low saturated fat
-        if float(n.saturated_fat) < 2:
-            passes.append("Low saturated fat ✓")
-        else:
-            issues.append(
-                f"Saturated fat too high ({n.saturated_fat}g, max 2g)"
-            )
+            issues.append(format_issue(issue_message, value))
 
     total_checks = len(issues) + len(passes)
     score = int((len(passes) / total_checks * 100)) if total_checks > 0 else 0
@@ -0,0 +1,63 @@
+from rest_framework import serializers
+from .events import EVENT_TYPES
+from .recommender import CONDITION_WEIGHTS, NUTRITION_FIELDS
+
+
+class RecommendationQuerySerializer(serializers.Serializer):
+    """One (condition, exclude, limit) query of a batch request."""
+
+    key = serializers.CharField(required=False, max_length=100)
+    condition = serializers.ChoiceField(choices=sorted(CONDITION_WEIGHTS))
+    exclude = serializers.IntegerField(required=False, allow_null=True)
+    limit = serializers.IntegerField(required=False, default=4, min_value=0)
+
+
+class BatchRecommendationSerializer(serializers.Serializer):
+    queries = RecommendationQuerySerializer(many=True, allow_empty=False)
+
+    def validate_queries(self, queries):
+        if len(queries) > 100:
+            raise serializers.ValidationError(
+                "At most 100 queries per batch."
+            )
+        return queries
+
+
+class BasketOptimizationSerializer(serializers.Serializer):
+    """Input of the basket optimizer."""
+
+    budget = serializers.DecimalField(
+        max_digits=12, decimal_places=2, min_value=0
+    )
+    conditions = serializers.ListField(
+        child=serializers.ChoiceField(choices=sorted(CONDITION_WEIGHTS)),
+        allow_empty=False,
+    )
+    headcount = serializers.IntegerField(min_value=1)
+    caps = serializers.DictField(
+        child=serializers.FloatField(min_value=0), required=False, default=dict
+    )
+    max_per_product = serializers.IntegerField(min_value=1, required=False)
+    compliant_only = serializers.BooleanField(required=False, default=True)
+
+    def validate_caps(self, caps):
+        unknown = sorted(set(caps) - set(NUTRITION_FIELDS))
+        if unknown:
+            raise serializers.ValidationError(
+                f"Unknown nutrients: {', '.join(unknown)}"
+            )
+        return caps
+
+
+class EventSerializer(serializers.Serializer):
+    """A click or add-to-cart on a recommended product."""
+
+    type = serializers.ChoiceField(
+        choices=[t for t in EVENT_TYPES if t != "impression"]
+    )
+    product_id = serializers.IntegerField(min_value=1)
+    condition = serializers.ChoiceField(
+        choices=sorted(CONDITION_WEIGHTS), required=False
+    )
+    source = serializers.CharField(required=False, max_length=50)
+    position = serializers.IntegerField(required=False, min_value=0)
@@ -0,0 +1,140 @@
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from products.models import (
+    GuidelineRule,
+    HealthCategory,
+    Ingredient,
+    NutritionFacts,
+    Product,
+    ProductSuitability,
+)
+from .cache import bump_catalog_version
+from .guidelines import invalidate_rule_set
+from .ingredients import invalidate_ingredient_index
+from .recommender import invalidate_catalog_index, schedule_model_rebuild
+from .similarity import schedule_similarity_update
+from .suitability import update_product_suitability
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(m2m_changed, sender=Product.categories.through)
+@receiver(post_save, sender=NutritionFacts)
+@receiver(post_delete, sender=NutritionFacts)
+@receiver(post_save, sender=ProductSuitability)
+@receiver(post_delete, sender=ProductSuitability)
+@receiver(post_save, sender=HealthCategory)
+@receiver(post_delete, sender=HealthCategory)
+@receiver(post_save, sender=GuidelineRule)
+@receiver(post_delete, sender=GuidelineRule)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def catalog_version_changed(sender, **kwargs):
+    """
+    Bump the shared catalog version once the write is committed.
+
+    This orphans every cached AI response, tells the other workers
+    their catalog indexes are stale, and queues a rebuild
+    of the recommender model artifact.
+    """
+    transaction.on_commit(bump_catalog_version)
+    transaction.on_commit(schedule_model_rebuild)
+
+
+@receiver(post_save, sender=NutritionFacts)
+@receiver(post_delete, sender=NutritionFacts)
+@receiver(post_save, sender=ProductSuitability)
+@receiver(post_delete, sender=ProductSuitability)
+def catalog_changed(sender, **kwargs):
+    """Rebuild the catalog index once the write is committed."""
+    transaction.on_commit(invalidate_catalog_index)
+
+
+@receiver(post_save, sender=NutritionFacts)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def similarity_changed(sender, instance, **kwargs):
+    """Queue the edited product for the next similar-products graph patch."""
+    transaction.on_commit(
+        lambda: schedule_similarity_update(instance.product_id)
+    )
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=NutritionFacts)
+def similarity_deleted(sender, instance, **kwargs):
+    """Queue the product's removal from the similar-products graph."""
+    product_id = instance.pk if sender is Product else instance.product_id
+    transaction.on_commit(
+        lambda: schedule_similarity_update(product_id, deleted=True)
+    )
+
+
+# Products to rescore, and products given suitability scores by hand, in
+# this thread's current transaction
+_rescore = threading.local()
+
+
+def _rescore_state():
+    """
+    Rescore state of the current transaction.
+
+    Reset when another outermost atomic block starts, so a rolled-back
+    transaction (whose on_commit callbacks never run) leaves nothing
+    behind.
+    """
+    block = connection.atomic_blocks[0] if connection.atomic_blocks else None
+    if not hasattr(_rescore, "pending") or _rescore.block is not block:
+        _rescore.block = block
+        _rescore.pending = set()
+        _rescore.edited = set()
+    return _rescore
+
+
+def _rescore_pending():
+    pending = _rescore.pending - _rescore.edited
+    _rescore.pending = set()
+    _rescore.edited = set()
+    for product_id in pending:
+        update_product_suitability(product_id)
+
+
+@receiver(post_save, sender=NutritionFacts)
+def nutrition_rescored(sender, instance, **kwargs):
+    """
+    Re-derive the edited product's suitability scores once committed.
+
+    Skipped for products whose ProductSuitability was saved in the same
+    transaction (e.g. both inlines of the Product admin form), so scores
+    entered by hand are not overwritten.
+    """
+    if settings.AI_AUTO_SUITABILITY and not kwargs.get("raw"):
+        _rescore_state().pending.add(instance.product_id)
+        transaction.on_commit(_rescore_pending)
+
+
+@receiver(post_save, sender=ProductSuitability)
+def suitability_edited(sender, instance, **kwargs):
+    """Keep suitability saved in this transaction from being rescored."""
+    if connection.in_atomic_block:
+        _rescore_state().edited.add(instance.product_id)
+
+
+@receiver(post_save, sender=HealthCategory)
+@receiver(post_delete, sender=HealthCategory)
+@receiver(post_save, sender=GuidelineRule)
+@receiver(post_delete, sender=GuidelineRule)
+def guidelines_changed(sender, **kwargs):
+    """Recompile every worker's guideline rules once the edit is committed."""
+    transaction.on_commit(invalidate_rule_set)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredients_changed(sender, **kwargs):
+    """Rebuild every worker's ingredient index once the edit is committed."""
+    transaction.on_commit(invalidate_ingredient_index)
@@ -0,0 +1,444 @@
+"""
+Item-to-item "similar products" graph.
+
+Products are compared by cosine similarity of their column-scaled
+nutrition vectors, optionally mixed with ingredient overlap (Jaccard).
+The top-K neighbours of every product are precomputed and stored as a
+memory-mapped artifact. Nutrition, ingredient and product edits are
+queued and patched into the graph by a debounced background thread,
+instead of recomputing the full N x N matrix inside the request. Live lookups on large
+catalogs shortlist candidates with the approximate IVF index.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections
+from scipy import sparse
+from sklearn.metrics.pairwise import cosine_similarity
+
+from .artifacts import ArtifactCache, artifact_lock, load_artifact, write_artifact
+from .ingredients import get_ingredient_index
+from .recommender import get_catalog_index
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_NAME = "similar"
+
+# Rows compared per block during a full build (bounds peak memory)
+BLOCK_SIZE = 1024
+
+# Share of the catalog changed at once above which a patch rebuilds
+REBUILD_FRACTION = 0.1
+
+_graph_cache = ArtifactCache(ARTIFACT_NAME)
+
+
+def _settings():
+    k = getattr(settings, "AI_SIMILAR_K", 10)
+    weight = getattr(settings, "AI_SIMILAR_INGREDIENT_WEIGHT", 0.2)
+    return k, weight
+
+
+def _features(index, scale=None):
+    """Column-scaled nutrition matrix, so mg fields do not dominate."""
+    if scale is None or np.array_equal(scale, index.column_scale()):
+        return index.scaled_matrix(), index.column_scale()
+    return index.matrix / scale, scale
+
+
+def _ingredient_matrix(index):
+    """
+    Sparse binary product x ingredient-name matrix aligned with `index`.
+
+    Built from the postings of the in-memory IngredientIndex, so no
+    query runs while that index is current.
+    """
+    ingredient_index = get_ingredient_index()
+    catalog_rows = _catalog_rows(index, ingredient_index.product_ids)
+    postings = ingredient_index.postings
+    positions = (
+        np.concatenate(postings) if postings else np.empty(0, dtype=np.int64)
+    )
+    cols = np.repeat(np.arange(len(postings)), [len(p) for p in postings])
+    rows = catalog_rows[positions]
+    keep = rows >= 0
+    matrix = sparse.csr_matrix(
+        (np.ones(int(keep.sum())), (rows[keep], cols[keep])),
+        shape=(len(index), max(len(postings), 1)),
+    )
+    matrix.data[:] = 1.0  # duplicate names on one product count once
+    return matrix
+
+
+def _similarity(features, ingredients, rows, ingredient_weight, columns=None):
+    """
+    Similarity of `rows` against every product (or only `columns`).
+
+    Returns:
+        len(rows) x N (or len(rows) x len(columns)) array
+    """
+    if columns is None:
+        columns = slice(None)
+    sims = cosine_similarity(features[rows], features[columns])
+    if ingredients is not None and ingredient_weight > 0:
+        overlap = (ingredients[rows] @ ingredients[columns].T).toarray()
+        sizes = np.asarray(ingredients.sum(axis=1)).ravel()
+        union = sizes[rows][:, None] + sizes[columns][None, :] - overlap
+        jaccard = np.divide(
+            overlap, union, out=np.zeros_like(overlap), where=union > 0
+        )
+        sims = (1 - ingredient_weight) * sims + ingredient_weight * jaccard
+    return sims
+
+
+def _top_neighbours(sims, self_rows, k):
+    """Top-k columns per row of `sims`, excluding each row's own product."""
+    sims = np.array(sims, dtype=np.float64)
+    sims[np.arange(len(self_rows)), self_rows] = -np.inf
+    k = min(k, max(sims.shape[1] - 1, 0))
+    if k == 0:
+        empty = np.empty((len(self_rows), 0), dtype=np.int64)
+        return empty, empty.astype(np.float32)
+    top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(sims, top, axis=1), axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    return top, np.take_along_axis(sims, top, axis=1).astype(np.float32)
+
+
+def build_similarity_graph():
+    """
+    Recompute the full neighbour graph and write it as a new version.
+
+    Returns:
+        The artifact version written
+    """
+    k, ingredient_weight = _settings()
+    index = get_catalog_index()
+    features, scale = _features(index)
+    ingredients = _ingredient_matrix(index) if ingredient_weight > 0 else None
+
+    width = min(k, max(len(index) - 1, 0))
+    neighbors = np.full((len(index), width), -1, dtype=np.int64)
+    scores = np.full((len(index), width), -np.inf, dtype=np.float32)
+    for start in range(0, len(index), BLOCK_SIZE):
+        rows = np.arange(start, min(start + BLOCK_SIZE, len(index)))
+        sims = _similarity(features, ingredients, rows, ingredient_weight)
+        top, top_scores = _top_neighbours(sims, rows, k)
+        neighbors[rows] = index.product_ids[top]
+        scores[rows] = top_scores
+
+    with artifact_lock(ARTIFACT_NAME):
+        version = write_artifact(
+            ARTIFACT_NAME,
+            {
+                "product_ids": index.product_ids,
+                "neighbors": neighbors,
+                "scores": scores,
+                "scale": scale,
+            },
+            meta={"k": k, "ingredient_weight": ingredient_weight},
+        )
+    _graph_cache.reset()
+    return version
+
+
+def update_similarity_graph(product_ids=(), deleted_ids=()):
+    """
+    Patch the stored graph after products changed or were deleted.
+
+    Rows of changed products are recomputed, and so is every row that
+    listed a changed or deleted product as a neighbour (its score moved,
+    or it is gone). Every other row only merges in the changed products
+    that now beat its weakest neighbour. All of it runs block-wise in
+    NumPy; when more than REBUILD_FRACTION of the catalog changed, the
+    graph is rebuilt instead.
+
+    Returns:
+        The artifact version written, or None when nothing was built yet
+    """
+    deleted = np.unique(np.fromiter(deleted_ids, dtype=np.int64))
+    changed = np.unique(np.fromiter(product_ids, dtype=np.int64))
+    changed = changed[~np.isin(changed, deleted)]
+    if not len(changed) and not len(deleted):
+        return None
+
+    with artifact_lock(ARTIFACT_NAME):
+        artifact = load_artifact(ARTIFACT_NAME)
+        if artifact is None:
+            return None  # nothing built yet; build_similarity_graph will
+
+        index = get_catalog_index()
+        changed = changed[_catalog_rows(index, changed) >= 0]
+        rebuild = len(changed) + len(deleted) > REBUILD_FRACTION * len(index)
+        if not rebuild:
+            version = _patch_graph(artifact, index, changed, deleted)
+    if rebuild:
+        # build_similarity_graph takes the artifact lock itself
+        return build_similarity_graph()
+    _graph_cache.reset()
+    return version
+
+
+def _patch_graph(artifact, index, changed, deleted):
+    """Write a patched copy of `artifact`; see update_similarity_graph()."""
+    ingredient_weight = artifact.meta["ingredient_weight"]
+    features, _ = _features(index, artifact["scale"])
+    ingredients = (
+        _ingredient_matrix(index) if ingredient_weight > 0 else None
+    )
+
+    graph_ids = np.asarray(artifact["product_ids"])
+    keep = ~np.isin(graph_ids, deleted)
+    graph_ids = graph_ids[keep]
+    neighbors = np.array(artifact["neighbors"][keep])
+    scores = np.array(artifact["scores"][keep])
+    width = neighbors.shape[1]
+
+    new = changed[~np.isin(changed, graph_ids)]
+    if len(new):
+        graph_ids = np.concatenate([graph_ids, new])
+        neighbors = np.vstack([
+            neighbors, np.full((len(new), width), -1, dtype=np.int64)
+        ])
+        scores = np.vstack([
+            scores, np.full((len(new), width), -np.inf, dtype=np.float32)
+        ])
+        order = np.argsort(graph_ids, kind="stable")
+        graph_ids, neighbors, scores = (
+            graph_ids[order], neighbors[order], scores[order]
+        )
+
+    catalog_rows = _catalog_rows(index, graph_ids)
+    # Deleted products the catalog index may not have dropped yet
+    banned = _catalog_rows(index, deleted)
+    banned = banned[banned >= 0]
+
+    stale = np.isin(graph_ids, changed) | np.isin(
+        neighbors, np.concatenate([changed, deleted])
+    ).any(axis=1)
+    stale &= catalog_rows >= 0
+
+    if len(changed) and width:
+        changed_rows = _catalog_rows(index, changed)
+        merge = np.flatnonzero(~stale & (catalog_rows >= 0))
+        for start in range(0, len(merge), BLOCK_SIZE):
+            rows = merge[start:start + BLOCK_SIZE]
+            sims = _similarity(
+                features, ingredients, changed_rows, ingredient_weight,
+                catalog_rows[rows],
+            ).T
+            beats = sims > scores[rows, -1:]
+            hit = beats.any(axis=1)
+            if not hit.any():
+                continue
+            rows, beats, sims = rows[hit], beats[hit], sims[hit]
+            ids = np.concatenate(
+                [neighbors[rows], np.broadcast_to(changed, sims.shape)],
+                axis=1,
+            )
+            merged = np.concatenate(
+                [scores[rows], np.where(beats, sims, -np.inf)], axis=1
+            )
+            order = np.argsort(-merged, axis=1, kind="stable")[:, :width]
+            neighbors[rows] = np.take_along_axis(ids, order, axis=1)
+            scores[rows] = np.take_along_axis(merged, order, axis=1)
+
+    stale = np.flatnonzero(stale)
+    for start in range(0, len(stale), BLOCK_SIZE):
+        rows = stale[start:start + BLOCK_SIZE]
+        sims = _similarity(
+            features, ingredients, catalog_rows[rows], ingredient_weight
+        )
+        sims[:, banned] = -np.inf
+        top, top_scores = _top_neighbours(sims, catalog_rows[rows], width)
+        neighbors[rows] = -1
+        scores[rows] = -np.inf
+        neighbors[rows, :top.shape[1]] = np.where(
+            np.isfinite(top_scores), index.product_ids[top], -1
+        )
+        scores[rows, :top.shape[1]] = top_scores
+
+    return write_artifact(
+        ARTIFACT_NAME,
+        {
+            "product_ids": graph_ids,
+            "neighbors": neighbors,
+            "scores": scores,
+            "scale": artifact["scale"],
+        },
+        meta=artifact.meta,
+    )
+
+
+def _catalog_rows(index, product_ids):
+    """Catalog-index row of each product id, -1 where it is not indexed."""
+    product_ids = np.asarray(product_ids, dtype=np.int64)
+    if not len(index) or not len(product_ids):
+        return np.full(len(product_ids), -1, dtype=np.int64)
+    rows = np.searchsorted(index.product_ids, product_ids)
+    rows = np.minimum(rows, len(index) - 1)
+    return np.where(index.product_ids[rows] == product_ids, rows, -1)
+
+
+class GraphUpdater:
+    """
+    Debounced background patching of the similarity graph.
+
+    Signal handlers only record product ids; a daemon thread waits
+    `delay` seconds after the first one, so a burst of edits becomes a
+    single update_similarity_graph() call, and requests never wait on it.
+    """
+
+    def __init__(self, delay=2.0):
+        self.delay = delay
+        self.changed = set()
+        self.deleted = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def submit(self, product_id, deleted=False):
+        with self._lock:
+            if deleted:
+                self.deleted.add(product_id)
+                self.changed.discard(product_id)
+            elif product_id not in self.deleted:
+                self.changed.add(product_id)
+        self._ensure_thread()
+        self._wake.set()
+
+    def flush(self):
+        """Apply every pending change now, in the calling thread."""
+        with self._lock:
+            changed, deleted = self.changed, self.deleted
+            self.changed, self.deleted = set(), set()
+        if not changed and not deleted:
+            return None
+        try:
+            return update_similarity_graph(changed, deleted)
+        except Exception:
+            logger.exception(
+                "Similarity graph update failed for %d products",
+                len(changed) + len(deleted),
+            )
+            return None
+
+    def _ensure_thread(self):
+        # Started lazily, and again in a forked worker (threads do not fork)
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._thread = threading.Thread(
+                    target=self._run, name="ai-similar-update", daemon=True
+                )
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self.delay)
+            self._wake.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+
+_updater = None
+_updater_lock = threading.Lock()
+
+
+def get_graph_updater():
+    """Process-wide GraphUpdater, debounced by AI_SIMILAR_UPDATE_DELAY."""
+    global _updater
+    if _updater is None:
+        with _updater_lock:
+            if _updater is None:
+                _updater = GraphUpdater(settings.AI_SIMILAR_UPDATE_DELAY)
+                atexit.register(_updater.flush)
+    return _updater
+
+
+def schedule_similarity_update(product_id, deleted=False):
+    """Queue a product for the next background graph patch."""
+    get_graph_updater().submit(product_id, deleted)
+
+
+def get_similarity_graph():
+    """The memory-mapped CURRENT graph artifact, or None if not built."""
+    return _graph_cache.get()
+
+
+def get_similar_products(product_id, limit=4):
+    """
+    Nearest neighbours of a product.
+
+    Served from the precomputed graph; products missing from it (or no
+    graph at all) are scored live against the catalog index.
+
+    Returns:
+        List of (product_id, similarity) tuples sorted by similarity desc
+    """
+    limit = max(int(limit), 0)
+    graph = get_similarity_graph()
+    if graph is not None:
+        graph_ids = graph["product_ids"]
+        row = np.searchsorted(graph_ids, product_id)
+        if (
+            row < len(graph_ids)
+            and graph_ids[row] == product_id
+            and limit <= graph["neighbors"].shape[1]
+        ):
+            return [
+                (int(pid), float(score))
+                for pid, score in zip(
+                    graph["neighbors"][row], graph["scores"][row]
+                )
+                if pid >= 0
+            ][:limit]
+
+    index = get_catalog_index()
+    row = index.positions.get(product_id)
+    if row is None:
+        return []
+    _, ingredient_weight = _settings()
+    features, _ = _features(index)
+    ingredients = _ingredient_matrix(index) if ingredient_weight > 0 else None
+
+    # Large catalogs: shortlist by approximate nutrition cosine, then
+    # score the shortlist exactly (ingredient overlap included). Until the
+    # IVF index is trained, every product is scored exactly.
+    ann = index.ann_index("features")
+    if ann is None:
+        sims = _similarity(features, ingredients, [row], ingredient_weight)
+        top, top_scores = _top_neighbours(sims, [row], limit)
+        return [
+            (int(index.product_ids[i]), float(score))
+            for i, score in zip(top[0], top_scores[0])
+        ]
+
+    columns = ann.candidates(
+        ann.vectors[row], settings.AI_ANN_NPROBE, limit * 5 + 1
+    )
+    columns = columns[columns != row]
+    sims = _similarity(
+        features, ingredients, [row], ingredient_weight, columns
+    )[0]
+    limit = min(limit, len(columns))
+    if limit == 0:
+        return []
+    top = np.argpartition(-sims, limit - 1)[:limit]
+    top = top[np.argsort(-sims[top], kind="stable")]
+    return [
+        (int(index.product_ids[columns[i]]), float(sims[i])) for i in top
+    ]
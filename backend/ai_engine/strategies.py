@@ -0,0 +1,261 @@
+"""
+Registry of named recommendation scoring strategies.
+
+A strategy ranks products for (condition, exclude_id, limit) and returns
+(product_id, score) tuples. It also gets a `scoring` dict where it
+records the "content_share" of its scores: the weight of the content
+score (CatalogIndex.score) in them, the rest being co-purchase affinity
+(1.0 when unset). Explanations are split along it. The one serving a request comes from
+AI_STRATEGY, or from AI_STRATEGY_BUCKETS for a stable per-user share of
+traffic. A sampled fraction of requests (AI_SHADOW_SAMPLE) also runs
+AI_SHADOW_STRATEGY on a single background thread after the response is
+computed; its results are only compared with the served ones, never
+returned. Shadow runs are skipped, not queued, while one is in flight,
+so they cannot build up behind slow requests.
+
+Every run records a per-strategy latency histogram, and shadow runs
+record their overlap with the served top-k. The counters are per
+process (GET /api/ai/strategies/metrics/).
+"""
+
+import random
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+
+from .recommender import get_catalog_index
+
+# Weight of the content score in the copurchase strategy: it only breaks ties
+COPURCHASE_TIE_BREAK = 1e-3
+
+# Upper bounds (ms) of the latency histogram buckets; the last is +inf
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+STRATEGIES = {}
+
+
+def register(name):
+    """Decorator adding a rank(condition, exclude_id, limit, scoring) function."""
+    def decorator(func):
+        STRATEGIES[name] = func
+        return func
+    return decorator
+
+
+@register("content")
+def rank_content(condition, exclude_id, limit, scoring):
+    """Live CatalogIndex score: 0.4 x weighted nutrition + 0.6 x suitability."""
+    return get_catalog_index().rank(condition, exclude_id, limit)
+
+
+@register("precomputed")
+def rank_precomputed(condition, exclude_id, limit, scoring):
+    """PrecomputedRecommendation row when current, else live content."""
+    from .precompute import get_precomputed
+
+    ranked = get_precomputed(condition, exclude_id, limit)
+    if ranked is None:
+        ranked = rank_content(condition, exclude_id, limit, scoring)
+    return ranked
+
+
+@register("copurchase")
+def rank_copurchase(condition, exclude_id, limit, scoring):
+    """
+    Products most often bought with `exclude_id`, ties broken by content
+    score; plain content ranking without co-purchase history.
+    """
+    from .copurchase import get_copurchase_model
+
+    if exclude_id is None:
+        return rank_content(condition, exclude_id, limit, scoring)
+    index = get_catalog_index()
+    affinity = get_copurchase_model().affinity_vector(index, exclude_id)
+    if not affinity.any():
+        return rank_content(condition, exclude_id, limit, scoring)
+    # Content scores lie within (-2, 2): scaled down they only break ties
+    scoring["content_share"] = COPURCHASE_TIE_BREAK
+    scores = affinity + COPURCHASE_TIE_BREAK * index.score(condition)
+    return index.top_k(scores, limit, exclude_id)
+
+
+@register("hybrid")
+def rank_hybrid(condition, exclude_id, limit, scoring):
+    """Content score blended with AI_HYBRID_COPURCHASE_WEIGHT of co-purchase."""
+    from .copurchase import get_copurchase_model
+
+    if exclude_id is None:
+        return rank_content(condition, exclude_id, limit, scoring)
+    weight = settings.AI_HYBRID_COPURCHASE_WEIGHT
+    index = get_catalog_index()
+    affinity = get_copurchase_model().affinity_vector(index, exclude_id)
+    if not affinity.any():
+        return rank_content(condition, exclude_id, limit, scoring)
+    scoring["content_share"] = 1 - weight
+    scores = (1 - weight) * index.score(condition) + weight * affinity
+    return index.top_k(scores, limit, exclude_id)
+
+
+class StrategyMetrics:
+    """Latency histograms per strategy and shadow overlap per pair."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = {}
+        self.overlap = {}
+        self.shadow_skipped = 0
+        self.shadow_errors = 0
+
+    def observe(self, name, elapsed_ms, shadow=False):
+        bucket = int(np.searchsorted(LATENCY_BUCKETS_MS, elapsed_ms))
+        key = f"{name} (shadow)" if shadow else name
+        with self._lock:
+            entry = self.latency.setdefault(key, {
+                "count": 0,
+                "sum_ms": 0.0,
+                "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+            })
+            entry["count"] += 1
+            entry["sum_ms"] += elapsed_ms
+            entry["buckets"][bucket] += 1
+
+    def increment(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def observe_overlap(self, primary, shadow, overlap):
+        with self._lock:
+            entry = self.overlap.setdefault(
+                f"{primary}->{shadow}", {"count": 0, "sum": 0.0}
+            )
+            entry["count"] += 1
+            entry["sum"] += overlap
+
+    def snapshot(self):
+        with self._lock:
+            latency = {}
+            for name, entry in self.latency.items():
+                latency[name] = {
+                    "count": entry["count"],
+                    "mean_ms": round(entry["sum_ms"] / entry["count"], 3),
+                    "p50_ms": _quantile(entry["buckets"], 0.5),
+                    "p99_ms": _quantile(entry["buckets"], 0.99),
+                    "buckets": dict(zip(
+                        [str(b) for b in LATENCY_BUCKETS_MS] + ["+inf"],
+                        entry["buckets"],
+                    )),
+                }
+            return {
+                "latency": latency,
+                "overlap": {
+                    pair: {
+                        "count": entry["count"],
+                        "mean": round(entry["sum"] / entry["count"], 4),
+                    }
+                    for pair, entry in self.overlap.items()
+                },
+                "shadow_skipped": self.shadow_skipped,
+                "shadow_errors": self.shadow_errors,
+            }
+
+
+def _quantile(buckets, q):
+    """Upper bound (ms) of the histogram bucket holding quantile q."""
+    target = q * sum(buckets)
+    seen = 0
+    for bound, count in zip(list(LATENCY_BUCKETS_MS) + [None], buckets):
+        seen += count
+        if seen >= target:
+            return bound
+    return None
+
+
+metrics = StrategyMetrics()
+
+_shadow_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ai-shadow")
+_shadow_slot = threading.Semaphore(1)
+
+
+def choose_strategy(user=None):
+    """
+    Strategy name serving `user`.
+
+    Authenticated users are hashed into 100 stable buckets and assigned
+    by the AI_STRATEGY_BUCKETS percentages ({"hybrid": 10} sends 10% of
+    users to hybrid); everyone else gets AI_STRATEGY.
+    """
+    user_id = getattr(user, "pk", None)
+    if user_id is not None and settings.AI_STRATEGY_BUCKETS:
+        bucket = zlib.crc32(str(user_id).encode()) % 100
+        for name, percent in settings.AI_STRATEGY_BUCKETS.items():
+            if bucket < percent:
+                return name
+            bucket -= percent
+    return settings.AI_STRATEGY
+
+
+def rank(name, condition, exclude_id, limit, scoring=None):
+    """
+    Rank with strategy `name`, timing it, and maybe start a shadow run.
+
+    `scoring`, when given, receives the strategy's content_share.
+
+    Names come from settings validated by the ai_engine system checks
+    (see checks.py).
+
+    Raises:
+        KeyError: unknown strategy name
+    """
+    strategy = STRATEGIES[name]
+    started = time.perf_counter()
+    ranked = strategy(
+        condition, exclude_id, limit, {} if scoring is None else scoring
+    )
+    metrics.observe(name, (time.perf_counter() - started) * 1000)
+
+    shadow = settings.AI_SHADOW_STRATEGY
+    if (
+        shadow and shadow != name
+        and random.random() < settings.AI_SHADOW_SAMPLE
+    ):
+        _start_shadow(name, shadow, condition, exclude_id, limit, ranked)
+    return ranked
+
+
+def _start_shadow(primary, shadow, condition, exclude_id, limit, ranked):
+    if not _shadow_slot.acquire(blocking=False):
+        metrics.increment("shadow_skipped")
+        return
+    served = {pid for pid, _ in ranked}
+
+    def compare():
+        started = time.perf_counter()
+        result = STRATEGIES[shadow](condition, exclude_id, limit, {})
+        metrics.observe(
+            shadow, (time.perf_counter() - started) * 1000, shadow=True
+        )
+        ids = {pid for pid, _ in result}
+        union = served | ids
+        metrics.observe_overlap(
+            primary, shadow, len(served & ids) / len(union) if union else 1.0
+        )
+
+    def run():
+        from .async_views import _with_fresh_connection
+
+        try:
+            _with_fresh_connection(compare)
+        except Exception:
+            metrics.increment("shadow_errors")
+        finally:
+            _shadow_slot.release()
+
+    try:
+        _shadow_pool.submit(run)
+    except RuntimeError:
+        # Interpreter shutting down
+        _shadow_slot.release()
@@ -0,0 +1,169 @@
+"""
+ProductSuitability scores derived from NutritionFacts.
+
+Each 0-100 score blends two signals, both computed as whole-matrix
+NumPy operations:
+
+- the share of the condition's guideline rules the product passes
+  (the compiled RuleSet), and
+- the CONDITION_WEIGHTS profile applied to the nutrients expressed as a
+  fraction of their FDA daily value, squashed to 0-100 with a logistic.
+
+recompute_suitability() rescores the whole catalog in chunks across a
+process pool and writes with bulk_update; update_product_suitability()
+rescores one product after a nutrition edit.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.db import transaction
+
+from .cache import bump_catalog_version
+from .guidelines import RuleSet, get_rule_set
+from .recommender import (
+    CONDITION_WEIGHTS,
+    NUTRITION_FIELDS,
+    SUITABILITY_FIELDS,
+    invalidate_catalog_index,
+)
+
+# FDA daily values (trans fat has none; 2g is the usual upper limit)
+DAILY_VALUES = {
+    "calories": 2000, "total_fat": 78, "saturated_fat": 20, "trans_fat": 2,
+    "cholesterol": 300, "sodium": 2300, "total_carbs": 275, "fiber": 28,
+    "sugars": 50, "protein": 50, "potassium": 4700,
+}
+
+# Share of the score taken from guideline compliance (rest: weight profile)
+GUIDELINE_SHARE = 0.5
+
+# Logistic steepness applied to the weighted daily-value fraction
+PROFILE_STEEPNESS = 10.0
+
+# Products scored per worker task
+CHUNK_SIZE = 10000
+
+_daily_values = np.array([DAILY_VALUES[f] for f in NUTRITION_FIELDS], dtype=np.float64)
+_weights = np.array([
+    [CONDITION_WEIGHTS[c].get(f, 0) for f in NUTRITION_FIELDS]
+    for c in SUITABILITY_FIELDS
+])
+
+
+def score_suitability(matrix, rules):
+    """
+    Suitability of every row of a nutrition matrix.
+
+    Args:
+        matrix: N x len(NUTRITION_FIELDS) array
+        rules: RuleSet, or its `rules` dict (as sent to pool workers)
+
+    Returns:
+        N x len(SUITABILITY_FIELDS) int array of 0-100 scores
+    """
+    rule_set = rules if isinstance(rules, RuleSet) else RuleSet(rules)
+    matrix = np.asarray(matrix, dtype=np.float64).reshape(-1, len(NUTRITION_FIELDS))
+
+    profile = (matrix / _daily_values) @ _weights.T
+    profile = 100.0 / (1.0 + np.exp(-PROFILE_STEEPNESS * profile))
+
+    compliance = rule_set.evaluate(matrix, NUTRITION_FIELDS)
+    # A condition without rules has nothing to fail
+    guideline = np.column_stack([
+        compliance[c][1] if rule_set.rules.get(c) else np.full(len(matrix), 100)
+        for c in SUITABILITY_FIELDS
+    ])
+
+    scores = GUIDELINE_SHARE * guideline + (1 - GUIDELINE_SHARE) * profile
+    return np.clip(np.rint(scores), 0, 100).astype(np.int64)
+
+
+def _load_nutrition(product_ids=None):
+    from products.models import NutritionFacts
+
+    queryset = NutritionFacts.objects.order_by("product_id")
+    if product_ids is not None:
+        queryset = queryset.filter(product_id__in=product_ids)
+    rows = list(queryset.values_list("product_id", *NUTRITION_FIELDS))
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    matrix = np.array(
+        [[float(value or 0) for value in row[1:]] for row in rows],
+        dtype=np.float64,
+    ).reshape(len(rows), len(NUTRITION_FIELDS))
+    return ids, matrix
+
+
+def _write_scores(product_ids, scores, batch_size=1000):
+    """Update existing ProductSuitability rows and create missing ones."""
+    from products.models import ProductSuitability
+
+    by_product = dict(zip(product_ids.tolist(), scores.tolist()))
+    existing = list(
+        ProductSuitability.objects.filter(product_id__in=by_product)
+    )
+    for row in existing:
+        for field, value in zip(SUITABILITY_FIELDS, by_product.pop(row.product_id)):
+            setattr(row, field, value)
+
+    with transaction.atomic():
+        ProductSuitability.objects.bulk_update(
+            existing, SUITABILITY_FIELDS, batch_size=batch_size
+        )
+        ProductSuitability.objects.bulk_create(
+            [
+                ProductSuitability(
+                    product_id=product_id,
+                    **dict(zip(SUITABILITY_FIELDS, values)),
+                )
+                for product_id, values in by_product.items()
+            ],
+            batch_size=batch_size,
+        )
+        # Bulk writes send no signals: invalidate like a regular save would
+        transaction.on_commit(bump_catalog_version)
+        transaction.on_commit(invalidate_catalog_index)
+    return len(existing), len(by_product)
+
+
+def recompute_suitability(chunk_size=CHUNK_SIZE, workers=None):
+    """
+    Rescore every product with nutrition data.
+
+    Args:
+        chunk_size: products per worker task
+        workers: process pool size (default: CPU count); 1 scores in
+            this process
+
+    Returns:
+        (updated, created) row counts
+    """
+    product_ids, matrix = _load_nutrition()
+    rules = get_rule_set().rules
+    chunks = [
+        matrix[start:start + chunk_size]
+        for start in range(0, len(matrix), chunk_size)
+    ]
+
+    workers = workers or min(len(chunks), os.cpu_count() or 1)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(
+                pool.map(score_suitability, chunks, [rules] * len(chunks))
+            )
+    else:
+        results = [score_suitability(chunk, rules) for chunk in chunks]
+
+    scores = (
+        np.vstack(results) if results
+        else np.zeros((0, len(SUITABILITY_FIELDS)), dtype=np.int64)
+    )
+    return _write_scores(product_ids, scores)
+
+
+def update_product_suitability(product_id):
+    """Rescore a single product after its nutrition facts changed."""
+    product_ids, matrix = _load_nutrition([product_id])
+    if len(product_ids):
+        _write_scores(product_ids, score_suitability(matrix, get_rule_set()))
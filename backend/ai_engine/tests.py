@@ -1,3 +1,1604 @@
-from django.test import TestCase
+import asyncio
+import itertools
+import shutil
+import tempfile
+import threading
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from orders.models import Order, OrderItem
+from products.management.commands.seed_data import GUIDELINE_RULES
+from products.models import (
+    GuidelineRule,
+    HealthCategory,
+    Ingredient,
+    NutritionFacts,
+    Product,
+    ProductSuitability,
+)
+
+from . import async_views, copurchase, events, strategies
+from .artifacts import (
+    KEEP_VERSIONS,
+    ArtifactCache,
+    artifact_dir,
+    current_version,
+    load_artifact,
+    write_artifact,
+)
+from .cache import bump_catalog_version, cache_stats, cached_response
+from .checks import check_strategies
+from .events import EventLog, MemorySink
+from .guidelines import get_rule_set, invalidate_rule_set
+from .ingredients import (
+    get_ingredient_index,
+    invalidate_ingredient_index,
+    parse_terms,
+)
+from .models import CoPurchase, PrecomputedRecommendation
+from .optimizer import optimize_basket
+from .precompute import get_precomputed, precompute_recommendations
+from .recommender import (
+    CONDITION_WEIGHTS,
+    NUTRITION_FIELDS,
+    SUITABILITY_FIELDS,
+    CatalogIndex,
+    MODEL_ARTIFACT,
+    _model_cache,
+    build_nutrition_vector,
+    build_recommender_model,
+    check_compliance,
+    check_compliance_bulk,
+    diversify,
+    explain_recommendations,
+    get_batch_recommendations,
+    get_catalog_index,
+    get_personalized_recommendations,
+    get_recommendations,
+    invalidate_catalog_index,
+    rank_recommendations,
+)
+from .similarity import (
+    _graph_cache,
+    build_similarity_graph,
+    get_similar_products,
+    get_similarity_graph,
+    update_similarity_graph,
+)
+from .suitability import (
+    DAILY_VALUES,
+    recompute_suitability,
+    score_suitability,
+)
+from .views import result_queryset
+
+# Upper bound of each NUTRITION_FIELDS value in the random catalog
+NUTRITION_RANGES = {
+    "calories": 600, "total_fat": 40, "saturated_fat": 12, "trans_fat": 1,
+    "cholesterol": 150, "sodium": 900, "total_carbs": 90, "fiber": 15,
+    "sugars": 40, "protein": 40, "potassium": 1200,
+}
+
+
+def create_guidelines():
+    """The three health categories with the seed_data guideline rules."""
+    categories = {}
+    for slug, rules in GUIDELINE_RULES.items():
+        category = HealthCategory.objects.create(
+            slug=slug, name=slug.title(), short_name=slug.title(), icon="",
+            color="", description="",
+        )
+        GuidelineRule.objects.bulk_create([
+            GuidelineRule(
+                category=category, nutrient=nutrient, operator=operator,
+                threshold=threshold, message=message, issue_message=issue,
+                order=order,
+            )
+            for order, (nutrient, operator, threshold, message, issue)
+            in enumerate(rules)
+        ])
+        categories[slug] = category
+    return categories
+
+
+def create_catalog(count, seed=0, prefix="product"):
+    """
+    `count` products with random nutrition facts and prices.
+
+    Every third product has no ProductSuitability row, so both scoring
+    branches are exercised.
+
+    Returns:
+        list of the product ids
+    """
+    rng = np.random.default_rng(seed)
+    products = Product.objects.bulk_create([
+        Product(
+            name=f"{prefix.title()} {i}", slug=f"{prefix}-{i}",
+            price=round(float(rng.uniform(1, 30)), 2), image="",
+            description="",
+        )
+        for i in range(count)
+    ])
+    NutritionFacts.objects.bulk_create([
+        NutritionFacts(
+            product=product, serving_size="100g",
+            **{
+                field: (
+                    int(rng.uniform(0, high))
+                    if field in ("calories", "cholesterol", "sodium", "potassium")
+                    else round(float(rng.uniform(0, high)), 1)
+                )
+                for field, high in NUTRITION_RANGES.items()
+            },
+        )
+        for product in products
+    ])
+    ProductSuitability.objects.bulk_create([
+        ProductSuitability(
+            product=product,
+            **{field: int(rng.integers(0, 101)) for field in SUITABILITY_FIELDS},
+        )
+        for i, product in enumerate(products)
+        if i % 3
+    ])
+    return [product.id for product in products]
+
+
+def create_product(slug, price=5, **nutrition):
+    """One product with the given nutrition facts (others 0)."""
+    product = Product.objects.create(
+        name=slug.replace("-", " ").title(), slug=slug, price=price,
+        image="", description="",
+    )
+    NutritionFacts.objects.create(
+        product=product, serving_size="100g", **nutrition
+    )
+    return product
+
+
+def loop_scores(condition):
+    """
+    Scores of the original per-product get_recommendations() loop.
+
+    Returns:
+        dict of product_id -> score
+    """
+    weights = CONDITION_WEIGHTS[condition]
+    weight_vector = np.array([weights.get(f, 0) for f in NUTRITION_FIELDS])
+    scores = {}
+    for product in Product.objects.select_related("nutrition", "suitability"):
+        if not hasattr(product, "nutrition"):
+            continue
+        vector = build_nutrition_vector(product.nutrition)
+        norm = np.linalg.norm(vector)
+        score = np.dot(vector / norm if norm > 0 else vector, weight_vector)
+        if hasattr(product, "suitability"):
+            existing = getattr(product.suitability, condition, 50) / 100.0
+            score = 0.4 * score + 0.6 * existing
+        scores[product.id] = float(score)
+    return scores
+
+
+class CatalogTestCase(TestCase):
+    """
+    A random catalog with the seeded guideline rules.
+
+    Every process-wide index is reset before each test (the fixture's
+    on_commit invalidations never run inside a TestCase), and model
+    artifacts are written to a temporary directory emptied per test. Events go to a
+    fresh MemorySink.
+    """
+
+    catalog_size = 40
+
+    @classmethod
+    def setUpClass(cls):
+        cls.model_dir = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.model_dir, ignore_errors=True)
+        cls.enterClassContext(override_settings(
+            AI_MODEL_DIR=cls.model_dir,
+            AI_MODEL_REBUILD_DELAY=0,
+            AI_STRATEGY="content",
+            AI_STRATEGY_BUCKETS={},
+            AI_SHADOW_STRATEGY="",
+            AI_EVENT_SINK="ai_engine.events.MemorySink",
+        ))
+        cls.enterClassContext(mock.patch.object(events, "_event_log", None))
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categories = create_guidelines()
+        cls.product_ids = create_catalog(cls.catalog_size)
+
+    def setUp(self):
+        shutil.rmtree(self.model_dir, ignore_errors=True)
+        _model_cache.reset()
+        _graph_cache.reset()
+        bump_catalog_version()
+        invalidate_catalog_index()
+        invalidate_rule_set()
+        invalidate_ingredient_index()
+
+
+class CatalogIndexTests(CatalogTestCase):
+    """The matrix index scores and ranks like the per-product loop."""
+
+    def test_build_is_one_query(self):
+        with self.assertNumQueries(1):
+            index = CatalogIndex.build()
+        self.assertEqual(list(index.product_ids), sorted(self.product_ids))
+
+    def test_scores_match_loop(self):
+        index = get_catalog_index()
+        for condition in CONDITION_WEIGHTS:
+            with self.subTest(condition=condition):
+                expected = loop_scores(condition)
+                scores = index.score(condition)
+                for product_id, score in expected.items():
+                    self.assertAlmostEqual(
+                        scores[index.positions[product_id]], score, places=9
+                    )
+
+    def test_top_k_matches_sorted_loop(self):
+        index = get_catalog_index()
+        exclude_id = self.product_ids[5]
+        for condition in CONDITION_WEIGHTS:
+            with self.subTest(condition=condition):
+                expected = sorted(
+                    (
+                        (score, pid)
+                        for pid, score in loop_scores(condition).items()
+                        if pid != exclude_id
+                    ),
+                    reverse=True,
+                )[:6]
+                ranked = index.rank(condition, exclude_id, 6)
+                self.assertEqual(
+                    [pid for pid, _ in ranked], [pid for _, pid in expected]
+                )
+                for (_, score), (expected_score, _) in zip(ranked, expected):
+                    self.assertAlmostEqual(score, expected_score, places=9)
+
+    def test_top_k_limits(self):
+        index = get_catalog_index()
+        scores = index.score("diabetes")
+        self.assertEqual(index.top_k(scores, 0), [])
+        everything = index.top_k(scores, 1000, self.product_ids[0])
+        self.assertEqual(len(everything), self.catalog_size - 1)
+        self.assertNotIn(self.product_ids[0], [pid for pid, _ in everything])
+
+    def test_only_winners_are_loaded(self):
+        get_catalog_index()
+        # One in_bulk query and one categories prefetch
+        with self.assertNumQueries(2):
+            results = get_recommendations(
+                "hypertension", result_queryset(), limit=4
+            )
+        expected = sorted(
+            loop_scores("hypertension").items(), key=lambda item: -item[1]
+        )[:4]
+        self.assertEqual(
+            [product.id for product, _ in results],
+            [pid for pid, _ in expected],
+        )
+
+
+class BatchRecommendationTests(CatalogTestCase):
+    """Batch queries are scored together and match single queries."""
+
+    def queries(self):
+        return [
+            ("diabetes", None, 4),
+            ("diabetes", self.product_ids[3], 4),
+            ("hypertension", self.product_ids[3], 2),
+            ("cardiovascular", None, 6),
+            ("unknown", None, 4),
+        ]
+
+    def test_matches_single_queries(self):
+        results = get_batch_recommendations(self.queries(), result_queryset())
+        index = get_catalog_index()
+        for (condition, exclude_id, limit), ranked in zip(self.queries(), results):
+            with self.subTest(condition=condition, exclude=exclude_id):
+                expected = (
+                    index.rank(condition, exclude_id, limit)
+                    if condition in CONDITION_WEIGHTS else []
+                )
+                self.assertEqual(
+                    [(product.id, round(score, 9)) for product, score in ranked],
+                    [(pid, round(score, 9)) for pid, score in expected],
+                )
+
+    def test_products_loaded_once(self):
+        get_catalog_index()
+        # One shared in_bulk query and one categories prefetch
+        with self.assertNumQueries(2):
+            get_batch_recommendations(self.queries(), result_queryset())
+
+    def test_endpoint_keys(self):
+        response = self.client.post(
+            "/api/ai/recommend/batch/",
+            {"queries": [
+                {"condition": "diabetes", "limit": 2},
+                {"condition": "hypertension", "exclude": self.product_ids[0],
+                 "limit": 3, "key": "pdp"},
+            ]},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(sorted(data), ["diabetes::2", "pdp"])
+        self.assertEqual(len(data["diabetes::2"]), 2)
+        self.assertEqual(len(data["pdp"]), 3)
+        self.assertIn("ai_score", data["pdp"][0])
+
+    def test_endpoint_limits_batch_size(self):
+        response = self.client.post(
+            "/api/ai/recommend/batch/",
+            {"queries": [{"condition": "diabetes"}] * 101},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class PersonalizedRecommendationTests(CatalogTestCase):
+    """Multi-condition recommendations skip products failing any condition."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Pass every seeded diabetes and hypertension rule
+        cls.compliant_ids = [
+            create_product(
+                f"compliant-{i}", calories=100 + 10 * i, sodium=50 + i,
+                potassium=400 + 50 * i, fiber=4 + i, sugars=2,
+                total_carbs=20, protein=5 + i,
+            ).id
+            for i in range(5)
+        ]
+        cls.user = get_user_model().objects.create_user(
+            username="guest", password="guest-pass-123",
+            health_profile={"conditions": ["diabetes", "hypertension"]},
+        )
+
+    def expected_ids(self, conditions, exclude_id=None):
+        index = get_catalog_index()
+        scores = index.score_profile(conditions)
+        allowed = [
+            product.id
+            for product in Product.objects.select_related("nutrition")
+            if product.id != exclude_id and all(
+                check_compliance(product, condition)["compliant"]
+                for condition in conditions
+            )
+        ]
+        return sorted(
+            allowed, key=lambda pid: -scores[index.positions[pid]]
+        )
+
+    def test_only_products_compliant_with_every_condition(self):
+        conditions = ["diabetes", "hypertension"]
+        results = get_personalized_recommendations(
+            conditions, result_queryset(), limit=100
+        )
+        expected = self.expected_ids(conditions)
+        self.assertTrue(set(self.compliant_ids) <= set(expected))
+        self.assertEqual([product.id for product, _ in results], expected)
+
+    def test_exclude_and_limit(self):
+        conditions = ["diabetes", "hypertension"]
+        exclude_id = self.expected_ids(conditions)[0]
+        results = get_personalized_recommendations(
+            conditions, result_queryset(), exclude_id, limit=2
+        )
+        self.assertEqual(
+            [product.id for product, _ in results],
+            self.expected_ids(conditions, exclude_id)[:2],
+        )
+
+    def test_endpoint_uses_health_profile(self):
+        self.client.force_login(self.user)
+        # condition and diversity are not parameters of this endpoint
+        response = self.client.get(
+            "/api/ai/recommend/for-me/?limit=3&condition=bogus&diversity=5"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item["id"] for item in response.json()],
+            self.expected_ids(["diabetes", "hypertension"])[:3],
+        )
+
+    def test_endpoint_errors(self):
+        response = self.client.get("/api/ai/recommend/for-me/")
+        self.assertIn(response.status_code, (401, 403))
+
+        self.client.force_login(self.user)
+        response = self.client.get("/api/ai/recommend/for-me/?limit=x")
+        self.assertEqual(response.status_code, 400)
+
+        self.user.health_profile = {}
+        self.user.save()
+        response = self.client.get("/api/ai/recommend/for-me/")
+        self.assertEqual(response.status_code, 400)
+
+
+class SimilarityGraphTests(CatalogTestCase):
+    """Patching the neighbour graph gives the same graph as a rebuild."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        rng = np.random.default_rng(1)
+        names = ["oats", "milk", "salt", "sugar", "garlic", "lentils"]
+        Ingredient.objects.bulk_create([
+            Ingredient(product_id=product_id, name=str(name))
+            for product_id in cls.product_ids
+            for name in rng.choice(names, 2, replace=False)
+        ])
+
+    def graph_rows(self, graph):
+        """product_id -> sorted neighbour scores, rounded."""
+        return {
+            int(pid): sorted(np.round(scores, 5).tolist())
+            for pid, scores in zip(graph["product_ids"], graph["scores"])
+        }
+
+    def refresh(self):
+        # What the committed writes' signals would have done
+        invalidate_catalog_index()
+        invalidate_ingredient_index()
+
+    def test_live_lookup_matches_graph(self):
+        live = {
+            pid: get_similar_products(pid, limit=5) for pid in self.product_ids
+        }
+        build_similarity_graph()
+        for pid in self.product_ids:
+            with self.subTest(product=pid):
+                served = get_similar_products(pid, limit=5)
+                self.assertEqual(
+                    np.round([s for _, s in served], 5).tolist(),
+                    np.round([s for _, s in live[pid]], 5).tolist(),
+                )
+                self.assertNotIn(pid, [n for n, _ in served])
+
+    def test_patch_matches_rebuild(self):
+        build_similarity_graph()
+        changed, deleted = self.product_ids[4], self.product_ids[9]
+        nutrition = NutritionFacts.objects.get(product_id=changed)
+        nutrition.sodium, nutrition.fiber = 5, 14
+        nutrition.save()
+        Ingredient.objects.create(product_id=self.product_ids[6], name="oats")
+        Product.objects.filter(id=deleted).delete()
+        self.refresh()
+
+        update_similarity_graph([changed, self.product_ids[6]], [deleted])
+        patched = self.graph_rows(get_similarity_graph())
+        build_similarity_graph()
+        rebuilt = self.graph_rows(get_similarity_graph())
+
+        self.assertNotIn(deleted, patched)
+        self.assertEqual(patched, rebuilt)
+        neighbors = np.asarray(get_similarity_graph()["neighbors"])
+        self.assertFalse((neighbors == deleted).any())
+
+    def test_patch_without_graph_is_skipped(self):
+        self.assertIsNone(update_similarity_graph([self.product_ids[0]]))
+        self.assertIsNone(get_similarity_graph())
+
+
+class CoPurchaseTests(CatalogTestCase):
+    """Order pairs are upserted, rebuilt from history and served from memory."""
+
+    catalog_size = 12
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = get_user_model().objects.create_user(
+            username="buyer", password="buyer-pass-123"
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(mock.patch.object(copurchase, "_model", None))
+
+    def order(self, product_ids):
+        """A stored order of `product_ids`, counted like a committed one."""
+        order = Order.objects.create(user=self.user)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=pid, unit_price=1)
+            for pid in product_ids
+        ])
+        copurchase.record_order(product_ids)
+
+    def counts(self):
+        return {
+            (a, b): count
+            for a, b, count in CoPurchase.objects.values_list(
+                "product_a_id", "product_b_id", "count"
+            )
+        }
+
+    def test_upsert_counts_pairs_once_per_order(self):
+        a, b, c = self.product_ids[:3]
+        self.order([c, a, b, a])
+        self.order([b, a])
+        self.assertEqual(self.counts(), {(a, b): 2, (a, c): 1, (b, c): 1})
+
+    def test_rebuild_matches_upserts(self):
+        ids = self.product_ids
+        for basket in ([ids[0], ids[1], ids[2]], [ids[1], ids[2]], [ids[3], ids[1]]):
+            self.order(basket)
+        upserted = self.counts()
+        self.assertEqual(copurchase.rebuild_copurchase(), len(upserted))
+        self.assertEqual(self.counts(), upserted)
+
+    def test_model_sees_upserts_without_double_counting(self):
+        a, b, c = self.product_ids[:3]
+        self.order([a, b])
+        model = copurchase.get_copurchase_model()
+        self.order([a, b, c])
+        self.assertEqual(model.row(a), {b: 2, c: 1})
+        # Re-reading rows the upsert already applied changes nothing
+        model.refresh()
+        model.refresh()
+        self.assertEqual(model.row(a), {b: 2, c: 1})
+        self.assertEqual(model.row(c), {a: 1, b: 1})
+
+    def test_merged_counts_match_a_fresh_load(self):
+        model = copurchase.get_copurchase_model()
+        with mock.patch.object(copurchase, "MAX_PENDING", 2):
+            self.order(self.product_ids[:4])
+            self.order(self.product_ids[2:6])
+        self.assertEqual(model._recent_pairs, 0)
+        fresh = copurchase.CoPurchaseModel.load()
+        for pid in self.product_ids:
+            self.assertEqual(model.row(pid), fresh.row(pid))
+
+    def test_rebuild_reloads_the_model(self):
+        self.order(self.product_ids[:2])
+        model = copurchase.get_copurchase_model()
+        copurchase.rebuild_copurchase()
+        self.assertIsNot(copurchase.get_copurchase_model(), model)
+
+    def test_affinity_vector(self):
+        a, b, c = self.product_ids[:3]
+        self.order([a, b])
+        self.order([a, b, c])
+        index = get_catalog_index()
+        affinity = copurchase.get_copurchase_model().affinity_vector(index, a)
+        self.assertEqual(affinity[index.positions[b]], 1.0)
+        self.assertEqual(affinity[index.positions[c]], 0.5)
+        self.assertEqual(affinity[index.positions[a]], 0.0)
+
+
+class BulkComplianceTests(CatalogTestCase):
+    """The vectorized compliance grid agrees with check_compliance."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Values sitting exactly on the seeded thresholds
+        cls.edge_id = create_product(
+            "edge", saturated_fat=2, sodium=200, fiber=3, sugars=5,
+            total_carbs=45, potassium=300,
+        ).id
+        cls.product_ids = cls.product_ids + [cls.edge_id]
+
+    def test_grid_matches_check_compliance(self):
+        conditions = list(GUIDELINE_RULES)
+        ids, grid = check_compliance_bulk(conditions)
+        self.assertEqual(sorted(ids.tolist()), sorted(self.product_ids))
+        products = Product.objects.select_related("nutrition").in_bulk()
+        for row, product_id in enumerate(ids.tolist()):
+            for condition in conditions:
+                with self.subTest(product=product_id, condition=condition):
+                    expected = check_compliance(products[product_id], condition)
+                    passes, score, compliant = grid[condition]
+                    self.assertEqual(bool(compliant[row]), expected["compliant"])
+                    self.assertEqual(int(score[row]), expected["score"])
+                    self.assertEqual(
+                        int((~passes[row]).sum()), len(expected["issues"])
+                    )
+
+    def test_product_subset(self):
+        wanted = [self.edge_id, self.product_ids[2], -1]
+        ids, grid = check_compliance_bulk(["hypertension"], wanted)
+        self.assertEqual(ids.tolist(), sorted(wanted[:2]))
+        self.assertEqual(len(grid["hypertension"][1]), 2)
+
+    def test_endpoint(self):
+        response = self.client.get(
+            f"/api/ai/compliance/bulk/?condition=hypertension&product={self.edge_id}"
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(
+            data["rules"],
+            {"hypertension": ["sodium", "potassium", "saturated_fat"]},
+        )
+        self.assertEqual(data["results"], [{
+            "product_id": self.edge_id,
+            "hypertension": {
+                "compliant": False,
+                "score": 33,
+                "issues": ["sodium", "saturated_fat"],
+            },
+        }])
+
+    def test_endpoint_errors(self):
+        for query in ("condition=bogus", "product=1,x"):
+            with self.subTest(query=query):
+                response = self.client.get(f"/api/ai/compliance/bulk/?{query}")
+                self.assertEqual(response.status_code, 400)
+
+
+class ResponseCacheTests(CatalogTestCase):
+    """Cached AI responses are keyed on the catalog version."""
+
+    catalog_size = 12
+
+    def test_version_bump_orphans_entries(self):
+        compute = mock.Mock(side_effect=[1, 2])
+        self.assertEqual(cached_response("test", {"a": 1}, compute), 1)
+        self.assertEqual(cached_response("test", {"a": 1}, compute), 1)
+        self.assertEqual(compute.call_count, 1)
+
+        bump_catalog_version()
+        self.assertEqual(cached_response("test", {"a": 1}, compute), 2)
+        self.assertEqual(compute.call_count, 2)
+
+    def test_nutrition_write_invalidates_recommendations(self):
+        url = "/api/ai/recommend/?condition=diabetes&limit=3"
+        first = self.client.get(url).json()
+        hits = cache_stats()["hits"]
+        self.assertEqual(self.client.get(url).json(), first)
+        self.assertEqual(cache_stats()["hits"], hits + 1)
+
+        # Make the last-ranked product the best diabetes match
+        scores = loop_scores("diabetes")
+        worst = min(scores, key=scores.get)
+        nutrition = NutritionFacts.objects.get(product_id=worst)
+        for field in NUTRITION_RANGES:
+            setattr(nutrition, field, 0)
+        nutrition.fiber = 15
+        nutrition.protein = 40
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductSuitability.objects.filter(product_id=worst).delete()
+            nutrition.save()
+
+        data = self.client.get(url).json()
+        self.assertEqual(cache_stats()["hits"], hits + 1)
+        self.assertEqual(data[0]["id"], worst)
+
+    def test_copurchase_responses_bypass_cache(self):
+        url = "/api/ai/recommend/?condition=diabetes&exclude=%d&copurchase=0.5"
+        url %= self.product_ids[0]
+        hits = cache_stats()["hits"]
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(cache_stats()["hits"], hits)
+
+    def test_guideline_write_invalidates_compliance(self):
+        url = (
+            f"/api/ai/compliance/?product={self.product_ids[0]}"
+            "&condition=hypertension"
+        )
+        before = self.client.get(url).json()
+        with self.captureOnCommitCallbacks(execute=True):
+            GuidelineRule.objects.filter(
+                category__slug="hypertension"
+            ).delete()
+        after = self.client.get(url).json()
+        self.assertNotEqual(after, before)
+        self.assertEqual(after["issues"], [])
+
+
+class BasketOptimizerTests(CatalogTestCase):
+    """optimize_basket() honours every constraint and finds the optimum."""
+
+    catalog_size = 12
+
+    def assertWithinConstraints(self, result, budget, headcount, caps=None,
+                                max_per_product=None):
+        quantities = {
+            item["product_id"]: item["quantity"] for item in result["items"]
+        }
+        products = Product.objects.select_related("nutrition").in_bulk(
+            list(quantities)
+        )
+        total = sum(
+            float(products[pid].price) * qty for pid, qty in quantities.items()
+        )
+        self.assertAlmostEqual(result["total_price"], total, places=2)
+        self.assertLessEqual(total, budget + 1e-6)
+        self.assertGreaterEqual(sum(quantities.values()), headcount)
+        if max_per_product:
+            self.assertLessEqual(max(quantities.values()), max_per_product)
+        for field, cap in (caps or {}).items():
+            amount = sum(
+                float(getattr(products[pid].nutrition, field)) * qty
+                for pid, qty in quantities.items()
+            )
+            self.assertLessEqual(amount, cap + 1e-6)
+            self.assertAlmostEqual(result["nutrition"][field], amount, places=0)
+
+    def test_constraints(self):
+        free = optimize_basket(120, ["diabetes"], 6, compliant_only=False)
+        caps = {
+            "sodium": free["nutrition"]["sodium"] * 0.8,
+            "sugars": free["nutrition"]["sugars"] * 0.8,
+        }
+        result = optimize_basket(
+            120, ["diabetes"], 6, caps=caps, max_per_product=2,
+            compliant_only=False,
+        )
+        self.assertEqual(result["status"], "optimal")
+        self.assertWithinConstraints(result, 120, 6, caps, 2)
+        self.assertLess(result["suitability"], free["suitability"])
+
+    def test_matches_exhaustive_search(self):
+        index = get_catalog_index()
+        value = index.score_profile(["diabetes", "hypertension"])
+        prices = index.prices
+        budget = float(np.sort(prices)[:5].sum()) + 10
+        best = max(
+            value[list(subset)].sum()
+            for size in range(3, len(prices) + 1)
+            for subset in itertools.combinations(range(len(prices)), size)
+            if prices[list(subset)].sum() <= budget
+        )
+
+        result = optimize_basket(
+            budget, ["diabetes", "hypertension"], 3, max_per_product=1,
+            compliant_only=False,
+        )
+        self.assertEqual(result["status"], "optimal")
+        self.assertWithinConstraints(result, budget, 3, max_per_product=1)
+        self.assertAlmostEqual(result["suitability"], best, places=2)
+
+    @override_settings(AI_BASKET_CANDIDATES=4)
+    def test_pruning_keeps_cheapest_products(self):
+        # Only reachable with the cheapest product bought for everyone
+        cheapest = float(get_catalog_index().prices.min())
+        result = optimize_basket(
+            cheapest * 10, ["cardiovascular"], 10, compliant_only=False,
+        )
+        self.assertEqual(result["status"], "optimal")
+        self.assertWithinConstraints(result, cheapest * 10, 10)
+
+    def test_compliant_only(self):
+        compliant = create_product(
+            "compliant", price=2, saturated_fat=1, sodium=100, fiber=5,
+            sugars=2, total_carbs=20, potassium=400,
+        )
+        bump_catalog_version()
+        invalidate_catalog_index()
+        result = optimize_basket(100, ["diabetes", "hypertension"], 4)
+        self.assertEqual(
+            result["items"], [{"product_id": compliant.id, "quantity": 4}]
+        )
+
+    def test_infeasible(self):
+        result = optimize_basket(1, ["diabetes"], 50, compliant_only=False)
+        self.assertEqual(result["status"], "infeasible")
+        self.assertEqual(result["items"], [])
+
+        response = self.client.post(
+            "/api/ai/optimize-basket/",
+            {"budget": 1, "conditions": ["diabetes"], "headcount": 50,
+             "compliant_only": False},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 422)
+
+    def test_unknown_cap_rejected(self):
+        response = self.client.post(
+            "/api/ai/optimize-basket/",
+            {"budget": 50, "conditions": ["diabetes"], "headcount": 2,
+             "caps": {"caffeine": 10}},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class ArtifactTests(CatalogTestCase):
+    """Versioned artifacts are swapped in by every worker."""
+
+    catalog_size = 12
+
+    def test_write_and_load(self):
+        version = write_artifact("test", {"a": np.arange(3)}, {"k": 1})
+        self.assertEqual(current_version("test"), version)
+        artifact = load_artifact("test")
+        self.assertIsInstance(artifact["a"], np.memmap)
+        np.testing.assert_array_equal(artifact["a"], [0, 1, 2])
+        self.assertEqual(artifact.meta, {"k": 1})
+
+    def test_old_versions_pruned(self):
+        versions = [
+            write_artifact("test", {"a": np.array([i])}) for i in range(4)
+        ]
+        kept = sorted(
+            p.name for p in artifact_dir("test").iterdir() if p.is_dir()
+        )
+        self.assertEqual(kept, versions[-KEEP_VERSIONS:])
+
+    def test_hot_swap(self):
+        cache = ArtifactCache("test")
+        write_artifact("test", {"a": np.array([1])})
+        with override_settings(AI_ARTIFACT_CHECK_INTERVAL=3600):
+            self.assertEqual(int(cache.get()["a"][0]), 1)
+            write_artifact("test", {"a": np.array([2])})
+            # Within the check interval the loaded version is kept
+            self.assertEqual(int(cache.get()["a"][0]), 1)
+        with override_settings(AI_ARTIFACT_CHECK_INTERVAL=0):
+            self.assertEqual(int(cache.get()["a"][0]), 2)
+
+    @override_settings(AI_ARTIFACT_CHECK_INTERVAL=0)
+    def test_index_served_from_model(self):
+        built = get_catalog_index()
+        build_recommender_model()
+        index = get_catalog_index()
+        self.assertIsNot(index, built)
+        self.assertIsInstance(index.condition_scores, np.memmap)
+        np.testing.assert_array_equal(index.product_ids, built.product_ids)
+        for condition in CONDITION_WEIGHTS:
+            np.testing.assert_allclose(
+                index.score(condition), built.score(condition)
+            )
+
+    @override_settings(AI_ARTIFACT_CHECK_INTERVAL=0)
+    def test_stale_model_ignored(self):
+        version = build_recommender_model()
+        self.assertIsNone(build_recommender_model(only_if_stale=True))
+
+        bump_catalog_version()
+        index = get_catalog_index()
+        self.assertIsNone(index.condition_scores)
+
+        rebuilt = build_recommender_model(only_if_stale=True)
+        self.assertNotEqual(rebuilt, version)
+        self.assertEqual(current_version(MODEL_ARTIFACT), rebuilt)
+        self.assertIsInstance(
+            get_catalog_index().condition_scores, np.memmap
+        )
+
+
+class PrecomputeTests(CatalogTestCase):
+    """Precomputed rows match live scoring until the catalog changes."""
+
+    catalog_size = 20
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        user = get_user_model().objects.create_user(
+            username="hotel", password="hotel-pass-123"
+        )
+        order = Order.objects.create(user=user)
+        cls.popular = cls.product_ids[:3]
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=pid, quantity=10 - i,
+                      unit_price=1)
+            for i, pid in enumerate(cls.popular)
+        ])
+
+    def live(self, condition, exclude_id=None, limit=5):
+        return rank_recommendations(
+            condition, exclude_id, limit, strategy="content"
+        )
+
+    def test_rows_match_live_ranking(self):
+        rows = precompute_recommendations(top_n=5, popular=2, workers=1)
+        # One unexcluded row plus the two most-ordered products per condition
+        self.assertEqual(rows, 3 * 3)
+        self.assertEqual(
+            set(PrecomputedRecommendation.objects.values_list(
+                "exclude", flat=True
+            )),
+            {0, *self.popular[:2]},
+        )
+        for condition in CONDITION_WEIGHTS:
+            for exclude in (None, *self.popular[:2]):
+                with self.subTest(condition=condition, exclude=exclude):
+                    precomputed = get_precomputed(condition, exclude, 5)
+                    live = self.live(condition, exclude)
+                    self.assertEqual(
+                        [pid for pid, _ in precomputed],
+                        [pid for pid, _ in live],
+                    )
+                    np.testing.assert_allclose(
+                        [score for _, score in precomputed],
+                        [score for _, score in live],
+                    )
+
+    def test_process_pool_matches_serial(self):
+        precompute_recommendations(top_n=5, popular=3, workers=1)
+        serial = get_precomputed("diabetes", self.popular[2], 5)
+        precompute_recommendations(top_n=5, popular=3, workers=2)
+        self.assertEqual(get_precomputed("diabetes", self.popular[2], 5), serial)
+
+    def test_missing_rows(self):
+        precompute_recommendations(top_n=5, popular=1, workers=1)
+        self.assertIsNone(get_precomputed("diabetes", self.popular[1]))
+        self.assertIsNone(get_precomputed("diabetes", limit=6))
+        self.assertEqual(len(get_precomputed("diabetes", limit=2)), 2)
+
+    def test_stale_after_catalog_write(self):
+        precompute_recommendations(top_n=5, popular=0, workers=1)
+        self.assertIsNotNone(get_precomputed("diabetes"))
+        with self.captureOnCommitCallbacks(execute=True):
+            nutrition = NutritionFacts.objects.get(
+                product_id=self.product_ids[0]
+            )
+            nutrition.fiber = 0
+            nutrition.save()
+        self.assertIsNone(get_precomputed("diabetes"))
+
+        # The precomputed strategy then falls back to live scoring
+        self.assertEqual(
+            rank_recommendations("diabetes", None, 5, strategy="precomputed"),
+            self.live("diabetes"),
+        )
+
+
+class IngredientExclusionTests(CatalogTestCase):
+    """Ingredient bitsets exclude the same products as a name search."""
+
+    catalog_size = 20
+
+    INGREDIENTS = [
+        ("Peanut Butter", False), ("peanut oil", True),
+        ("Shellfish Stock", True), ("Wheat Flour", True), ("Salt", False),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Ingredient.objects.bulk_create([
+            Ingredient(product_id=pid, name=name, is_flagged=flagged)
+            for i, pid in enumerate(cls.product_ids)
+            for name, flagged in cls.INGREDIENTS[i % 6:i % 6 + 2]
+        ])
+
+    def expected(self, terms):
+        ids = set()
+        for term in terms:
+            query = Ingredient.objects.filter(name__icontains=term)
+            if term == "flagged":
+                query = Ingredient.objects.filter(is_flagged=True)
+            ids.update(query.values_list("product_id", flat=True))
+        return sorted(ids)
+
+    def test_parse_terms(self):
+        self.assertEqual(
+            parse_terms(" Peanut,shellfish,,PEANUT "), ("peanut", "shellfish")
+        )
+        self.assertEqual(parse_terms(["Salt", " "]), ("salt",))
+        self.assertEqual(parse_terms(""), ())
+
+    def test_excluded_ids_match_name_search(self):
+        index = get_ingredient_index()
+        for terms in (("peanut",), ("shellfish", "flour"), ("flagged",),
+                      ("salt", "peanut"), ("truffle",)):
+            with self.subTest(terms=terms):
+                self.assertEqual(
+                    index.excluded_ids(terms).tolist(), self.expected(terms)
+                )
+
+    def test_recommendations_skip_excluded_products(self):
+        excluded = set(self.expected(["peanut"]))
+        ranked = rank_recommendations(
+            "diabetes", None, 6, exclude_ingredients=("peanut",)
+        )
+        self.assertEqual(len(ranked), 6)
+        self.assertFalse(excluded & {pid for pid, _ in ranked})
+
+        # The remaining products keep their relative order
+        everything = [pid for pid, _ in rank_recommendations(
+            "diabetes", None, len(self.product_ids)
+        )]
+        self.assertEqual(
+            [pid for pid, _ in ranked],
+            [pid for pid in everything if pid not in excluded][:6],
+        )
+
+        response = self.client.get(
+            "/api/ai/recommend/?condition=diabetes&limit=6"
+            "&exclude_ingredients=Peanut"
+        )
+        self.assertEqual([item["id"] for item in response.json()],
+                         [pid for pid, _ in ranked])
+
+    def test_ingredient_write_invalidates_index(self):
+        index = get_ingredient_index()
+        self.assertEqual(index.excluded_ids(("truffle",)).tolist(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(
+                product_id=self.product_ids[-1], name="Black Truffle"
+            )
+        self.assertEqual(
+            get_ingredient_index().excluded_ids(("truffle",)).tolist(),
+            [self.product_ids[-1]],
+        )
+
+
+class SuitabilityTests(CatalogTestCase):
+    """Bulk suitability scoring matches a per-product computation."""
+
+    catalog_size = 15
+
+    def reference(self, product):
+        """0-100 scores of one product, computed field by field."""
+        scores = []
+        for condition in SUITABILITY_FIELDS:
+            weights = CONDITION_WEIGHTS[condition]
+            profile = sum(
+                float(getattr(product.nutrition, field)) / DAILY_VALUES[field]
+                * weights.get(field, 0)
+                for field in NUTRITION_FIELDS
+            )
+            profile = 100 / (1 + np.exp(-10 * profile))
+            guideline = check_compliance(product, condition)["score"]
+            scores.append(int(np.clip(np.rint((guideline + profile) / 2), 0, 100)))
+        return scores
+
+    def stored(self):
+        return {
+            row[0]: list(row[1:])
+            for row in ProductSuitability.objects.values_list(
+                "product_id", *SUITABILITY_FIELDS
+            )
+        }
+
+    def test_recompute_matches_reference(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            updated, created = recompute_suitability(chunk_size=4, workers=1)
+        self.assertEqual((updated, created), (10, 5))
+        stored = self.stored()
+        for product in Product.objects.select_related("nutrition"):
+            with self.subTest(product=product.id):
+                self.assertEqual(stored[product.id], self.reference(product))
+
+        # The catalog index serves the new scores
+        index = get_catalog_index()
+        position = index.positions[self.product_ids[0]]
+        self.assertEqual(
+            index.suitability[position].tolist(), stored[self.product_ids[0]]
+        )
+
+    def test_process_pool_matches_serial(self):
+        recompute_suitability(workers=1)
+        serial = self.stored()
+        ProductSuitability.objects.all().delete()
+        self.assertEqual(
+            recompute_suitability(chunk_size=4, workers=2), (0, 15)
+        )
+        self.assertEqual(self.stored(), serial)
+
+    def test_rules_without_condition_score_full_guideline_share(self):
+        matrix = np.zeros((1, len(NUTRITION_FIELDS)))
+        rules = {condition: [] for condition in SUITABILITY_FIELDS}
+        # Profile of an all-zero row is 50: (100 + 50) / 2
+        self.assertEqual(
+            score_suitability(matrix, rules).tolist(), [[75, 75, 75]]
+        )
+
+    def test_nutrition_save_rescores_product(self):
+        product_id = self.product_ids[0]
+        nutrition = NutritionFacts.objects.get(product_id=product_id)
+        nutrition.sodium = 5
+        nutrition.fiber = 14
+        with self.captureOnCommitCallbacks(execute=True):
+            nutrition.save()
+        product = Product.objects.select_related("nutrition").get(id=product_id)
+        self.assertEqual(self.stored()[product_id], self.reference(product))
+
+    def test_scores_entered_with_nutrition_are_kept(self):
+        product_id = self.product_ids[1]
+        nutrition = NutritionFacts.objects.get(product_id=product_id)
+        nutrition.sodium = 5
+        with self.captureOnCommitCallbacks(execute=True):
+            nutrition.save()
+            ProductSuitability.objects.update_or_create(
+                product_id=product_id,
+                defaults={field: 1 for field in SUITABILITY_FIELDS},
+            )
+        self.assertEqual(self.stored()[product_id], [1, 1, 1])
+
+
+def mmr_reference(index, ranked, limit, diversity):
+    """Product ids picked by a plain-Python maximal-marginal-relevance loop."""
+    features = {}
+    scale = index.matrix.max(axis=0)
+    scale[scale == 0] = 1
+    for pid, _ in ranked:
+        vector = index.matrix[index.positions[pid]] / scale
+        norm = np.linalg.norm(vector)
+        features[pid] = vector / norm if norm else vector
+    scores = dict(ranked)
+    low, high = min(scores.values()), max(scores.values())
+
+    picked = [ranked[0][0]]
+    while len(picked) < min(limit, len(ranked)):
+        def value(pid):
+            relevance = (scores[pid] - low) / (high - low) if high > low else 1
+            nearest = max(float(features[pid] @ features[p]) for p in picked)
+            return (1 - diversity) * relevance - diversity * nearest
+        picked.append(max(
+            (pid for pid, _ in ranked if pid not in picked), key=value
+        ))
+    return picked
+
+
+class DiversifyTests(CatalogTestCase):
+    """MMR re-ranking trades score for variety as configured."""
+
+    def candidates(self, count=20):
+        return rank_recommendations("cardiovascular", None, count)
+
+    def test_no_diversity_keeps_score_order(self):
+        ranked = self.candidates()
+        reranked, meta = diversify(get_catalog_index(), ranked, 6, 0.0)
+        self.assertEqual(reranked, ranked[:6])
+        self.assertEqual(meta["score_loss"], 0.0)
+        self.assertEqual(meta["candidates"], 20)
+
+    def test_matches_reference(self):
+        index = get_catalog_index()
+        ranked = self.candidates()
+        for diversity in (0.3, 0.7, 1.0):
+            with self.subTest(diversity=diversity):
+                reranked, meta = diversify(index, ranked, 8, diversity)
+                self.assertEqual(
+                    [pid for pid, _ in reranked],
+                    mmr_reference(index, ranked, 8, diversity),
+                )
+                # The best product always stays first; scores are untouched
+                self.assertEqual(reranked[0], ranked[0])
+                self.assertLessEqual(set(reranked), set(ranked))
+                self.assertGreaterEqual(meta["score_loss"], 0)
+        self.assertNotEqual(reranked, ranked[:8])
+
+    def test_terms(self):
+        index = get_catalog_index()
+        ranked = self.candidates()
+        terms = {}
+        reranked, _ = diversify(index, ranked, 5, 0.5, terms)
+        self.assertEqual(set(terms), {pid for pid, _ in reranked})
+        self.assertEqual(terms[ranked[0][0]], {"relevance": 1.0, "penalty": 0.0})
+        lowest = min(score for _, score in ranked)
+        highest = max(score for _, score in ranked)
+        for pid, score in reranked:
+            self.assertAlmostEqual(
+                terms[pid]["relevance"],
+                (score - lowest) / (highest - lowest), places=4,
+            )
+
+    def test_limit_bounds(self):
+        index = get_catalog_index()
+        ranked = self.candidates(3)
+        self.assertEqual(len(diversify(index, ranked, 10, 0.5)[0]), 3)
+        self.assertEqual(diversify(index, ranked, 0, 0.5)[0], [])
+
+    @override_settings(AI_MMR_CANDIDATES=10)
+    def test_endpoint(self):
+        response = self.client.get(
+            "/api/ai/recommend/?condition=cardiovascular&limit=4&diversity=0.5"
+        )
+        data = response.json()
+        index = get_catalog_index()
+        self.assertEqual(
+            [item["id"] for item in data["results"]],
+            mmr_reference(index, self.candidates(10), 4, 0.5),
+        )
+        self.assertEqual(data["meta"]["candidates"], 10)
+
+        response = self.client.get(
+            "/api/ai/recommend/?condition=cardiovascular&diversity=1.5"
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class OffloaderTests(TestCase):
+    """The offload pool admits at most max_pending jobs."""
+
+    def test_rejects_jobs_over_limit(self):
+        offloader = async_views.Offloader(workers=1, max_pending=2)
+        release = threading.Event()
+
+        async def scenario():
+            running = [
+                asyncio.ensure_future(offloader.run(release.wait))
+                for _ in range(2)
+            ]
+            await asyncio.sleep(0)
+            self.assertEqual(offloader.pending, 2)
+            with self.assertRaises(async_views.PoolSaturated):
+                await offloader.run(int, "1")
+            release.set()
+            await asyncio.gather(*running)
+            self.assertEqual(offloader.pending, 0)
+            return await offloader.run(int, "7")
+
+        self.assertEqual(asyncio.run(scenario()), 7)
+        offloader.executor.shutdown()
+
+    def test_failed_jobs_release_their_slot(self):
+        offloader = async_views.Offloader(workers=1, max_pending=1)
+        with self.assertRaises(ValueError):
+            asyncio.run(offloader.run(int, "x"))
+        self.assertEqual(offloader.pending, 0)
+        offloader.executor.shutdown()
+
+
+class AsyncViewTests(CatalogTestCase):
+    """The ASGI endpoints answer like the DRF views, or 503 when busy."""
+
+    catalog_size = 12
+
+    def setUp(self):
+        super().setUp()
+        # Pool threads use their own connection, which cannot see the
+        # test transaction: load what they read up front
+        get_catalog_index()
+        get_rule_set()
+
+    def test_recommend_matches_sync_view(self):
+        query = "?condition=diabetes&limit=3&exclude=%d" % self.product_ids[0]
+        expected = self.client.get("/api/ai/recommend/" + query).json()
+        response = self.client.get("/api/ai/async/recommend/" + query)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), expected)
+
+    def test_errors(self):
+        response = self.client.get("/api/ai/async/recommend/?limit=x")
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(
+            "/api/ai/async/recommend/?condition=diabetes",
+            HTTP_AUTHORIZATION="Bearer not-a-token",
+        )
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("WWW-Authenticate", response)
+
+    def test_busy_pool_returns_503(self):
+        saturated = async_views.Offloader(workers=1, max_pending=0)
+        self.addCleanup(saturated.executor.shutdown)
+        with mock.patch.object(async_views, "_offloader", saturated):
+            for url in (
+                "/api/ai/async/recommend/?condition=diabetes",
+                f"/api/ai/async/compliance/?product={self.product_ids[0]}",
+            ):
+                with self.subTest(url=url):
+                    response = self.client.get(url)
+                    self.assertEqual(response.status_code, 503)
+                    self.assertEqual(response["Retry-After"], "1")
+
+
+class ExplanationTests(CatalogTestCase):
+    """Explanation terms add up to the served ai_score."""
+
+    catalog_size = 15
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = get_user_model().objects.create_user(
+            username="explainer", password="explainer-pass-123"
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(mock.patch.object(copurchase, "_model", None))
+        viewed, *others = self.product_ids[:4]
+        for count, other in enumerate(others, 1):
+            for _ in range(count):
+                order = Order.objects.create(user=self.user)
+                OrderItem.objects.bulk_create([
+                    OrderItem(order=order, product_id=pid, unit_price=1)
+                    for pid in (viewed, other)
+                ])
+                copurchase.record_order([viewed, other])
+        self.viewed = viewed
+
+    def assertExplained(self, ranked, explanations):
+        self.assertEqual(set(explanations), {pid for pid, _ in ranked})
+        for pid, score in ranked:
+            terms = explanations[pid]
+            total = (
+                sum(terms["nutrients"].values()) + terms["suitability"]
+                + terms["copurchase"]
+            )
+            self.assertAlmostEqual(total, score, delta=1e-3)
+            self.assertAlmostEqual(terms["score"], score, places=4)
+
+    def test_content_terms(self):
+        product = Product.objects.select_related(
+            "nutrition", "suitability"
+        ).get(id=self.product_ids[1])
+        explanations = explain_recommendations(
+            "diabetes", [(product.id, loop_scores("diabetes")[product.id])]
+        )
+        terms = explanations[product.id]
+        vector = build_nutrition_vector(product.nutrition)
+        weights = CONDITION_WEIGHTS["diabetes"]
+        for field, value in zip(NUTRITION_FIELDS, vector / np.linalg.norm(vector)):
+            self.assertAlmostEqual(
+                terms["nutrients"][field],
+                0.4 * value * weights.get(field, 0), places=4,
+            )
+        self.assertAlmostEqual(
+            terms["suitability"], 0.6 * product.suitability.diabetes / 100,
+            places=4,
+        )
+        self.assertEqual(terms["copurchase"], 0.0)
+
+    def test_terms_sum_to_score(self):
+        cases = [
+            {"strategy": "content"},
+            {"strategy": "copurchase", "exclude_id": True},
+            {"strategy": "hybrid", "exclude_id": True},
+            {"strategy": "content", "exclude_id": True,
+             "copurchase_weight": 0.4},
+            {"strategy": "hybrid", "exclude_id": True,
+             "copurchase_weight": 0.4, "diversity": 0.5},
+        ]
+        for case in cases:
+            with self.subTest(**case):
+                kwargs = dict(case)
+                kwargs["exclude_id"] = self.viewed if "exclude_id" in case else None
+                explanations = {}
+                ranked = rank_recommendations(
+                    "hypertension", limit=6, explanations=explanations,
+                    **kwargs,
+                )
+                self.assertExplained(ranked, explanations)
+                if kwargs["exclude_id"]:
+                    self.assertGreater(
+                        max(e["copurchase"] for e in explanations.values()), 0
+                    )
+                if "diversity" in case:
+                    self.assertTrue(all(
+                        e["diversity"] is not None
+                        for e in explanations.values()
+                    ))
+
+    def test_endpoint(self):
+        url = "/api/ai/recommend/?condition=diabetes&limit=3"
+        data = self.client.get(url + "&explain=1").json()
+        self.assertEqual(
+            [item["id"] for item in data],
+            [item["id"] for item in self.client.get(url).json()],
+        )
+        for item in data:
+            terms = item["explanation"]
+            self.assertAlmostEqual(
+                sum(terms["nutrients"].values()) + terms["suitability"]
+                + terms["copurchase"],
+                item["ai_score"], delta=2e-3,
+            )
+
+
+class FailingSink:
+    def write(self, events):
+        raise ConnectionError("sink down")
+
+
+class EventLogTests(TestCase):
+    """Logging only appends to the buffer; the sink gets batches."""
+
+    def event_log(self, sink=None, **kwargs):
+        log = EventLog(sink or MemorySink(), **kwargs)
+        # No flush thread: the test flushes explicitly
+        self.enterContext(mock.patch.object(log, "_ensure_thread"))
+        return log
+
+    def test_full_buffer_drops_oldest(self):
+        log = self.event_log(capacity=3)
+        for i in range(5):
+            log.log({"n": i})
+        log.flush()
+        self.assertEqual(log.sink.events, [{"n": 2}, {"n": 3}, {"n": 4}])
+        self.assertEqual(
+            log.stats(),
+            {"sink": "MemorySink", "buffered": 0, "capacity": 3, "logged": 5,
+             "written": 3, "dropped": 2, "failed": 0},
+        )
+
+    def test_flush_writes_batches(self):
+        sink = mock.Mock()
+        log = self.event_log(sink, batch_size=2)
+        for i in range(5):
+            log.log({"n": i})
+        log.flush()
+        self.assertEqual(
+            [len(call.args[0]) for call in sink.write.call_args_list],
+            [2, 2, 1],
+        )
+
+    def test_failed_writes_counted(self):
+        log = self.event_log(FailingSink())
+        log.log({"n": 1})
+        with self.assertLogs("ai_engine.events", "WARNING"):
+            log.flush()
+        self.assertEqual(log.stats()["failed"], 1)
+        self.assertEqual(log.stats()["buffered"], 0)
+
+    def test_flush_thread(self):
+        log = EventLog(MemorySink(), batch_size=2, flush_interval=60)
+        log.log({"n": 1})
+        log.log({"n": 2})
+        log.log({"n": 3})
+        log.close()
+        self.assertFalse(log._thread.is_alive())
+        self.assertEqual(log.sink.events, [{"n": 1}, {"n": 2}, {"n": 3}])
+
+
+class EventEndpointTests(CatalogTestCase):
+    """Recommend responses log impressions; clicks are posted."""
+
+    catalog_size = 8
+
+    def setUp(self):
+        super().setUp()
+        self.log = EventLog(MemorySink())
+        self.enterContext(mock.patch.object(self.log, "_ensure_thread"))
+        self.enterContext(mock.patch.object(events, "_event_log", self.log))
+
+    def logged(self):
+        self.log.flush()
+        return self.log.sink.events
+
+    def test_impressions(self):
+        data = self.client.get(
+            "/api/ai/recommend/?condition=diabetes&limit=3"
+        ).json()
+        self.assertEqual(
+            [
+                (e["type"], e["product_id"], e["position"], e["source"])
+                for e in self.logged()
+            ],
+            [
+                ("impression", item["id"], position, "recommend")
+                for position, item in enumerate(data)
+            ],
+        )
+
+    def test_click(self):
+        response = self.client.post(
+            "/api/ai/events/",
+            {"type": "click", "product_id": self.product_ids[0],
+             "condition": "diabetes", "position": 1},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 202)
+        [event] = self.logged()
+        self.assertEqual(event["type"], "click")
+        self.assertEqual(event["product_id"], self.product_ids[0])
+        self.assertIsNone(event["user_id"])
+
+        response = self.client.post(
+            "/api/ai/events/",
+            {"type": "impression", "product_id": self.product_ids[0]},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get("/api/ai/events/").status_code, 401)
+
+
+class StrategyTests(CatalogTestCase):
+    """Users are bucketed stably; shadow runs never touch the response."""
+
+    catalog_size = 12
+
+    def setUp(self):
+        super().setUp()
+        self.metrics = strategies.StrategyMetrics()
+        self.enterContext(
+            mock.patch.object(strategies, "metrics", self.metrics)
+        )
+        get_catalog_index()
+
+    def wait_for_shadow(self):
+        # The pool has one thread: this runs after any pending shadow run
+        strategies._shadow_pool.submit(lambda: None).result()
+
+    def test_bucketing(self):
+        users = [SimpleNamespace(pk=pk) for pk in range(1, 2001)]
+        buckets = {"hybrid": 30, "copurchase": 10}
+        with override_settings(AI_STRATEGY_BUCKETS=buckets):
+            assigned = [strategies.choose_strategy(user) for user in users]
+            self.assertEqual(
+                [strategies.choose_strategy(user) for user in users], assigned
+            )
+            self.assertEqual(strategies.choose_strategy(None), "content")
+            self.assertEqual(
+                strategies.choose_strategy(SimpleNamespace(pk=None)), "content"
+            )
+        shares = {
+            name: assigned.count(name) / len(users)
+            for name in ("hybrid", "copurchase", "content")
+        }
+        self.assertAlmostEqual(shares["hybrid"], 0.3, delta=0.04)
+        self.assertAlmostEqual(shares["copurchase"], 0.1, delta=0.03)
+        self.assertAlmostEqual(shares["content"], 0.6, delta=0.04)
+
+    def test_bucketed_user_served_by_strategy(self):
+        user = get_user_model().objects.create_user(
+            username="bucketed", password="bucketed-pass-123"
+        )
+        self.client.force_login(user)
+        with override_settings(AI_STRATEGY_BUCKETS={"hybrid": 100}):
+            self.client.get("/api/ai/recommend/?condition=diabetes")
+        self.assertEqual(list(self.metrics.snapshot()["latency"]), ["hybrid"])
+
+    @override_settings(AI_SHADOW_STRATEGY="precomputed", AI_SHADOW_SAMPLE=1.0)
+    def test_shadow_run(self):
+        ranked = strategies.rank("content", "diabetes", None, 4)
+        self.assertEqual(ranked, get_catalog_index().rank("diabetes", None, 4))
+        self.wait_for_shadow()
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(
+            set(snapshot["latency"]), {"content", "precomputed (shadow)"}
+        )
+        # Without precomputed rows it serves the same products
+        self.assertEqual(
+            snapshot["overlap"],
+            {"content->precomputed": {"count": 1, "mean": 1.0}},
+        )
+
+    @override_settings(AI_SHADOW_STRATEGY="content", AI_SHADOW_SAMPLE=1.0)
+    def test_shadow_skipped_or_failing(self):
+        # Not run against itself
+        strategies.rank("content", "diabetes", None, 4)
+        self.assertNotIn("content (shadow)", self.metrics.snapshot()["latency"])
+
+        with override_settings(AI_SHADOW_STRATEGY="broken"), \
+                mock.patch.dict(strategies.STRATEGIES, broken=mock.Mock(
+                    side_effect=RuntimeError("boom")
+                )):
+            strategies.rank("content", "diabetes", None, 4)
+            self.wait_for_shadow()
+            self.assertEqual(self.metrics.shadow_errors, 1)
+
+            # One shadow run at a time: the others are skipped
+            self.assertTrue(strategies._shadow_slot.acquire(blocking=False))
+            try:
+                strategies.rank("content", "diabetes", None, 4)
+            finally:
+                strategies._shadow_slot.release()
+            self.assertEqual(self.metrics.shadow_skipped, 1)
+
+    def test_latency_histogram(self):
+        for elapsed in (0.2, 3, 3, 40, 5000):
+            self.metrics.observe("content", elapsed)
+        latency = self.metrics.snapshot()["latency"]["content"]
+        self.assertEqual(latency["count"], 5)
+        self.assertEqual(latency["p50_ms"], 5)
+        self.assertIsNone(latency["p99_ms"])
+        self.assertEqual(latency["buckets"]["+inf"], 1)
+
+    def test_system_checks(self):
+        self.assertEqual(check_strategies(None), [])
+        cases = [
+            ({"AI_STRATEGY": "nope"}, ["ai_engine.E001"]),
+            ({"AI_STRATEGY_BUCKETS": ["hybrid"]}, ["ai_engine.E002"]),
+            ({"AI_STRATEGY_BUCKETS": {"nope": 10}}, ["ai_engine.E002"]),
+            ({"AI_STRATEGY_BUCKETS": {"hybrid": 60, "copurchase": 50}},
+             ["ai_engine.E002"]),
+            ({"AI_STRATEGY_BUCKETS": {"hybrid": True}}, ["ai_engine.E002"]),
+            ({"AI_SHADOW_STRATEGY": "nope"}, ["ai_engine.E003"]),
+        ]
+        for overrides, ids in cases:
+            with self.subTest(**overrides), override_settings(**overrides):
+                self.assertEqual(
+                    [error.id for error in check_strategies(None)], ids
+                )
@@ -1,7 +1,55 @@
 from django.urls import path
-from .views import RecommendationView, ComplianceView
+from . import async_views
+from .views import (
+    RecommendationView,
+    BatchRecommendationView,
+    PersonalizedRecommendationView,
+    ComplianceView,
+    BulkComplianceView,
+    BasketOptimizationView,
+    CacheStatsView,
+    EventView,
+    StrategyMetricsView,
+)
 
 urlpatterns = [
     path("recommend/", RecommendationView.as_view(), name="ai-recommend"),
+    path(
+        "recommend/batch/",
+        BatchRecommendationView.as_view(),
+        name="ai-recommend-batch",
+    ),
+    path(
+        "recommend/for-me/",
+        PersonalizedRecommendationView.as_view(),
+        name="ai-recommend-for-me",
+    ),
     path("compliance/", ComplianceView.as_view(), name="ai-compliance"),
+    path(
+        "compliance/bulk/",
+        BulkComplianceView.as_view(),
+        name="ai-compliance-bulk",
+    ),
+    path(
+        "optimize-basket/",
+        BasketOptimizationView.as_view(),
+        name="ai-optimize-basket",
+    ),
+    path("cache/stats/", CacheStatsView.as_view(), name="ai-cache-stats"),
+    path("events/", EventView.as_view(), name="ai-events"),
+    path(
+        "strategies/metrics/",
+        StrategyMetricsView.as_view(),
+        name="ai-strategy-metrics",
+    ),
+    path(
+        "async/recommend/",
+        async_views.recommend,
+        name="ai-async-recommend",
+    ),
+    path(
+        "async/compliance/",
+        async_views.compliance,
+        name="ai-async-compliance",
+    ),
 ]
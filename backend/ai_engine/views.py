@@ -1,9 +1,221 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework import permissions, status
 from products.models import Product
 from products.serializers import ProductListSerializer
-from .recommender import get_recommendations, check_compliance
+from .recommender import (
+    get_batch_recommendations,
+    get_personalized_recommendations,
+    normalize_conditions,
+    check_compliance,
+    check_compliance_bulk,
+    rank_recommendations,
+)
+from .cache import cache_stats, cached_response
+from .events import get_event_log, log_event, log_impressions
+from .guidelines import get_rule_set
+from .ingredients import parse_terms
+from .optimizer import optimize_basket
+from .strategies import choose_strategy, metrics as strategy_metrics
+from .serializers import (
+    BasketOptimizationSerializer,
+    BatchRecommendationSerializer,
+    EventSerializer,
+)
+
+
+def result_queryset():
+    """
+    Queryset the winning products are loaded from.
+
+    Scoring runs on the in-memory CatalogIndex, so only the top-k rows
+    are fetched, with just the relations ProductListSerializer renders.
+    """
+    return Product.objects.select_related(
+        "suitability"
+    ).prefetch_related("categories")
+
+
+def serialize_ranked(results, explanations=None):
+    """
+    Serialize (product, score) pairs, adding the rounded ai_score.
+
+    `explanations` (product_id -> dict, see explain_recommendations) are
+    attached as "explanation" when given.
+    """
+    data = []
+    for product, score in results:
+        serialized = ProductListSerializer(product).data
+        serialized["ai_score"] = round(score, 3)
+        if explanations is not None:
+            serialized["explanation"] = explanations.get(product.id)
+        data.append(serialized)
+    return data
+
+
+def parse_recommendation_params(query_params):
+    """
+    Validate the query parameters of the recommend endpoints.
+
+    Returns:
+        (params, error): a dict of condition, exclude, limit, copurchase,
+        diversity, exclude_ingredients and explain, or None and an error
+        message
+    """
+    condition = query_params.get("condition", "cardiovascular")
+    if condition not in ("cardiovascular", "diabetes", "hypertension"):
+        return None, "Invalid condition. Use: cardiovascular, diabetes, hypertension"
+
+    try:
+        exclude_id = query_params.get("exclude")
+        params = {
+            "condition": condition,
+            "exclude": int(exclude_id) if exclude_id else None,
+            "limit": int(query_params.get("limit", 4)),
+            "copurchase": float(query_params.get("copurchase", 0)),
+            "diversity": float(query_params.get("diversity", 0)),
+        }
+    except ValueError:
+        return None, "exclude, limit, copurchase and diversity must be numbers"
+
+    if not 0 <= params["copurchase"] <= 1:
+        return None, "copurchase must be between 0 and 1"
+    if not 0 <= params["diversity"] <= 1:
+        return None, "diversity must be between 0 and 1"
+
+    params["exclude_ingredients"] = parse_terms(
+        query_params.get("exclude_ingredients", "")
+    )
+    params["explain"] = query_params.get("explain", "") in ("1", "true")
+    return params, None
+
+
+def parse_personalized_params(query_params):
+    """
+    Validate the query parameters of the personalized recommend endpoint.
+
+    Its conditions come from the user's health_profile, and it has no
+    co-purchase, diversity or explain options.
+
+    Returns:
+        (params, error): a dict of exclude, limit and exclude_ingredients,
+        or None and an error message
+    """
+    try:
+        exclude_id = query_params.get("exclude")
+        params = {
+            "exclude": int(exclude_id) if exclude_id else None,
+            "limit": int(query_params.get("limit", 4)),
+        }
+    except ValueError:
+        return None, "exclude and limit must be numbers"
+
+    params["exclude_ingredients"] = parse_terms(
+        query_params.get("exclude_ingredients", "")
+    )
+    return params, None
+
+
+def recommendation_cache_params(params):
+    """
+    Response-cache key parameters of a parsed recommend request.
+
+    Returns None when the response must not be cached: co-purchase
+    counts move with every order, not the catalog.
+    """
+    if params["copurchase"]:
+        return None
+    return {
+        "condition": params["condition"],
+        "exclude": params["exclude"] or "",
+        "limit": params["limit"],
+        "exclude_ingredients": ",".join(params["exclude_ingredients"]),
+        "diversity": params["diversity"],
+        "explain": int(params["explain"]),
+        "strategy": params["strategy"],
+    }
+
+
+def rank_for_params(params):
+    """
+    Rank a parsed recommend request (shared by the sync and async views).
+
+    Returns:
+        (ranked, meta, explanations) for recommendation_data()
+    """
+    meta = {}
+    explanations = {} if params["explain"] else None
+    ranked = rank_recommendations(
+        params["condition"], params["exclude"], params["limit"],
+        params["copurchase"], params["exclude_ingredients"],
+        params["diversity"], meta, params["strategy"], explanations,
+    )
+    return ranked, meta, explanations
+
+
+def recommendation_data(params, ranked, meta, explanations, products):
+    """
+    Response body of a recommend request.
+
+    Args:
+        ranked, meta, explanations: rank_for_params() result
+        products: product_id -> Product (result_queryset().in_bulk)
+    """
+    data = serialize_ranked(
+        ((products[pid], score) for pid, score in ranked if pid in products),
+        explanations,
+    )
+    if params["diversity"]:
+        return {"results": data, "meta": meta}
+    return data
+
+
+def parse_compliance_params(query_params, rule_set):
+    """
+    Validate the query parameters of the compliance endpoints.
+
+    Returns:
+        (product_id, condition, error): error is None or a
+        (message, HTTP status) pair
+    """
+    product_id = query_params.get("product")
+    condition = query_params.get("condition", "cardiovascular")
+    if not product_id:
+        return None, None, (
+            "product query parameter is required",
+            status.HTTP_400_BAD_REQUEST,
+        )
+    if condition not in rule_set:
+        return None, None, (
+            "Invalid condition. Use: " + ", ".join(rule_set.conditions),
+            status.HTTP_400_BAD_REQUEST,
+        )
+    if not product_id.isdigit():
+        return None, None, ("Product not found", status.HTTP_404_NOT_FOUND)
+    return product_id, condition, None
+
+
+def compliance_queryset():
+    """Queryset compliance reports load their product from."""
+    return Product.objects.select_related("nutrition")
+
+
+def compliance_data(product, condition):
+    """Compliance report of a product, as returned by the endpoints."""
+    report = check_compliance(product, condition)
+    report["product_id"] = product.id
+    report["product_name"] = product.name
+    report["condition"] = condition
+    return report
+
+
+def log_recommendation_impressions(user, params, data, source):
+    """Log an impression for every product of a recommend response."""
+    results = data["results"] if isinstance(data, dict) else data
+    log_impressions(
+        [item["id"] for item in results], user,
+        condition=params["condition"], source=source,
+    )
 
 
 class RecommendationView(APIView):
@@ -11,32 +223,131 @@ class RecommendationView(APIView):
     GET /api/ai/recommend/?condition=cardiovascular&exclude=1&limit=4
 
     Returns AI-powered product recommendations for a health condition.
+    Pass copurchase=0.3 to blend in how often each product is bought
+    together with the excluded (currently viewed) product, and
+    exclude_ingredients=peanut,shellfish (or "flagged" for every flagged
+    allergen) to drop products containing those ingredients.
+
+    Pass diversity=0.3 (0-1) to re-rank for variety (MMR); the response
+    is then {"results": [...], "meta": {...}} with the re-ranking time
+    and score loss.
+
+    Pass explain=1 to add the terms of each product's ai_score as
+    "explanation": per-nutrient contributions, suitability blend and
+    co-purchase terms, plus the MMR terms when diversity is set.
+
+    The scoring strategy is AI_STRATEGY, or the one the user's bucket is
+    assigned to by AI_STRATEGY_BUCKETS (see strategies.py).
     """
 
     def get(self, request):
-        condition = request.query_params.get("condition", "cardiovascular")
-        exclude_id = request.query_params.get("exclude")
-        limit = int(request.query_params.get("limit", 4))
-
-        if condition not in ("cardiovascular", "diabetes", "hypertension"):
+        params, error = parse_recommendation_params(request.query_params)
+        if error:
             return Response(
-                {"error": "Invalid condition. Use: cardiovascular, diabetes, hypertension"},
-                status=status.HTTP_400_BAD_REQUEST,
+                {"error": error}, status=status.HTTP_400_BAD_REQUEST
+            )
+        params["strategy"] = choose_strategy(request.user)
+
+        def compute():
+            ranked, meta, explanations = rank_for_params(params)
+            products = result_queryset().in_bulk([pid for pid, _ in ranked])
+            return recommendation_data(
+                params, ranked, meta, explanations, products
+            )
+
+        cache_params = recommendation_cache_params(params)
+        if cache_params is None:
+            data = compute()
+        else:
+            data = cached_response("recommend", cache_params, compute)
+        log_recommendation_impressions(request.user, params, data, "recommend")
+        return Response(data)
+
+
+class BatchRecommendationView(APIView):
+    """
+    POST /api/ai/recommend/batch/
+
+    {"queries": [{"condition": "diabetes", "exclude": 1, "limit": 4}, ...]}
+
+    Scores every query in one pass and returns the results keyed by
+    query (the optional "key" field, or "condition:exclude:limit").
+    """
+
+    def post(self, request):
+        serializer = BatchRecommendationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        queries = serializer.validated_data["queries"]
+
+        results = get_batch_recommendations(
+            [(q["condition"], q.get("exclude"), q["limit"]) for q in queries],
+            result_queryset(),
+        )
+
+        # Serialize each product once, however many queries it appears in
+        serialized = {}
+        data = {}
+        for query, ranked in zip(queries, results):
+            key = query.get("key") or "{}:{}:{}".format(
+                query["condition"], query.get("exclude") or "", query["limit"]
             )
+            items = []
+            for product, score in ranked:
+                if product.id not in serialized:
+                    serialized[product.id] = ProductListSerializer(product).data
+                item = dict(serialized[product.id])
+                item["ai_score"] = round(score, 3)
+                items.append(item)
+            data[key] = items
+
+        return Response(data)
+
 
-        products_qs = Product.objects.select_related(
-            "nutrition", "suitability"
-        ).prefetch_related("categories", "ingredients")
+class PersonalizedRecommendationView(APIView):
+    """
+    GET /api/ai/recommend/for-me/?exclude=1&limit=4&exclude_ingredients=peanut
+
+    Recommendations blended across every condition in the current
+    user's health_profile, compliant with all of them.
+    """
 
-        exclude = int(exclude_id) if exclude_id else None
-        results = get_recommendations(condition, products_qs, exclude, limit)
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        params, error = parse_personalized_params(request.query_params)
+        if error:
+            return Response(
+                {"error": error}, status=status.HTTP_400_BAD_REQUEST
+            )
+        exclude = params["exclude"]
+        limit = params["limit"]
+        exclude_ingredients = params["exclude_ingredients"]
 
-        data = []
-        for product, score in results:
-            serialized = ProductListSerializer(product).data
-            serialized["ai_score"] = round(score, 3)
-            data.append(serialized)
+        profile = request.user.health_profile or {}
+        conditions = normalize_conditions(profile.get("conditions", []))
+        if not conditions:
+            return Response(
+                {"error": "No health conditions set on your profile."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
+        def compute():
+            return serialize_ranked(get_personalized_recommendations(
+                conditions, result_queryset(), exclude, limit,
+                exclude_ingredients,
+            ))
+
+        # Keyed on the condition set, so users with one profile share it
+        data = cached_response(
+            "recommend-for-me",
+            {
+                "conditions": ",".join(conditions),
+                "exclude": exclude or "",
+                "limit": limit,
+                "exclude_ingredients": ",".join(exclude_ingredients),
+            },
+            compute,
+        )
         return Response(data)
 
 
@@ -49,34 +360,207 @@ class ComplianceView(APIView):
     """
 
     def get(self, request):
-        product_id = request.query_params.get("product")
-        condition = request.query_params.get("condition", "cardiovascular")
+        product_id, condition, error = parse_compliance_params(
+            request.query_params, get_rule_set()
+        )
+        if error:
+            message, error_status = error
+            return Response({"error": message}, status=error_status)
+
+        def compute():
+            return compliance_data(
+                compliance_queryset().get(id=product_id), condition
+            )
 
-        if not product_id:
+        try:
+            report = cached_response(
+                "compliance",
+                {"product": product_id, "condition": condition},
+                compute,
+            )
+        except Product.DoesNotExist:
             return Response(
-                {"error": "product query parameter is required"},
-                status=status.HTTP_400_BAD_REQUEST,
+                {"error": "Product not found"},
+                status=status.HTTP_404_NOT_FOUND,
             )
 
-        if condition not in ("cardiovascular", "diabetes", "hypertension"):
+        return Response(report)
+
+
+class BulkComplianceView(APIView):
+    """
+    GET /api/ai/compliance/bulk/?condition=diabetes,hypertension&product=1,2
+
+    Compliance grid for every product (or the listed ones) against every
+    condition (or the listed ones). "issues" names the failing nutrients.
+    Products without nutrition data are not included.
+    """
+
+    def get(self, request):
+        condition_param = request.query_params.get("condition")
+        product_param = request.query_params.get("product")
+
+        rule_set = get_rule_set()
+        conditions = (
+            condition_param.split(",") if condition_param
+            else rule_set.conditions
+        )
+        unknown = [c for c in conditions if c not in rule_set]
+        if unknown:
             return Response(
-                {"error": "Invalid condition. Use: cardiovascular, diabetes, hypertension"},
+                {"error": "Invalid condition. Use: " + ", ".join(rule_set.conditions)},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
         try:
-            product = Product.objects.select_related("nutrition").get(
-                id=product_id
+            product_ids = (
+                [int(pid) for pid in product_param.split(",")]
+                if product_param else None
             )
-        except Product.DoesNotExist:
+        except ValueError:
             return Response(
-                {"error": "Product not found"},
-                status=status.HTTP_404_NOT_FOUND,
+                {"error": "product must be a comma-separated list of ids"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
 
-        report = check_compliance(product, condition)
-        report["product_id"] = product.id
-        report["product_name"] = product.name
-        report["condition"] = condition
+        def compute():
+            ids, grid = check_compliance_bulk(conditions, product_ids)
+            nutrients = {
+                condition: rule_set.rule_nutrients(condition)
+                for condition in conditions
+            }
 
-        return Response(report)
+            results = []
+            for row, product_id in enumerate(ids.tolist()):
+                entry = {"product_id": product_id}
+                for condition in conditions:
+                    passes, score, compliant = grid[condition]
+                    entry[condition] = {
+                        "compliant": bool(compliant[row]),
+                        "score": int(score[row]),
+                        "issues": [
+                            nutrient
+                            for nutrient, ok in zip(
+                                nutrients[condition], passes[row]
+                            )
+                            if not ok
+                        ],
+                    }
+                results.append(entry)
+            return {
+                "conditions": conditions,
+                "rules": nutrients,
+                "results": results,
+            }
+
+        data = cached_response(
+            "compliance-bulk",
+            {
+                "condition": ",".join(conditions),
+                "product": ",".join(map(str, sorted(set(product_ids or [])))),
+            },
+            compute,
+        )
+        return Response(data)
+
+
+class BasketOptimizationView(APIView):
+    """
+    POST /api/ai/optimize-basket/
+
+    {"budget": 500, "conditions": ["diabetes"], "headcount": 40,
+     "caps": {"sodium": 20000, "sugars": 200}}
+
+    Returns the product/quantity mix maximizing suitability within the
+    budget and nutrient caps. "items" can be posted to /api/orders/ as-is.
+    Infeasible constraints get a 422; a solver time limit reached before
+    any basket was found gets a 503.
+    """
+
+    def post(self, request):
+        serializer = BasketOptimizationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        result = optimize_basket(
+            budget=float(params["budget"]),
+            conditions=normalize_conditions(params["conditions"]),
+            headcount=params["headcount"],
+            caps=params["caps"],
+            max_per_product=params.get("max_per_product"),
+            compliant_only=params["compliant_only"],
+        )
+        if result["status"] == "no_solution":
+            return Response(
+                {
+                    "error": "No basket was found within the solver time "
+                    "limit; retry or narrow the request.",
+                    **result,
+                },
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        if result["status"] == "infeasible":
+            return Response(
+                {
+                    "error": "No basket satisfies the budget, headcount "
+                    "and nutrient caps.",
+                    **result,
+                },
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        return Response(result)
+
+
+class EventView(APIView):
+    """
+    POST /api/ai/events/
+
+    {"type": "click", "product_id": 3, "condition": "diabetes",
+     "source": "recommend", "position": 0}
+
+    Records a click or add-to-cart on a recommended product
+    (impressions are logged by the recommend endpoints themselves).
+    GET returns the event log counters (staff only).
+    """
+
+    def get_permissions(self):
+        if self.request.method == "GET":
+            return [permissions.IsAdminUser()]
+        return [permissions.AllowAny()]
+
+    def get(self, request):
+        return Response(get_event_log().stats())
+
+    def post(self, request):
+        serializer = EventSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        event = dict(serializer.validated_data)
+        log_event(event.pop("type"), event.pop("product_id"), request.user, **event)
+        return Response(status=status.HTTP_202_ACCEPTED)
+
+
+class StrategyMetricsView(APIView):
+    """
+    GET /api/ai/strategies/metrics/
+
+    Latency histograms per scoring strategy and shadow-run overlap with
+    the served results, for this worker process (staff only).
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(strategy_metrics.snapshot())
+
+
+class CacheStatsView(APIView):
+    """
+    GET /api/ai/cache/stats/
+
+    Hit/miss counters of the AI response cache (staff only).
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_stats())
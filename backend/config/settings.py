@@ -2,6 +2,7 @@
 Django settings for LavishBite backend.
 """
 
+import json
 import os
 from pathlib import Path
 from datetime import timedelta
@@ -22,6 +23,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     # Third-party
     "rest_framework",
     "rest_framework_simplejwt",
@@ -112,6 +114,54 @@ if config("USE_LOCMEM_CACHE", default=False, cast=bool):
         }
     }
 
+# ─── AI engine ───────────────────────────────────────────────────────
+# Versioned on-disk model artifacts, memory-mapped by every worker
+AI_MODEL_DIR = Path(config("AI_MODEL_DIR", default=str(BASE_DIR / "ai_models")))
+AI_ARTIFACT_CHECK_INTERVAL = config("AI_ARTIFACT_CHECK_INTERVAL", default=5, cast=int)
+# Seconds a worker batches catalog writes before rebuilding a stale
+# build_recommender_model artifact in the background (0 disables)
+AI_MODEL_REBUILD_DELAY = config("AI_MODEL_REBUILD_DELAY", default=30.0, cast=float)
+AI_SIMILAR_K = config("AI_SIMILAR_K", default=10, cast=int)
+AI_SIMILAR_INGREDIENT_WEIGHT = config(
+    "AI_SIMILAR_INGREDIENT_WEIGHT", default=0.2, cast=float
+)
+# Seconds a background worker batches edits before patching the graph
+AI_SIMILAR_UPDATE_DELAY = config("AI_SIMILAR_UPDATE_DELAY", default=2.0, cast=float)
+# Seconds before a worker reloads co-purchase counts written by others
+AI_COPURCHASE_REFRESH = config("AI_COPURCHASE_REFRESH", default=300, cast=int)
+# Basket optimizer: candidate pool size and solver time limit (seconds)
+AI_BASKET_CANDIDATES = config("AI_BASKET_CANDIDATES", default=300, cast=int)
+AI_BASKET_TIME_LIMIT = config("AI_BASKET_TIME_LIMIT", default=0.8, cast=float)
+# Approximate nearest-neighbour search: catalogs of at least
+# AI_ANN_MIN_PRODUCTS use an IVF index; more probes = better recall.
+# Below 200k products exact scoring takes under ~5 ms; at 200k, 48 probes
+# keep recall@10 at 1.0 (benchmark_ann), at 500k about 0.97.
+AI_ANN_MIN_PRODUCTS = config("AI_ANN_MIN_PRODUCTS", default=200000, cast=int)
+AI_ANN_LISTS = config("AI_ANN_LISTS", default=0, cast=int)  # 0 = sqrt(N)
+AI_ANN_NPROBE = config("AI_ANN_NPROBE", default=48, cast=int)
+# Candidates re-ranked when a recommendation asks for diversity (MMR)
+AI_MMR_CANDIDATES = config("AI_MMR_CANDIDATES", default=200, cast=int)
+# Async endpoints: scoring threads per worker, and queued jobs before 503
+AI_ASYNC_WORKERS = config("AI_ASYNC_WORKERS", default=4, cast=int)
+AI_ASYNC_MAX_PENDING = config("AI_ASYNC_MAX_PENDING", default=64, cast=int)
+# Recommendation event log: sink class, ring buffer size, flush batching
+AI_EVENT_SINK = config("AI_EVENT_SINK", default="ai_engine.events.MongoSink")
+AI_EVENT_COLLECTION = config("AI_EVENT_COLLECTION", default="events")
+AI_EVENT_BUFFER = config("AI_EVENT_BUFFER", default=10000, cast=int)
+AI_EVENT_BATCH = config("AI_EVENT_BATCH", default=500, cast=int)
+AI_EVENT_FLUSH_INTERVAL = config("AI_EVENT_FLUSH_INTERVAL", default=1.0, cast=float)
+# Scoring strategy (ai_engine.strategies): default, per-user bucket
+# percentages as JSON (e.g. {"hybrid": 10}) and sampled shadow runs
+AI_STRATEGY = config("AI_STRATEGY", default="precomputed")
+AI_STRATEGY_BUCKETS = config("AI_STRATEGY_BUCKETS", default="{}", cast=json.loads)
+AI_SHADOW_STRATEGY = config("AI_SHADOW_STRATEGY", default="")
+AI_SHADOW_SAMPLE = config("AI_SHADOW_SAMPLE", default=0.0, cast=float)
+AI_HYBRID_COPURCHASE_WEIGHT = config(
+    "AI_HYBRID_COPURCHASE_WEIGHT", default=0.3, cast=float
+)
+# Re-derive ProductSuitability from nutrition whenever NutritionFacts is saved
+AI_AUTO_SUITABILITY = config("AI_AUTO_SUITABILITY", default=True, cast=bool)
+
 # ─── Auth ────────────────────────────────────────────────────────────
 AUTH_USER_MODEL = "users.User"
 
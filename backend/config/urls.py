@@ -29,7 +29,15 @@ def api_root(request):
                 },
                 "ai": {
                     "recommend": "/api/ai/recommend/?condition=cardiovascular",
+                    "recommend_batch": "/api/ai/recommend/batch/",
+                    "recommend_for_me": "/api/ai/recommend/for-me/",
                     "compliance": "/api/ai/compliance/?product=1&condition=cardiovascular",
+                    "compliance_bulk": "/api/ai/compliance/bulk/",
+                    "optimize_basket": "/api/ai/optimize-basket/",
+                    "events": "/api/ai/events/",
+                    "strategy_metrics": "/api/ai/strategies/metrics/",
+                    "async_recommend": "/api/ai/async/recommend/?condition=cardiovascular",
+                    "async_compliance": "/api/ai/async/compliance/?product=1&condition=cardiovascular",
                 },
                 "dashboard": {
                     "stats": "/api/dashboard/stats/",
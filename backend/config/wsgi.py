@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# Memory-map the model artifacts as the worker starts
+from ai_engine.recommender import get_recommender_model  # noqa: E402
+from ai_engine.similarity import get_similarity_graph  # noqa: E402
+
+get_recommender_model()
+get_similarity_graph()
@@ -1,3 +1,4 @@
+from django.db import transaction
 from rest_framework import serializers
 from .models import Order, OrderItem
 
@@ -108,4 +109,10 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         order.total = total
         order.nutrition_summary = nutrition_summary
         order.save()
+
+        # Feed the co-purchase model once the order is committed
+        from ai_engine.copurchase import record_order
+
+        product_ids = [item["product_id"] for item in items_data]
+        transaction.on_commit(lambda: record_order(product_ids))
         return order
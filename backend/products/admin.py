@@ -5,6 +5,7 @@ from .models import (
     NutritionFacts,
     ProductSuitability,
     Ingredient,
+    GuidelineRule,
 )
 
 
@@ -23,10 +24,16 @@ class IngredientInline(admin.TabularInline):
     extra = 1
 
 
+class GuidelineRuleInline(admin.TabularInline):
+    model = GuidelineRule
+    extra = 1
+
+
 @admin.register(HealthCategory)
 class HealthCategoryAdmin(admin.ModelAdmin):
     list_display = ["name", "slug", "icon", "product_count"]
     prepopulated_fields = {"slug": ("name",)}
+    inlines = [GuidelineRuleInline]
 
     def product_count(self, obj):
         return obj.products.count()
@@ -0,0 +1,138 @@
+"""
+In-memory prefix index for search-box autocomplete.
+
+Product names, ingredient names and category names are normalized
+(lower-cased words) and inserted into a character trie from every word
+start, so "sal" and "salmon fil" both reach "Wild-Caught Salmon Fillet".
+Products are inserted best first (rating, then reviews), and each node
+keeps only the first MAX_SUGGESTIONS distinct products to reach it: a
+lookup walks len(prefix) nodes and returns a precomputed list, without
+touching the database.
+
+The index is built once per process and rebuilt lazily when the shared
+prefix-index version changes. products.signals bumps it after product,
+ingredient and category writes only; nutrition, suitability and
+guideline edits leave the index alone.
+"""
+
+import re
+import threading
+
+from ai_engine.cache import bump_version, get_version
+
+PREFIX_VERSION_KEY = "products:prefix_index_version"
+
+# Products kept per trie node (the largest limit a lookup can ask for)
+MAX_SUGGESTIONS = 10
+
+# Keys are indexed up to this many characters; longer prefixes are cut
+MAX_KEY_LENGTH = 24
+
+
+def normalize(text):
+    """Lower-cased words of `text` joined by single spaces."""
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+class _Node:
+    __slots__ = ("children", "products")
+
+    def __init__(self):
+        self.children = {}
+        self.products = []
+
+
+class PrefixIndex:
+    """Character trie mapping name prefixes to the best matching products."""
+
+    def __init__(self, products, texts, version=None):
+        """
+        Args:
+            products: (id, name, image) tuples, best first
+            texts: dict of product id -> extra searchable strings
+                (ingredient and category names)
+            version: staleness token (see get_prefix_index)
+        """
+        self.version = version
+        self.products = list(products)
+        self.root = _Node()
+        self.nodes = 1
+        for position, (product_id, name, _) in enumerate(self.products):
+            keys = set()
+            for text in [name, *texts.get(product_id, ())]:
+                text = normalize(text)
+                for match in re.finditer(r"\b\w", text):
+                    keys.add(text[match.start():match.start() + MAX_KEY_LENGTH])
+            for key in keys:
+                self._insert(key, position)
+
+    def _insert(self, key, position):
+        node = self.root
+        for char in key:
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = _Node()
+                self.nodes += 1
+            node = child
+            # Positions arrive in rank order, so the first distinct ones win
+            products = node.products
+            if len(products) < MAX_SUGGESTIONS and (
+                not products or products[-1] != position
+            ):
+                products.append(position)
+
+    def __len__(self):
+        return len(self.products)
+
+    def lookup(self, prefix, limit=MAX_SUGGESTIONS):
+        """(id, name, image) of the best products matching `prefix`."""
+        node = self.root
+        for char in normalize(prefix)[:MAX_KEY_LENGTH]:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        if node is self.root:
+            return []
+        return [self.products[position] for position in node.products[:limit]]
+
+
+def load_prefix_index(version=None):
+    """Build a PrefixIndex from the products, ingredients and categories."""
+    from .models import Ingredient, Product
+
+    products = Product.objects.order_by("-rating", "-reviews", "id").values_list(
+        "id", "name", "image"
+    )
+    texts = {}
+    for product_id, name in Ingredient.objects.values_list("product_id", "name"):
+        texts.setdefault(product_id, []).append(name)
+    for product_id, name in Product.categories.through.objects.values_list(
+        "product_id", "healthcategory__name"
+    ):
+        texts.setdefault(product_id, []).append(name)
+    return PrefixIndex(products, texts, version=version)
+
+
+_prefix_index = None
+_prefix_lock = threading.Lock()
+
+
+def get_prefix_index():
+    """Return the process-wide PrefixIndex, rebuilding it if stale."""
+    global _prefix_index
+    version = get_version(PREFIX_VERSION_KEY)
+    index = _prefix_index
+    if index is not None and index.version == version:
+        return index
+
+    with _prefix_lock:
+        index = _prefix_index
+        if index is None or index.version != version:
+            index = load_prefix_index(version)
+            _prefix_index = index
+    return index
+
+
+def invalidate_prefix_index():
+    """Mark every worker's PrefixIndex stale; rebuilt on next lookup."""
+    bump_version(PREFIX_VERSION_KEY)
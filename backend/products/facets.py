@@ -0,0 +1,109 @@
+"""
+Facet counts for the product list.
+
+Every requested facet value becomes one conditional aggregate
+(COUNT(...) FILTER (WHERE ...) on PostgreSQL, CASE WHEN on SQLite), so
+all counts for the current filter set come back from a single query.
+The category list the category facet expands to is kept per worker
+until the catalog version moves (HealthCategory edits bump it).
+"""
+
+from django.db.models import Count, Q
+
+from ai_engine.cache import get_catalog_version
+
+FACETS = ("category", "price", "in_stock", "rating")
+
+# Price buckets as (label, lower bound, upper bound); None is open-ended
+PRICE_BUCKETS = (
+    ("0-5", 0, 5),
+    ("5-10", 5, 10),
+    ("10-20", 10, 20),
+    ("20-50", 20, 50),
+    ("50+", 50, None),
+)
+
+# Rating bands are cumulative, like the rating__gte filter
+RATING_BANDS = (("4.5+", 4.5), ("4+", 4), ("3+", 3))
+
+
+# (catalog version, ((category id, slug), ...))
+_categories = (None, ())
+
+
+def category_slugs():
+    """(id, slug) of every HealthCategory, cached per catalog version."""
+    global _categories
+    from .models import HealthCategory
+
+    version = get_catalog_version()
+    cached_version, categories = _categories
+    if cached_version != version:
+        categories = tuple(HealthCategory.objects.values_list("id", "slug"))
+        _categories = (version, categories)
+    return categories
+
+
+def parse_facets(value):
+    """
+    Normalize a facets= value.
+
+    Returns:
+        (sorted tuple of facet names, error message or None)
+    """
+    names = tuple(sorted({n.strip() for n in value.split(",") if n.strip()}))
+    unknown = [n for n in names if n not in FACETS]
+    if unknown:
+        return names, f"Unknown facets: {', '.join(unknown)}. Use: {', '.join(FACETS)}"
+    return names, None
+
+
+def facet_counts(queryset, facets):
+    """
+    Count the products of `queryset` per value of each facet.
+
+    Args:
+        queryset: filtered Product queryset (joins and ordering allowed)
+        facets: names from FACETS
+
+    Returns:
+        {facet: {value: count}}; category values are slugs
+    """
+    from .models import Product
+
+    # Aggregate over the matching ids so filter joins (e.g. on a category
+    # slug) cannot narrow the category counts
+    products = Product.objects.filter(id__in=queryset.values("id"))
+    # The category join repeats product rows: count each product once
+    distinct = "category" in facets
+
+    aggregates = {}
+    labels = {}
+
+    def add(facet, label, condition):
+        alias = f"f{len(aggregates)}"
+        aggregates[alias] = Count("id", filter=condition, distinct=distinct)
+        labels[alias] = (facet, label)
+
+    if "category" in facets:
+        for category_id, slug in category_slugs():
+            add("category", slug, Q(categories__id=category_id))
+    if "price" in facets:
+        for label, low, high in PRICE_BUCKETS:
+            condition = Q(price__gte=low)
+            if high is not None:
+                condition &= Q(price__lt=high)
+            add("price", label, condition)
+    if "in_stock" in facets:
+        add("in_stock", "true", Q(in_stock=True))
+        add("in_stock", "false", Q(in_stock=False))
+    if "rating" in facets:
+        for label, low in RATING_BANDS:
+            add("rating", label, Q(rating__gte=low))
+
+    counts = {facet: {} for facet in facets}
+    if aggregates:
+        for alias, count in products.aggregate(**aggregates).items():
+            facet, label = labels[alias]
+            counts[facet][label] = count
+    return counts
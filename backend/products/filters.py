@@ -0,0 +1,52 @@
+from django_filters import rest_framework as filters
+from .models import Product
+
+
+def _at_least(field):
+    return filters.NumberFilter(field_name=field, lookup_expr="gte")
+
+
+def _at_most(field):
+    return filters.NumberFilter(field_name=field, lookup_expr="lte")
+
+
+class ProductFilter(filters.FilterSet):
+    """
+    Product list filters, including per-serving nutrient and suitability
+    score ranges (e.g. ?sodium__lte=140&fiber__gte=3&diabetes__gte=70).
+
+    The nutrient and score columns carry database indexes (migration
+    0004), so a range filter can drive the join from the index instead
+    of scanning every NutritionFacts / ProductSuitability row.
+    """
+
+    calories__gte = _at_least("nutrition__calories")
+    calories__lte = _at_most("nutrition__calories")
+    saturated_fat__gte = _at_least("nutrition__saturated_fat")
+    saturated_fat__lte = _at_most("nutrition__saturated_fat")
+    sodium__gte = _at_least("nutrition__sodium")
+    sodium__lte = _at_most("nutrition__sodium")
+    sugars__gte = _at_least("nutrition__sugars")
+    sugars__lte = _at_most("nutrition__sugars")
+    fiber__gte = _at_least("nutrition__fiber")
+    fiber__lte = _at_most("nutrition__fiber")
+    protein__gte = _at_least("nutrition__protein")
+    protein__lte = _at_most("nutrition__protein")
+    potassium__gte = _at_least("nutrition__potassium")
+    potassium__lte = _at_most("nutrition__potassium")
+
+    cardiovascular__gte = _at_least("suitability__cardiovascular")
+    cardiovascular__lte = _at_most("suitability__cardiovascular")
+    diabetes__gte = _at_least("suitability__diabetes")
+    diabetes__lte = _at_most("suitability__diabetes")
+    hypertension__gte = _at_least("suitability__hypertension")
+    hypertension__lte = _at_most("suitability__hypertension")
+
+    class Meta:
+        model = Product
+        fields = {
+            "categories__slug": ["exact"],
+            "in_stock": ["exact"],
+            "price": ["gte", "lte"],
+            "rating": ["gte"],
+        }
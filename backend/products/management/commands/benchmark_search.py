@@ -0,0 +1,157 @@
+"""
+Benchmark the full-text product search against the icontains path.
+
+For each catalog size, synthetic products with names, descriptions and
+ingredients are inserted (inside a transaction that is rolled back) and
+indexed, then a fixed mix of common, rare and partial-word queries is
+timed through both search_product_ids() and legacy_search(). The report
+also gives the share of icontains matches the index returns, per query.
+
+Usage:
+    python manage.py benchmark_search --sizes 1000,10000,100000
+    python manage.py benchmark_search --output search.json
+"""
+
+import json
+import platform
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from ai_engine.benchmark import measure
+from products.models import Ingredient, Product
+from products.search import (
+    legacy_search,
+    rebuild_search_index,
+    search_backend,
+    search_product_ids,
+    update_search_index,
+)
+
+WORDS = [
+    "salmon", "quinoa", "lentil", "oat", "almond", "spinach", "kale",
+    "chickpea", "barley", "walnut", "blueberry", "avocado", "tofu",
+    "turkey", "brown rice", "sweet potato", "broccoli", "flaxseed",
+    "yogurt", "mackerel", "pumpkin seed", "buckwheat", "tomato", "garlic",
+    "olive oil", "peanut", "sesame", "shrimp", "cod", "millet",
+]
+
+STYLES = ["grilled", "baked", "roasted", "steamed", "crunchy", "organic", "smoked"]
+
+DISHES = ["bowl", "salad", "wrap", "bar", "soup", "fillet", "crackers", "granola"]
+
+# Common word, rare word, multi-word phrase, partial word (keystrokes)
+QUERIES = ["salmon", "millet", "olive oil", "brown rice", "quin", "chick"]
+
+
+class Rollback(Exception):
+    """Raised to discard the synthetic catalog after timing."""
+
+
+class Command(BaseCommand):
+    help = "Benchmark indexed product search against the icontains path"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1000,10000,100000")
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the JSON report here")
+
+    def handle(self, *args, **options):
+        report = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "database": connection.vendor,
+            "backend": search_backend(),
+            "repeat": options["repeat"],
+            "seed": options["seed"],
+            "results": [],
+        }
+        for size in [int(s) for s in options["sizes"].split(",")]:
+            report["results"].append(
+                self.run(size, options["repeat"], options["seed"])
+            )
+            self.stderr.write(f"{size} products done")
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+            self.stderr.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def run(self, size, repeat, seed):
+        result = {"products": size, "queries": {}}
+        try:
+            with transaction.atomic():
+                product_ids = _create_catalog(size, seed)
+                started = time.perf_counter()
+                rebuild_search_index()
+                result["index_build_s"] = round(time.perf_counter() - started, 3)
+
+                picks = iter(np.random.default_rng(seed).choice(
+                    product_ids, repeat
+                ).tolist())
+                result["reindex_one"] = measure(
+                    lambda: update_search_index([next(picks)]), repeat
+                )
+
+                for query in QUERIES:
+                    legacy = set(legacy_search(
+                        Product.objects.all(), query
+                    ).values_list("id", flat=True))
+                    indexed = search_product_ids(query)
+                    result["queries"][query] = {
+                        "matches": len(legacy),
+                        "recall": (
+                            round(len(legacy & set(indexed)) / len(legacy), 3)
+                            if indexed is not None and legacy else None
+                        ),
+                        "icontains": measure(
+                            lambda: list(legacy_search(
+                                Product.objects.all(), query
+                            ).values_list("id", flat=True)),
+                            repeat,
+                        ),
+                        "indexed": measure(
+                            lambda: search_product_ids(query), repeat
+                        ),
+                    }
+                raise Rollback
+        except Rollback:
+            pass
+        return result
+
+
+def _create_catalog(size, seed, batch_size=5000):
+    """Products with generated names, descriptions and 3-6 ingredients."""
+    rng = np.random.default_rng(seed)
+    tag = f"search-bench-{seed}-{time.time_ns()}"
+    product_ids = []
+    for start in range(0, size, batch_size):
+        products = []
+        ingredients = []
+        for i in range(start, min(start + batch_size, size)):
+            words = rng.choice(WORDS, rng.integers(3, 7), replace=False).tolist()
+            name = (
+                f"{rng.choice(STYLES)} {words[0]} {rng.choice(DISHES)} {i}"
+            ).capitalize()
+            products.append(Product(
+                name=name,
+                slug=f"{tag}-{i}",
+                price=9.99,
+                image="",
+                description=f"{name} made with {', '.join(words[1:])}.",
+            ))
+            ingredients.append(words)
+        products = Product.objects.bulk_create(products)
+        Ingredient.objects.bulk_create([
+            Ingredient(product=product, name=word)
+            for product, words in zip(products, ingredients)
+            for word in words
+        ])
+        product_ids.extend(product.id for product in products)
+    return product_ids
@@ -9,6 +9,7 @@ from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 from products.models import (
     HealthCategory,
+    GuidelineRule,
     Product,
     NutritionFacts,
     ProductSuitability,
@@ -77,6 +78,37 @@ CATEGORIES = [
     },
 ]
 
+# Dietary guideline rules per category slug, written as GuidelineRule rows:
+# (nutrient, operator, threshold, pass message, issue message)
+GUIDELINE_RULES = {
+    "cardiovascular": [
+        ("saturated_fat", "lt", 2, "Low saturated fat ✓",
+         "Saturated fat too high ({value}g, max 2g)"),
+        ("sodium", "lt", 400, "Low sodium ✓",
+         "Sodium too high ({value}mg, max 400mg)"),
+        ("fiber", "gte", 3, "High fiber ✓",
+         "Fiber too low ({value}g, min 3g)"),
+        ("trans_fat", "eq", 0, "No trans fats ✓",
+         "Contains trans fats ({value}g)"),
+    ],
+    "diabetes": [
+        ("sugars", "lt", 5, "Low added sugars ✓",
+         "Sugar too high ({value}g, max 5g)"),
+        ("fiber", "gte", 3, "High fiber ✓",
+         "Fiber too low ({value}g, min 3g)"),
+        ("total_carbs", "lte", 45, "Moderate carbohydrates ✓",
+         "Carbs too high ({value}g, max 45g)"),
+    ],
+    "hypertension": [
+        ("sodium", "lt", 200, "Very low sodium ✓",
+         "Sodium too high ({value}mg, max 200mg)"),
+        ("potassium", "gte", 300, "Rich in potassium ✓",
+         "Low potassium ({value}mg, min 300mg)"),
+        ("saturated_fat", "lt", 2, "Low saturated fat ✓",
+         "Saturated fat too high ({value}g, max 2g)"),
+    ],
+}
+
 PRODUCTS = [
     {
         "name": "Wild-Caught Salmon Fillet",
@@ -505,6 +537,21 @@ class Command(BaseCommand):
             status = "created" if created else "updated"
             self.stdout.write(f"    {cat.icon} {cat.name} — {status}")
 
+            # Guideline rules (clear old, add new)
+            cat.rules.all().delete()
+            for order, (nutrient, operator, threshold, message, issue) in (
+                enumerate(GUIDELINE_RULES.get(cat.slug, []))
+            ):
+                GuidelineRule.objects.create(
+                    category=cat,
+                    nutrient=nutrient,
+                    operator=operator,
+                    threshold=threshold,
+                    message=message,
+                    issue_message=issue,
+                    order=order,
+                )
+
         # ── Products ──
         self.stdout.write("  Creating products...")
         for prod_data in PRODUCTS:
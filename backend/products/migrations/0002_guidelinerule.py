@@ -0,0 +1,30 @@
+# Generated by Django 5.1.15 on 2026-10-18 08:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GuidelineRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nutrient', models.CharField(choices=[('calories', 'Calories'), ('total_fat', 'Total fat (g)'), ('saturated_fat', 'Saturated fat (g)'), ('trans_fat', 'Trans fat (g)'), ('cholesterol', 'Cholesterol (mg)'), ('sodium', 'Sodium (mg)'), ('total_carbs', 'Total carbohydrates (g)'), ('fiber', 'Fiber (g)'), ('sugars', 'Sugars (g)'), ('protein', 'Protein (g)'), ('potassium', 'Potassium (mg)')], max_length=20)),
+                ('operator', models.CharField(choices=[('lt', '<'), ('lte', '≤'), ('gt', '>'), ('gte', '≥'), ('eq', '=')], max_length=3)),
+                ('threshold', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('message', models.CharField(help_text='Shown when the product passes', max_length=200)),
+                ('issue_message', models.CharField(help_text='Shown when the product fails; {value} is its amount', max_length=200)),
+                ('order', models.PositiveIntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rules', to='products.healthcategory')),
+            ],
+            options={
+                'ordering': ['category', 'order', 'id'],
+            },
+        ),
+    ]
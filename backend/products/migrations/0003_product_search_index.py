@@ -0,0 +1,85 @@
+from django.db import OperationalError, migrations, transaction
+
+
+# PostgreSQL: tsvector column with a GIN index, trigram index on name
+POSTGRESQL_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "ALTER TABLE products_product ADD COLUMN search_vector tsvector",
+    """
+    UPDATE products_product p SET search_vector =
+        setweight(to_tsvector('english', coalesce(p.name, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(p.description, '')), 'B')
+        || setweight(to_tsvector('english', coalesce((
+            SELECT string_agg(i.name, ' ') FROM products_ingredient i
+            WHERE i.product_id = p.id
+        ), '')), 'C')
+    """,
+    "CREATE INDEX products_product_search_gin"
+    " ON products_product USING gin (search_vector)",
+    "CREATE INDEX products_product_name_trgm"
+    " ON products_product USING gin (name gin_trgm_ops)",
+]
+
+POSTGRESQL_BACKWARD = [
+    "DROP INDEX IF EXISTS products_product_name_trgm",
+    "DROP INDEX IF EXISTS products_product_search_gin",
+    "ALTER TABLE products_product DROP COLUMN IF EXISTS search_vector",
+]
+
+# SQLite: FTS5 table keyed by product id (rowid)
+SQLITE_CREATE_FTS = """
+    CREATE VIRTUAL TABLE products_product_fts USING fts5(
+        name, description, ingredients, tokenize = 'trigram'
+    )
+"""
+
+SQLITE_FORWARD = [
+    """
+    INSERT INTO products_product_fts (rowid, name, description, ingredients)
+    SELECT p.id, p.name, p.description, (
+        SELECT group_concat(i.name, char(10)) FROM products_ingredient i
+        WHERE i.product_id = p.id
+    )
+    FROM products_product p
+    """,
+]
+
+SQLITE_BACKWARD = ["DROP TABLE IF EXISTS products_product_fts"]
+
+
+def _create_fts(schema_editor):
+    """
+    Create the FTS5 table, or return False when this SQLite build lacks
+    FTS5 or its trigram tokenizer (3.34+); search then keeps icontains.
+    """
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute(SQLITE_CREATE_FTS)
+    except OperationalError:
+        return False
+    return True
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        statements = statements_by_vendor.get(vendor, [])
+        if statements is SQLITE_FORWARD and not _create_fts(schema_editor):
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0002_guidelinerule"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({"postgresql": POSTGRESQL_FORWARD, "sqlite": SQLITE_FORWARD}),
+            _run({"postgresql": POSTGRESQL_BACKWARD, "sqlite": SQLITE_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.1.15 on 2026-10-18 09:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='nutritionfacts',
+            name='calories',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AlterField(
+            model_name='nutritionfacts',
+            name='fiber',
+            field=models.DecimalField(db_index=True, decimal_places=1, default=0, max_digits=6),
+        ),
+        migrations.AlterField(
+            model_name='nutritionfacts',
+            name='potassium',
+            field=models.PositiveIntegerField(db_index=True, default=0, help_text='mg'),
+        ),
+        migrations.AlterField(
+            model_name='nutritionfacts',
+            name='protein',
+            field=models.DecimalField(db_index=True, decimal_places=1, default=0, max_digits=6),
+        ),
+        migrations.AlterField(
+            model_name='nutritionfacts',
+            name='saturated_fat',
+            field=models.DecimalField(db_index=True, decimal_places=1, default=0, max_digits=6),
+        ),
+        migrations.AlterField(
+            model_name='nutritionfacts',
+            name='sodium',
+            field=models.PositiveIntegerField(db_index=True, default=0, help_text='mg'),
+        ),
+        migrations.AlterField(
+            model_name='nutritionfacts',
+            name='sugars',
+            field=models.DecimalField(db_index=True, decimal_places=1, default=0, max_digits=6),
+        ),
+        migrations.AlterField(
+            model_name='productsuitability',
+            name='cardiovascular',
+            field=models.PositiveIntegerField(db_index=True, default=0, help_text='0–100 suitability score'),
+        ),
+        migrations.AlterField(
+            model_name='productsuitability',
+            name='diabetes',
+            field=models.PositiveIntegerField(db_index=True, default=0, help_text='0–100 suitability score'),
+        ),
+        migrations.AlterField(
+            model_name='productsuitability',
+            name='hypertension',
+            field=models.PositiveIntegerField(db_index=True, default=0, help_text='0–100 suitability score'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+import django.contrib.postgres.search
+import products.search
+from django.db import migrations
+
+
+# Migration 0003 created search_vector and both GIN indexes on PostgreSQL
+# with raw SQL; this declares them in the model state. Other databases
+# get the (always NULL) column and plain indexes under the same names.
+
+def add_columns(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        return
+    Product = apps.get_model("products", "Product")
+    schema_editor.add_field(Product, Product._meta.get_field("search_vector"))
+    for index in Product._meta.indexes:
+        schema_editor.add_index(Product, index)
+
+
+def remove_columns(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        return
+    Product = apps.get_model("products", "Product")
+    for index in Product._meta.indexes:
+        schema_editor.remove_index(Product, index)
+    schema_editor.remove_field(Product, Product._meta.get_field("search_vector"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0004_nutrient_range_indexes"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddField(
+                    model_name="product",
+                    name="search_vector",
+                    field=django.contrib.postgres.search.SearchVectorField(
+                        editable=False, null=True, serialize=False
+                    ),
+                ),
+                migrations.AlterModelOptions(
+                    name="product",
+                    options={"base_manager_name": "objects", "ordering": ["-rating"]},
+                ),
+                migrations.AddIndex(
+                    model_name="product",
+                    index=products.search.PostgresGinIndex(
+                        fields=["search_vector"], name="products_product_search_gin"
+                    ),
+                ),
+                migrations.AddIndex(
+                    model_name="product",
+                    index=products.search.PostgresGinIndex(
+                        fields=["name"], name="products_product_name_trgm",
+                        opclasses=["gin_trgm_ops"],
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(add_columns, remove_columns),
+    ]
@@ -1,5 +1,11 @@
+from decimal import Decimal
+
+from django.contrib.postgres.search import SearchVectorField
+from django.core.exceptions import ValidationError
 from django.db import models
 
+from .search import PostgresGinIndex
+
 
 class HealthCategory(models.Model):
     """Health condition category (cardiovascular, diabetes, hypertension)."""
@@ -28,6 +34,75 @@ class HealthCategory(models.Model):
         return self.name
 
 
+class GuidelineRule(models.Model):
+    """Machine-checkable dietary guideline threshold for a health category."""
+
+    NUTRIENT_CHOICES = [
+        ("calories", "Calories"),
+        ("total_fat", "Total fat (g)"),
+        ("saturated_fat", "Saturated fat (g)"),
+        ("trans_fat", "Trans fat (g)"),
+        ("cholesterol", "Cholesterol (mg)"),
+        ("sodium", "Sodium (mg)"),
+        ("total_carbs", "Total carbohydrates (g)"),
+        ("fiber", "Fiber (g)"),
+        ("sugars", "Sugars (g)"),
+        ("protein", "Protein (g)"),
+        ("potassium", "Potassium (mg)"),
+    ]
+
+    OPERATOR_CHOICES = [
+        ("lt", "<"),
+        ("lte", "≤"),
+        ("gt", ">"),
+        ("gte", "≥"),
+        ("eq", "="),
+    ]
+
+    category = models.ForeignKey(
+        HealthCategory, on_delete=models.CASCADE, related_name="rules"
+    )
+    nutrient = models.CharField(max_length=20, choices=NUTRIENT_CHOICES)
+    operator = models.CharField(max_length=3, choices=OPERATOR_CHOICES)
+    threshold = models.DecimalField(max_digits=8, decimal_places=2)
+    message = models.CharField(
+        max_length=200, help_text="Shown when the product passes"
+    )
+    issue_message = models.CharField(
+        max_length=200,
+        help_text="Shown when the product fails; {value} is its amount",
+    )
+    order = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["category", "order", "id"]
+
+    def clean(self):
+        # Amounts are integers (sodium, potassium) or decimals (the rest)
+        for value in (1, Decimal("1.5")):
+            try:
+                self.issue_message.format(value=value)
+            except (AttributeError, IndexError, KeyError, ValueError) as e:
+                raise ValidationError({
+                    "issue_message": (
+                        f"Invalid template ({e}); use {{value}} for the amount"
+                    ),
+                })
+
+    def __str__(self):
+        return (
+            f"{self.category.slug}: {self.nutrient} "
+            f"{self.get_operator_display()} {self.threshold}"
+        )
+
+
+class ProductManager(models.Manager):
+    """Leaves search_vector unloaded, so saves never overwrite it."""
+
+    def get_queryset(self):
+        return super().get_queryset().defer("search_vector")
+
+
 class Product(models.Model):
     """Health-compliant food product."""
 
@@ -53,9 +128,23 @@ class Product(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Written by products.search (PostgreSQL only; always NULL on SQLite)
+    search_vector = SearchVectorField(null=True, editable=False, serialize=False)
+
+    objects = ProductManager()
 
     class Meta:
         ordering = ["-rating"]
+        base_manager_name = "objects"
+        indexes = [
+            PostgresGinIndex(
+                fields=["search_vector"], name="products_product_search_gin"
+            ),
+            PostgresGinIndex(
+                fields=["name"], name="products_product_name_trgm",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -68,21 +157,31 @@ class NutritionFacts(models.Model):
         Product, on_delete=models.CASCADE, related_name="nutrition"
     )
     serving_size = models.CharField(max_length=50)
-    calories = models.PositiveIntegerField(default=0)
+    calories = models.PositiveIntegerField(default=0, db_index=True)
     total_fat = models.DecimalField(max_digits=6, decimal_places=1, default=0)
     saturated_fat = models.DecimalField(
-        max_digits=6, decimal_places=1, default=0
+        max_digits=6, decimal_places=1, default=0, db_index=True
     )
     trans_fat = models.DecimalField(max_digits=6, decimal_places=1, default=0)
     cholesterol = models.PositiveIntegerField(default=0, help_text="mg")
-    sodium = models.PositiveIntegerField(default=0, help_text="mg")
+    sodium = models.PositiveIntegerField(
+        default=0, help_text="mg", db_index=True
+    )
     total_carbs = models.DecimalField(
         max_digits=6, decimal_places=1, default=0
     )
-    fiber = models.DecimalField(max_digits=6, decimal_places=1, default=0)
-    sugars = models.DecimalField(max_digits=6, decimal_places=1, default=0)
-    protein = models.DecimalField(max_digits=6, decimal_places=1, default=0)
-    potassium = models.PositiveIntegerField(default=0, help_text="mg")
+    fiber = models.DecimalField(
+        max_digits=6, decimal_places=1, default=0, db_index=True
+    )
+    sugars = models.DecimalField(
+        max_digits=6, decimal_places=1, default=0, db_index=True
+    )
+    protein = models.DecimalField(
+        max_digits=6, decimal_places=1, default=0, db_index=True
+    )
+    potassium = models.PositiveIntegerField(
+        default=0, help_text="mg", db_index=True
+    )
 
     class Meta:
         verbose_name = "Nutrition Facts"
@@ -99,13 +198,13 @@ class ProductSuitability(models.Model):
         Product, on_delete=models.CASCADE, related_name="suitability"
     )
     cardiovascular = models.PositiveIntegerField(
-        default=0, help_text="0–100 suitability score"
+        default=0, help_text="0–100 suitability score", db_index=True
     )
     diabetes = models.PositiveIntegerField(
-        default=0, help_text="0–100 suitability score"
+        default=0, help_text="0–100 suitability score", db_index=True
     )
     hypertension = models.PositiveIntegerField(
-        default=0, help_text="0–100 suitability score"
+        default=0, help_text="0–100 suitability score", db_index=True
     )
 
     class Meta:
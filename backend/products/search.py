@@ -0,0 +1,215 @@
+"""
+Full-text product search.
+
+PostgreSQL keeps a tsvector column, products_product.search_vector
+(name weighted A, description B, ingredient names C), behind a GIN
+index, plus a pg_trgm GIN index on name for typo-tolerant matches.
+Every query term is matched as a prefix, and results are ordered by
+ts_rank plus trigram word similarity.
+
+SQLite keeps an FTS5 table (products_product_fts, trigram tokenizer)
+whose rowid is the product id. A query matches as a case-insensitive
+substring of the name, description or an ingredient name, like the
+icontains filter it replaces, and results are ordered by bm25.
+
+Both are created and backfilled by migration 0003 and kept in sync by
+products.signals. Bulk writes send no signals; run
+rebuild_search_index() after them. SQLite builds without FTS5 or its
+trigram tokenizer (before 3.34) skip the table and keep icontains.
+
+Product declares search_vector and both GIN indexes so the ORM and
+makemigrations know about them; Product.objects defers the column so
+saves never overwrite it.
+"""
+
+import re
+
+from django.contrib.postgres.indexes import GinIndex
+from django.db import connection
+from django.db.models import Index
+
+FTS_TABLE = "products_product_fts"
+
+# bm25 weights of the FTS5 columns: name, description, ingredients
+FTS_WEIGHTS = (10.0, 4.0, 1.0)
+
+# The trigram tokenizer cannot match anything shorter
+MIN_FTS_QUERY = 3
+
+# Ids per statement when re-indexing
+BATCH_SIZE = 500
+
+_PG_DOCUMENT = """
+    setweight(to_tsvector('english', coalesce(p.name, '')), 'A')
+    || setweight(to_tsvector('english', coalesce(p.description, '')), 'B')
+    || setweight(to_tsvector('english', coalesce((
+        SELECT string_agg(i.name, ' ') FROM products_ingredient i
+        WHERE i.product_id = p.id
+    ), '')), 'C')
+"""
+
+_FTS_INSERT = f"""
+    INSERT INTO {FTS_TABLE} (rowid, name, description, ingredients)
+    SELECT p.id, p.name, p.description, (
+        SELECT group_concat(i.name, char(10)) FROM products_ingredient i
+        WHERE i.product_id = p.id
+    )
+    FROM products_product p
+"""
+
+_fts_available = None
+
+
+class PostgresGinIndex(GinIndex):
+    """
+    GinIndex on PostgreSQL, a plain index (without opclasses) elsewhere.
+
+    The SQLite development database keeps the same index names as the
+    migration state, so later migrations can rebuild or drop them.
+    """
+
+    def create_sql(self, model, schema_editor, using="", **kwargs):
+        if schema_editor.connection.vendor == "postgresql":
+            return super().create_sql(model, schema_editor, using, **kwargs)
+        return Index(fields=self.fields, name=self.name).create_sql(
+            model, schema_editor, **kwargs
+        )
+
+
+def search_backend():
+    """'postgresql', 'fts5', or None when only the icontains path works."""
+    global _fts_available
+    if connection.vendor == "postgresql":
+        return "postgresql"
+    if connection.vendor == "sqlite":
+        if _fts_available is None:
+            with connection.cursor() as cursor:
+                _fts_available = (
+                    FTS_TABLE in connection.introspection.table_names(cursor)
+                )
+        return "fts5" if _fts_available else None
+    return None
+
+
+def legacy_search(queryset, query):
+    """The unindexed icontains search across name, description, ingredients."""
+    from django.db.models import Q
+
+    return queryset.filter(
+        Q(name__icontains=query)
+        | Q(description__icontains=query)
+        | Q(ingredients__name__icontains=query)
+    ).distinct()
+
+
+def search_product_ids(query, limit=None):
+    """
+    Ids of the products matching `query`, most relevant first.
+
+    Returns:
+        List of product ids, or None when the index cannot serve the
+        query (no index on this database, or a query too short for the
+        SQLite trigram tokenizer); callers then use legacy_search()
+    """
+    backend = search_backend()
+    if backend == "postgresql":
+        return _search_postgresql(query, limit)
+    if backend == "fts5" and len(query.strip()) >= MIN_FTS_QUERY:
+        return _search_fts5(query.strip(), limit)
+    return None
+
+
+def _search_postgresql(query, limit):
+    if not re.search(r"\w", query):
+        return []
+    # Prefix-match every lexeme the document parser makes of the query,
+    # so e.g. "omega-3" becomes 'omega':* & '-3':* like in the vectors
+    sql = """
+        SELECT p.id FROM products_product p, (
+            SELECT to_tsquery('simple', coalesce(string_agg(
+                quote_literal(lexeme) || ':*', ' & '
+            ), '')) AS q
+            FROM unnest(to_tsvector('english', %s))
+        ) t
+        WHERE p.search_vector @@ t.q OR %s <%% p.name
+        ORDER BY coalesce(ts_rank(p.search_vector, t.q), 0)
+            + word_similarity(%s, p.name) DESC, p.id
+    """
+    params = [query, query, query]
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _search_fts5(query, limit):
+    # One quoted phrase: a substring match, like icontains
+    phrase = '"' + query.replace('"', '""') + '"'
+    weights = ", ".join(str(w) for w in FTS_WEIGHTS)
+    sql = f"""
+        SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s
+        ORDER BY bm25({FTS_TABLE}, {weights}), rowid
+    """
+    params = [phrase]
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def update_search_index(product_ids):
+    """Re-index products after they or their ingredients changed."""
+    product_ids = list(product_ids)
+    backend = search_backend()
+    if backend is None or not product_ids:
+        return
+    with connection.cursor() as cursor:
+        for start in range(0, len(product_ids), BATCH_SIZE):
+            batch = product_ids[start:start + BATCH_SIZE]
+            placeholders = ", ".join(["%s"] * len(batch))
+            if backend == "postgresql":
+                cursor.execute(
+                    f"UPDATE products_product p SET search_vector = {_PG_DOCUMENT}"
+                    f" WHERE p.id IN ({placeholders})",
+                    batch,
+                )
+            else:
+                cursor.execute(
+                    f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})",
+                    batch,
+                )
+                cursor.execute(
+                    f"{_FTS_INSERT} WHERE p.id IN ({placeholders})", batch
+                )
+
+
+def remove_from_search_index(product_ids):
+    """Drop deleted products (PostgreSQL rows take their vector with them)."""
+    product_ids = list(product_ids)
+    if search_backend() != "fts5" or not product_ids:
+        return
+    with connection.cursor() as cursor:
+        for start in range(0, len(product_ids), BATCH_SIZE):
+            batch = product_ids[start:start + BATCH_SIZE]
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid IN"
+                f" ({', '.join(['%s'] * len(batch))})",
+                batch,
+            )
+
+
+def rebuild_search_index():
+    """Re-index the whole catalog."""
+    backend = search_backend()
+    with connection.cursor() as cursor:
+        if backend == "postgresql":
+            cursor.execute(
+                f"UPDATE products_product p SET search_vector = {_PG_DOCUMENT}"
+            )
+        elif backend == "fts5":
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(_FTS_INSERT)
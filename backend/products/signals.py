@@ -0,0 +1,38 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from .autocomplete import invalidate_prefix_index
+from .models import HealthCategory, Ingredient, Product
+from .search import remove_from_search_index, update_search_index
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    """Re-index the product's search document once the write is committed."""
+    transaction.on_commit(lambda: update_search_index([instance.pk]))
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    """Drop the product from the search index once the delete is committed."""
+    product_id = instance.pk
+    transaction.on_commit(lambda: remove_from_search_index([product_id]))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    """Re-index the ingredient's product once the write is committed."""
+    transaction.on_commit(lambda: update_search_index([instance.product_id]))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(m2m_changed, sender=Product.categories.through)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=HealthCategory)
+@receiver(post_delete, sender=HealthCategory)
+def autocomplete_changed(sender, **kwargs):
+    """Rebuild the autocomplete index once the write is committed."""
+    transaction.on_commit(invalidate_prefix_index)
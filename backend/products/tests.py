@@ -1,3 +1,415 @@
+from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
 
-# Create your tests here.
+from ai_engine.cache import bump_catalog_version
+from ai_engine.guidelines import invalidate_rule_set
+from ai_engine.recommender import check_compliance
+
+from .autocomplete import (
+    MAX_SUGGESTIONS,
+    PrefixIndex,
+    get_prefix_index,
+    invalidate_prefix_index,
+    normalize,
+)
+from .facets import PRICE_BUCKETS, RATING_BANDS, facet_counts, parse_facets
+from .filters import ProductFilter
+from .models import (
+    GuidelineRule,
+    HealthCategory,
+    Ingredient,
+    NutritionFacts,
+    Product,
+    ProductSuitability,
+)
+from .search import (
+    legacy_search,
+    rebuild_search_index,
+    search_backend,
+    search_product_ids,
+)
+
+
+def _column_index(model, column):
+    """Name of the single-column index on `model`.`column`."""
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(
+            cursor, model._meta.db_table
+        )
+    for name, info in constraints.items():
+        if info["index"] and not info["primary_key"] and info["columns"] == [column]:
+            return name
+    raise AssertionError(f"No index on {model._meta.db_table}.{column}")
+
+
+class NutrientRangeFilterPlanTests(TestCase):
+    """The nutrient and suitability range filters are served by indexes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(20):
+            product = Product.objects.create(
+                name=f"Product {i}", slug=f"product-{i}", price=5,
+                image="", description="",
+            )
+            NutritionFacts.objects.create(
+                product=product, serving_size="100g", calories=50 * i,
+                saturated_fat=i / 4, sodium=25 * i, sugars=i / 2,
+                fiber=i / 3, protein=i, potassium=40 * i,
+            )
+            ProductSuitability.objects.create(
+                product=product, cardiovascular=5 * i, diabetes=100 - 5 * i,
+                hypertension=3 * i,
+            )
+
+    def setUp(self):
+        if connection.vendor == "postgresql":
+            # A 20-row table is cheaper to scan; make the planner show
+            # whether an index could serve the filter at all
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertFilterUsesIndex(self, params, model, column):
+        queryset = ProductFilter(params, queryset=Product.objects.all()).qs
+        plan = queryset.explain()
+        self.assertIn(_column_index(model, column), plan)
+
+    def test_nutrient_filters_use_indexes(self):
+        cases = [
+            ({"calories__lte": "100"}, "calories"),
+            ({"saturated_fat__lte": "1"}, "saturated_fat"),
+            ({"sodium__lte": "140"}, "sodium"),
+            ({"sugars__lte": "2"}, "sugars"),
+            ({"fiber__gte": "5"}, "fiber"),
+            ({"protein__gte": "15"}, "protein"),
+            ({"potassium__gte": "600"}, "potassium"),
+        ]
+        for params, column in cases:
+            with self.subTest(column=column):
+                self.assertFilterUsesIndex(params, NutritionFacts, column)
+
+    def test_suitability_filters_use_indexes(self):
+        for column in ("cardiovascular", "diabetes", "hypertension"):
+            with self.subTest(column=column):
+                self.assertFilterUsesIndex(
+                    {f"{column}__gte": "90"}, ProductSuitability, column
+                )
+
+    def test_filters_narrow_results(self):
+        queryset = ProductFilter(
+            {"sodium__lte": "100", "diabetes__gte": "90"},
+            queryset=Product.objects.all(),
+        ).qs
+        self.assertEqual(
+            sorted(queryset.values_list("slug", flat=True)),
+            ["product-0", "product-1", "product-2"],
+        )
+
+
+class GuidelineRuleMessageTests(TestCase):
+    """Issue messages are validated on save and formatted safely."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = HealthCategory.objects.create(
+            name="Hypertension Friendly", slug="hypertension"
+        )
+        cls.product = Product.objects.create(
+            name="Salted Crackers", slug="salted-crackers", price=3,
+            image="", description="",
+        )
+        NutritionFacts.objects.create(
+            product=cls.product, serving_size="30g", calories=120, sodium=450,
+        )
+
+    def rule(self, issue_message):
+        return GuidelineRule(
+            category=self.category, nutrient="sodium", operator="lt",
+            threshold=200, message="Low sodium", issue_message=issue_message,
+        )
+
+    def test_clean_rejects_broken_templates(self):
+        for template in ("Sodium {amount}mg", "Sodium {value", "{0}mg", "{value:q}"):
+            with self.subTest(template=template):
+                with self.assertRaises(ValidationError):
+                    self.rule(template).clean()
+        self.rule("Sodium too high ({value}mg, max 200mg)").clean()
+
+    def test_compliance_survives_broken_templates(self):
+        GuidelineRule.objects.bulk_create([
+            self.rule("Sodium {amount}mg ({value}mg)"), self.rule("Sodium {value"),
+        ])
+        invalidate_rule_set()
+        result = check_compliance(self.product, "hypertension")
+        self.assertEqual(
+            result["issues"], ["Sodium {amount}mg (450mg)", "Sodium {value"]
+        )
+
+
+def _product(name, description="", rating=0, **fields):
+    return Product.objects.create(
+        name=name, slug=name.lower().replace(" ", "-"), price=5, image="",
+        description=description, rating=rating, **fields,
+    )
+
+
+class SearchTests(TestCase):
+    """The search index matches like the search filter, best first."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fillet = _product("Wild Salmon Fillet", "Omega-3 rich fish")
+        cls.salad = _product("Green Salad", "Pairs well with grilled salmon")
+        cls.bowl = _product("Poke Bowl", "Rice and vegetables")
+        Ingredient.objects.create(product=cls.bowl, name="Smoked Salmon")
+        cls.bar = _product("Peanut Bar", "Crunchy oat snack")
+        # Signals index on commit, which never comes in a TestCase
+        rebuild_search_index()
+
+    def setUp(self):
+        if search_backend() is None:
+            self.skipTest("No full-text index on this database")
+
+    def search(self, query):
+        return search_product_ids(query)
+
+    def test_matches_search_filter(self):
+        for query in ("salmon", "SALMON", "omega", "crunchy oat", "nothing"):
+            with self.subTest(query=query):
+                self.assertEqual(
+                    sorted(self.search(query)),
+                    sorted(legacy_search(Product.objects.all(), query)
+                           .values_list("id", flat=True)),
+                )
+
+    def test_name_ranks_above_description_and_ingredients(self):
+        self.assertEqual(
+            self.search("salmon"), [self.fillet.id, self.salad.id, self.bowl.id]
+        )
+        self.assertEqual(search_product_ids("salmon", limit=1), [self.fillet.id])
+
+    def test_index_follows_writes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bar.description = "Crunchy snack with salmon skin"
+            self.bar.save()
+            Ingredient.objects.create(product=self.salad, name="Walnuts")
+            self.fillet.delete()
+        self.assertCountEqual(
+            self.search("salmon"), [self.salad.id, self.bar.id, self.bowl.id]
+        )
+        self.assertEqual(self.search("walnut"), [self.salad.id])
+
+    def test_endpoint(self):
+        response = self.client.get("/api/products/search/?q=salmon")
+        self.assertEqual(
+            [item["id"] for item in response.json()],
+            [self.fillet.id, self.salad.id, self.bowl.id],
+        )
+        self.assertEqual(self.client.get("/api/products/search/?q=").json(), [])
+
+    def test_short_queries(self):
+        if connection.vendor == "sqlite":
+            # Below the trigram length: served by the icontains fallback
+            self.assertIsNone(self.search("sa"))
+        response = self.client.get("/api/products/search/?q=sa")
+        self.assertIn(
+            self.fillet.id, [item["id"] for item in response.json()]
+        )
+
+
+class PrefixIndexTests(TestCase):
+    """The trie returns what a scan over every word start would."""
+
+    NAMES = [
+        "Wild-Caught Salmon Fillet", "Salted Caramel Bar", "Salmon Jerky",
+        "Green Salad", "Sesame Salad Dressing", "Almond Milk",
+        "Smoked Salmon Bagel", "Sal's Pasta Sauce", "Salsa Verde",
+        "Salt & Vinegar Chips", "Saltines", "Salami Slices", "Sage Tea",
+    ]
+
+    def setUp(self):
+        self.products = [
+            (i, name, f"img/{i}.jpg") for i, name in enumerate(self.NAMES)
+        ]
+        self.texts = {5: ["Salmon Oil"], 8: ["Tomatillo", "Heart Healthy"]}
+        self.index = PrefixIndex(self.products, self.texts)
+
+    def scan(self, prefix, limit=MAX_SUGGESTIONS):
+        """Products with a text whose words from some word on start with prefix."""
+        prefix = normalize(prefix)
+        matches = []
+        for product_id, name, image in self.products:
+            tails = []
+            for text in [name, *self.texts.get(product_id, ())]:
+                words = normalize(text).split()
+                tails += [" ".join(words[i:]) for i in range(len(words))]
+            if prefix and any(tail.startswith(prefix) for tail in tails):
+                matches.append((product_id, name, image))
+        return matches[:limit]
+
+    def test_matches_scan(self):
+        for prefix in ("s", "sa", "sal", "Salm", "salmon f", "SALAD",
+                       "caught salmon", "oil", "heart h", "x", ""):
+            with self.subTest(prefix=prefix):
+                self.assertEqual(self.index.lookup(prefix), self.scan(prefix))
+
+    def test_word_starts_only(self):
+        self.assertEqual(self.index.lookup("lmon"), [])
+        self.assertEqual(self.index.lookup("fillet wild"), [])
+        self.assertEqual(
+            [name for _, name, _ in self.index.lookup("alm")], ["Almond Milk"]
+        )
+
+    def test_suggestions_capped_in_rank_order(self):
+        ids = [product_id for product_id, _, _ in self.index.lookup("s")]
+        self.assertEqual(len(ids), MAX_SUGGESTIONS)
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(
+            [product_id for product_id, _, _ in self.index.lookup("sal", 3)],
+            [0, 1, 2],
+        )
+
+    def test_database_index(self):
+        category = HealthCategory.objects.create(
+            name="Heart Healthy", slug="cardiovascular"
+        )
+        low = _product("Salmon Jerky", rating=3)
+        high = _product("Oat Bar", rating=5)
+        high.categories.add(category)
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(product=high, name="Salmon Oil")
+        index = get_prefix_index()
+        self.assertEqual(
+            [product_id for product_id, _, _ in index.lookup("salmon")],
+            [high.id, low.id],
+        )
+        self.assertEqual(
+            [product_id for product_id, _, _ in index.lookup("heart")],
+            [high.id],
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            _product("Salmon Burger", rating=4)
+        self.assertEqual(len(get_prefix_index().lookup("salmon")), 3)
+
+    def test_endpoint(self):
+        _product("Salmon Jerky", rating=3)
+        invalidate_prefix_index()
+        response = self.client.get("/api/products/autocomplete/?q=salm&limit=x")
+        self.assertEqual(
+            response.json(),
+            [{"id": Product.objects.get().id, "name": "Salmon Jerky",
+              "image": ""}],
+        )
+        self.assertEqual(self.client.get("/api/products/autocomplete/").json(), [])
+
+
+class FacetTests(TestCase):
+    """One aggregate query counts what per-value filters would."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.heart = HealthCategory.objects.create(
+            name="Heart Healthy", slug="cardiovascular"
+        )
+        cls.sugar = HealthCategory.objects.create(
+            name="Diabetes Friendly", slug="diabetes"
+        )
+        prices = [1, 4.99, 5, 9.5, 10, 19.99, 20, 35, 50, 120]
+        ratings = [2.5, 3, 3.5, 4, 4.2, 4.5, 4.8, 5, 3.9, 4.4]
+        for i, (price, rating) in enumerate(zip(prices, ratings)):
+            product = Product.objects.create(
+                name=f"Product {i}", slug=f"product-{i}", price=price,
+                rating=rating, in_stock=i % 4 != 0, image="", description="",
+            )
+            if i % 2:
+                product.categories.add(cls.heart)
+            if i % 3 == 0:
+                product.categories.add(cls.sugar)
+
+    def setUp(self):
+        bump_catalog_version()
+
+    def expected(self, queryset):
+        ids = list(queryset.values_list("id", flat=True).distinct())
+        products = Product.objects.filter(id__in=ids)
+        return {
+            "category": {
+                slug: products.filter(categories__slug=slug).count()
+                for slug in ("cardiovascular", "diabetes")
+            },
+            "price": {
+                label: products.filter(
+                    price__gte=low, **({"price__lt": high} if high else {})
+                ).count()
+                for label, low, high in PRICE_BUCKETS
+            },
+            "in_stock": {
+                "true": products.filter(in_stock=True).count(),
+                "false": products.filter(in_stock=False).count(),
+            },
+            "rating": {
+                label: products.filter(rating__gte=low).count()
+                for label, low in RATING_BANDS
+            },
+        }
+
+    def test_counts_match_filters(self):
+        facets = ("category", "in_stock", "price", "rating")
+        for params in ({}, {"in_stock": "true"}, {"price__lte": "20"},
+                       {"categories__slug": "cardiovascular"}):
+            with self.subTest(**params):
+                queryset = ProductFilter(
+                    params, queryset=Product.objects.all()
+                ).qs
+                self.assertEqual(
+                    facet_counts(queryset, facets), self.expected(queryset)
+                )
+
+    def test_price_bucket_bounds(self):
+        counts = facet_counts(Product.objects.all(), ("price",))["price"]
+        self.assertEqual(
+            counts, {"0-5": 2, "5-10": 2, "10-20": 2, "20-50": 2, "50+": 2}
+        )
+
+    def test_one_query(self):
+        facet_counts(Product.objects.all(), ("category",))
+        with self.assertNumQueries(1):
+            facet_counts(
+                Product.objects.all(),
+                ("category", "in_stock", "price", "rating"),
+            )
+
+    def test_parse_facets(self):
+        self.assertEqual(parse_facets(" rating,price,,rating"),
+                         (("price", "rating"), None))
+        names, error = parse_facets("price,colour")
+        self.assertIn("colour", error)
+
+    def test_endpoint(self):
+        response = self.client.get(
+            "/api/products/?facets=category,in_stock&in_stock=true"
+        )
+        data = response.json()
+        self.assertEqual(data["count"], 7)
+        expected = self.expected(Product.objects.filter(in_stock=True))
+        self.assertEqual(data["facets"], {
+            "category": expected["category"],
+            "in_stock": {"true": 7, "false": 0},
+        })
+        response = self.client.get("/api/products/?facets=colour")
+        self.assertEqual(response.status_code, 400)
+
+    def test_new_category_counted(self):
+        url = "/api/products/?facets=category"
+        counts = self.client.get(url).json()["facets"]["category"]
+        self.assertNotIn("gluten-free", counts)
+        with self.captureOnCommitCallbacks(execute=True):
+            category = HealthCategory.objects.create(
+                name="Gluten Free", slug="gluten-free"
+            )
+            category.products.add(Product.objects.first())
+        self.assertEqual(
+            self.client.get(url).json()["facets"]["category"]["gluten-free"], 1
+        )
@@ -1,9 +1,15 @@
-from django.db import models
-from rest_framework import viewsets, filters
+from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from ai_engine.cache import cached_response
+from ai_engine.ingredients import get_ingredient_index, parse_terms
+from ai_engine.similarity import get_similar_products
+from .autocomplete import MAX_SUGGESTIONS, get_prefix_index
+from .facets import facet_counts, parse_facets
+from .filters import ProductFilter
 from .models import Product, HealthCategory
+from .search import legacy_search, search_product_ids
 from .serializers import (
     ProductListSerializer,
     ProductDetailSerializer,
@@ -19,7 +25,12 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
     list:   GET /api/products/
     detail: GET /api/products/{id}/
     search: GET /api/products/?search=salmon
+    autocomplete: GET /api/products/autocomplete/?q=sa
+    similar: GET /api/products/{id}/similar/?limit=4
     filter: GET /api/products/?categories__slug=cardiovascular
+    nutrients: GET /api/products/?sodium__lte=140&fiber__gte=3&diabetes__gte=70
+    allergens: GET /api/products/?exclude_ingredients=peanut,shellfish
+    facets: GET /api/products/?facets=category,price,in_stock,rating
     """
 
     queryset = Product.objects.select_related(
@@ -30,18 +41,57 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ["name", "description", "ingredients__name"]
     ordering_fields = ["price", "rating", "reviews", "created_at"]
     ordering = ["-rating"]
-    filterset_fields = {
-        "categories__slug": ["exact"],
-        "in_stock": ["exact"],
-        "price": ["gte", "lte"],
-        "rating": ["gte"],
-    }
+    filterset_class = ProductFilter
+
+    # Query parameters that page or order the list but do not filter it
+    UNFILTERED_PARAMS = {"page", "page_size", "ordering", "facets"}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        terms = parse_terms(
+            self.request.query_params.get("exclude_ingredients", "")
+        )
+        if terms and self.action == "list":
+            # Resolved from the in-memory ingredient bitsets, not a join
+            excluded = get_ingredient_index().excluded_ids(terms)
+            queryset = queryset.exclude(id__in=excluded.tolist())
+        return queryset
 
     def get_serializer_class(self):
         if self.action == "retrieve":
             return ProductDetailSerializer
         return ProductListSerializer
 
+    def list(self, request, *args, **kwargs):
+        """
+        Pass facets=category,price,in_stock,rating to add the product
+        counts per facet value for the current filters as "facets". They
+        come from one aggregate query, cached per filter set and catalog
+        version.
+        """
+        facets, error = parse_facets(request.query_params.get("facets", ""))
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+        response = super().list(request, *args, **kwargs)
+        if not facets:
+            return response
+
+        params = {
+            key: ",".join(sorted(values))
+            for key, values in request.query_params.lists()
+            if key not in self.UNFILTERED_PARAMS
+        }
+        params["facets"] = ",".join(facets)
+        queryset = self.filter_queryset(self.get_queryset())
+        counts = cached_response(
+            "product-facets", params, lambda: facet_counts(queryset, facets)
+        )
+        if isinstance(response.data, dict):
+            response.data["facets"] = counts
+        else:
+            response.data = {"results": response.data, "facets": counts}
+        return response
+
     @action(detail=False, methods=["get"], url_path="featured")
     def featured(self, request):
         """GET /api/products/featured/ — top-rated products."""
@@ -49,17 +99,68 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
         serializer = ProductListSerializer(featured, many=True)
         return Response(serializer.data)
 
+    @action(detail=True, methods=["get"], url_path="similar")
+    def similar(self, request, pk=None):
+        """GET /api/products/{id}/similar/?limit=4 — nearest neighbours."""
+        product = self.get_object()
+        try:
+            limit = int(request.query_params.get("limit", 4))
+        except ValueError:
+            return Response(
+                {"error": "limit must be a number"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if limit < 1:
+            return Response(
+                {"error": "limit must be at least 1"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        neighbours = get_similar_products(product.id, limit)
+
+        products = self.queryset.in_bulk([pid for pid, _ in neighbours])
+        data = []
+        for pid, similarity in neighbours:
+            if pid not in products:
+                continue
+            serialized = ProductListSerializer(products[pid]).data
+            serialized["similarity"] = round(similarity, 3)
+            data.append(serialized)
+        return Response(data)
+
+    @action(detail=False, methods=["get"], url_path="autocomplete")
+    def autocomplete(self, request):
+        """
+        GET /api/products/autocomplete/?q=sa&limit=8
+
+        Products whose name, ingredients or categories have a word
+        starting with `q`, best rated first, from the in-memory prefix
+        index (no database query).
+        """
+        try:
+            limit = int(request.query_params.get("limit", 8))
+        except ValueError:
+            limit = 8
+        limit = max(1, min(limit, MAX_SUGGESTIONS))
+        suggestions = get_prefix_index().lookup(
+            request.query_params.get("q", ""), limit
+        )
+        return Response([
+            {"id": product_id, "name": name, "image": image}
+            for product_id, name, image in suggestions
+        ])
+
     @action(detail=False, methods=["get"], url_path="search")
     def search_products(self, request):
-        """GET /api/products/search/?q=salmon"""
+        """GET /api/products/search/?q=salmon — most relevant first."""
         query = request.query_params.get("q", "")
         if not query:
             return Response([])
-        qs = self.queryset.filter(
-            models.Q(name__icontains=query)
-            | models.Q(description__icontains=query)
-            | models.Q(ingredients__name__icontains=query)
-        ).distinct()
+        product_ids = search_product_ids(query)
+        if product_ids is None:
+            qs = legacy_search(self.queryset, query)
+        else:
+            products = self.queryset.in_bulk(product_ids)
+            qs = [products[pid] for pid in product_ids if pid in products]
         serializer = ProductListSerializer(qs, many=True)
         return Response(serializer.data)
 